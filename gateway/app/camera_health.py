@@ -0,0 +1,151 @@
+"""
+Monitor de salud de cámaras HLS (HU6)
+
+Una tarea en segundo plano consulta en paralelo el manifiesto de todas las
+cámaras conocidas (CAM_IDS + vehicle_cameras activas) cada
+CAM_PROBE_INTERVAL segundos usando un cliente HTTP compartido, y mantiene
+en memoria una tabla de estado con la última vez que cada cámara respondió.
+Los endpoints de cámaras leen de esa tabla en lugar de sondear en línea.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+import httpx
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PROBE_INTERVAL_SECONDS = float(os.getenv("CAM_PROBE_INTERVAL", "10"))
+PROBE_TIMEOUT_SECONDS = float(os.getenv("CAM_PROBE_TIMEOUT", "3"))
+PROBE_CONCURRENCY = int(os.getenv("CAM_PROBE_CONCURRENCY", "20"))
+
+
+@dataclass
+class CameraStatus:
+    cam_id: str
+    online: bool = False
+    checked: bool = False
+    last_checked: Optional[str] = None
+    last_seen: Optional[str] = None
+    latency_ms: Optional[float] = None
+    consecutive_failures: int = 0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class CameraHealthMonitor:
+    def __init__(self, internal_url: str, static_ids: Iterable[str], session_factory=None):
+        self.internal_url = internal_url.rstrip("/")
+        self.static_ids: List[str] = list(static_ids)
+        self.session_factory = session_factory
+        self.statuses: Dict[str, CameraStatus] = {c: CameraStatus(c) for c in self.static_ids}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def manifest_url(self, cam_id: str) -> str:
+        return f"{self.internal_url}/{cam_id}/index.m3u8"
+
+    # ------------------------------------------------------------------
+    # Lectura (no bloqueante)
+    # ------------------------------------------------------------------
+    def status(self, cam_id: str) -> CameraStatus:
+        st = self.statuses.get(cam_id)
+        if st is None:
+            # Cámara nueva: se registra y se adelanta el siguiente ciclo
+            st = self.statuses[cam_id] = CameraStatus(cam_id)
+            self._wakeup.set()
+        return st
+
+    def is_online(self, cam_id: str) -> bool:
+        return self.status(cam_id).online
+
+    # ------------------------------------------------------------------
+    # Sondeo
+    # ------------------------------------------------------------------
+    async def _probe(self, cam_id: str, sem: asyncio.Semaphore) -> None:
+        st = self.statuses.setdefault(cam_id, CameraStatus(cam_id))
+        async with sem:
+            started = time.perf_counter()
+            try:
+                r = await self._client.get(self.manifest_url(cam_id))
+                ok = (r.status_code == 200) and ("#EXTM3U" in r.text[:300])
+            except Exception:
+                ok = False
+        st.checked = True
+        st.last_checked = _now_iso()
+        if ok:
+            st.online = True
+            st.last_seen = st.last_checked
+            st.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            st.consecutive_failures = 0
+        else:
+            if st.online:
+                logger.warning(f"📷 Cámara {cam_id} fuera de línea")
+            st.online = False
+            st.latency_ms = None
+            st.consecutive_failures += 1
+
+    def _db_camera_ids(self) -> Set[str]:
+        if self.session_factory is None:
+            return set()
+        db = self.session_factory()
+        try:
+            rows = db.execute(text("SELECT DISTINCT camera_id FROM vehicle_cameras WHERE active = true"))
+            return {r[0] for r in rows}
+        except Exception as e:
+            logger.debug(f"No se pudo leer vehicle_cameras: {e}")
+            return set()
+        finally:
+            db.close()
+
+    async def probe_all(self) -> None:
+        loop = asyncio.get_running_loop()
+        db_ids = await loop.run_in_executor(None, self._db_camera_ids)
+        cam_ids = set(self.static_ids) | db_ids | set(self.statuses)
+        sem = asyncio.Semaphore(PROBE_CONCURRENCY)
+        await asyncio.gather(*(self._probe(c, sem) for c in cam_ids))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.probe_all()
+            except Exception:
+                logger.exception("Error en ciclo de sondeo de cámaras")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), PROBE_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._client = httpx.AsyncClient(
+                timeout=PROBE_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=PROBE_CONCURRENCY, max_keepalive_connections=PROBE_CONCURRENCY),
+            )
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
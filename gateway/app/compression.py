@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Compresión de respuestas y GET condicional (ETag / 304)
+
+Middleware ASGI para respuestas 200 de un solo mensaje (Response):
+
+- ETag débil (W/"...") calculado con el hash del cuerpo sin comprimir (es el
+  mismo para cualquier codificación). Si el request GET trae un
+  If-None-Match que coincide se responde 304 sin cuerpo: una lista que no
+  cambió cuesta unos pocos bytes en vez de la descarga completa.
+- Compresión brotli (si está instalado) o gzip según Accept-Encoding, para
+  tipos de texto/JSON sobre COMPRESSION_MIN_BYTES (por defecto 1024).
+  Siempre agrega `Vary: Accept-Encoding`.
+
+Las respuestas en stream (StreamingResponse, p. ej. json_array sobre
+STREAM_THRESHOLD filas) no se acumulan: cada bloque se comprime al pasar con
+un compresor incremental y se vacía (flush), así que el primer byte sale
+enseguida y la memoria no crece con la lista. No llevan ETag ni
+Content-Length (requerirían el cuerpo completo).
+
+No toca streams SSE ni respuestas que ya traen Content-Encoding o ETag.
+"""
+
+import gzip
+import hashlib
+import os
+import zlib
+
+try:
+    import brotli  # type: ignore[reportMissingImports]
+except ImportError:  # brotli es opcional: sin él se usa solo gzip
+    brotli = None
+
+MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+_COMPRESSIBLE = (b"application/json", b"text/", b"application/javascript", b"application/xml",
+                 b"application/vnd.apple.mpegurl", b"image/svg+xml")
+
+
+def _accepted_encodings(header: str):
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token and q > 0:
+            accepted.add(token)
+    return accepted
+
+
+def choose_encoding(header: str):
+    accepted = _accepted_encodings(header)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compute_etag(body: bytes) -> str:
+    return 'W/"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Comparación débil: se ignora el prefijo W/
+    if if_none_match.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class _StreamCompressor:
+    """Compresor incremental: cada bloque sale completo (flush) al cliente."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits=31: formato gzip (cabecera + CRC)
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(chunk) + self._c.flush()
+        return self._c.compress(chunk) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._c.finish()
+        return self._c.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_bytes: int = MIN_BYTES):
+        self.app = app
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = {}
+        for name, value in scope.get("headers", []):
+            if name in (b"accept-encoding", b"if-none-match"):
+                request_headers[name] = value.decode("latin-1")
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", ""))
+        is_get = scope["method"] == "GET"
+        if_none_match = request_headers.get(b"if-none-match") if is_get else None
+
+        start = None
+        passthrough = False
+        stream = None
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough, stream
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                names = {n.lower() for n, _ in headers}
+                content_type = next((v for n, v in headers if n.lower() == b"content-type"), b"")
+                if (message["status"] != 200 or b"content-encoding" in names or b"etag" in names
+                        or content_type.startswith(b"text/event-stream")):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+
+            if message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                if stream is None and not more_body:
+                    await self._finish(start, body, encoding, is_get, if_none_match, send)
+                    return
+                if stream is None:
+                    stream = await self._start_stream(start, encoding, send)
+                    if stream is False:
+                        # Stream sin compresión: se reenvía tal cual
+                        passthrough = True
+                        await send(message)
+                        return
+                body = stream.compress(body)
+                if not more_body:
+                    body += stream.finish()
+                if body or not more_body:
+                    await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _start_stream(self, start, encoding, send):
+        """Envía los headers de un stream; retorna su compresor o False."""
+        headers = [(n, v) for n, v in start.get("headers", []) if n.lower() != b"content-length"]
+        headers.append((b"vary", b"Accept-Encoding"))
+        content_type = next((v for n, v in headers if n.lower() == b"content-type"), b"")
+        stream = False
+        if encoding and content_type.startswith(_COMPRESSIBLE):
+            stream = _StreamCompressor(encoding)
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+        await send({"type": "http.response.start", "status": start["status"], "headers": headers})
+        return stream
+
+    async def _finish(self, start, body, encoding, is_get, if_none_match, send):
+        headers = [(n, v) for n, v in start.get("headers", []) if n.lower() != b"content-length"]
+        headers.append((b"vary", b"Accept-Encoding"))
+        etag = None
+        if is_get:
+            etag = compute_etag(body)
+            headers.append((b"etag", etag.encode("latin-1")))
+
+        if if_none_match and etag_matches(if_none_match, etag):
+            # 304: sin cuerpo ni headers de representación
+            headers = [(n, v) for n, v in headers if n.lower() != b"content-type"]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        content_type = next((v for n, v in headers if n.lower() == b"content-type"), b"")
+        if encoding and len(body) >= self.min_bytes and content_type.startswith(_COMPRESSIBLE):
+            body = _compress(body, encoding)
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": start["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": body})
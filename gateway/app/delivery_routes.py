@@ -9,6 +9,8 @@ UTF-8 completo en respuestas
 from fastapi import APIRouter, Query, HTTPException
 from typing import Optional, List
 import httpx
+
+from .tracing import traced_client
 import json
 from datetime import datetime
 
@@ -42,7 +44,7 @@ async def list_deliveries(
     Retorna: Lista de entregas con información resumida
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             params = {
                 "status": status,
                 "date": date,
@@ -79,7 +81,7 @@ async def get_delivery_details(delivery_id: int):
     - Ubicación actual
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             response = await client.get(
                 f"{MS_LOGISTICA_URL}/api/deliveries/{delivery_id}",
                 timeout=10.0
@@ -109,7 +111,7 @@ async def get_delivery_tracking(delivery_id: int):
     - Checkpoint actual
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             response = await client.get(
                 f"{MS_LOGISTICA_URL}/api/deliveries/{delivery_id}/tracking",
                 timeout=10.0
@@ -147,7 +149,7 @@ async def get_delivery_events(
     - Descripción en UTF-8
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             params = {"limit": limit, "offset": offset}
             response = await client.get(
                 f"{MS_LOGISTICA_URL}/api/deliveries/{delivery_id}/events",
@@ -179,7 +181,7 @@ async def get_delivery_audit(delivery_id: int):
     - Valores antiguos y nuevos
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             response = await client.get(
                 f"{MS_LOGISTICA_URL}/api/deliveries/{delivery_id}/audit",
                 timeout=10.0
@@ -205,7 +207,7 @@ async def get_delivery_alerts(delivery_id: int):
     Incluye: quién fue notificado, cuándo se envió, si fue leída
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             response = await client.get(
                 f"{MS_LOGISTICA_URL}/api/deliveries/{delivery_id}/alerts",
                 timeout=10.0
@@ -238,7 +240,7 @@ async def create_delivery(delivery_data: dict):
     - Reserva en inventario
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             response = await client.post(
                 f"{MS_LOGISTICA_URL}/api/deliveries",
                 json=delivery_data,
@@ -268,7 +270,7 @@ async def assign_delivery(delivery_id: int, assignment_data: dict):
     - Calcula ruta y ETA
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             response = await client.put(
                 f"{MS_LOGISTICA_URL}/api/deliveries/{delivery_id}/assign",
                 json=assignment_data,
@@ -300,7 +302,7 @@ async def update_delivery_status(delivery_id: int, status_update: dict):
     - Auditoría del cambio
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             response = await client.put(
                 f"{MS_LOGISTICA_URL}/api/deliveries/{delivery_id}/status",
                 json=status_update,
@@ -334,7 +336,7 @@ async def search_deliveries(
     Retorna entregas que coincidan con los filtros
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             params = {
                 "tracking_number": tracking_number,
                 "customer_name": customer_name,
@@ -372,7 +374,7 @@ async def get_daily_stats(date: Optional[str] = Query(None, description="YYYY-MM
     - Performance por conductor
     """
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             params = {"date": date} if date else {}
             response = await client.get(
                 f"{MS_LOGISTICA_URL}/api/stats/daily",
@@ -0,0 +1,174 @@
+"""
+Relay HLS con micro-caché (HU6)
+
+Cuando varios operadores miran la misma cámara (p.ej. durante un incidente)
+cada uno descargaba el playlist y los segmentos directo desde mediamtx. Con
+el relay habilitado (HLS_RELAY=1) el gateway sirve /api/camaras/relay/...:
+
+- Playlists (.m3u8): se cachean una fracción de su EXT-X-TARGETDURATION
+  (HLS_RELAY_PLAYLIST_FRACTION, por defecto 0.5). La clave incluye el query
+  (LL-HLS _HLS_msn/_HLS_part), así que al guardar uno se descartan los
+  vencidos y se limita a HLS_RELAY_MAX_PLAYLISTS entradas (LRU).
+- Segmentos: son inmutables; se guardan en un buffer LRU acotado por bytes
+  (HLS_RELAY_MAX_BYTES).
+- Single-flight: peticiones concurrentes por el mismo recurso comparten una
+  sola descarga hacia mediamtx.
+
+Las URIs de los playlists de mediamtx son relativas, así que el reproductor
+sigue pidiendo todo a través del relay sin reescribir el contenido.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RELAY_ENABLED = os.getenv("HLS_RELAY", "0") == "1"
+PLAYLIST_FRACTION = float(os.getenv("HLS_RELAY_PLAYLIST_FRACTION", "0.5"))
+DEFAULT_PLAYLIST_TTL = 1.0
+MAX_SEGMENT_BYTES = int(os.getenv("HLS_RELAY_MAX_BYTES", str(64 * 1024 * 1024)))
+MAX_PLAYLISTS = int(os.getenv("HLS_RELAY_MAX_PLAYLISTS", "256"))
+UPSTREAM_TIMEOUT_SECONDS = 10.0
+
+_TARGET_DURATION = re.compile(rb"#EXT-X-TARGETDURATION:\s*([0-9.]+)")
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class CachedResource:
+    body: bytes
+    content_type: str
+    expires: float = float("inf")
+
+
+def playlist_ttl(body: bytes) -> float:
+    """TTL de un playlist: fracción de su target duration (master: 1 s)."""
+    m = _TARGET_DURATION.search(body)
+    if not m:
+        return DEFAULT_PLAYLIST_TTL
+    return max(float(m.group(1)) * PLAYLIST_FRACTION, 0.1)
+
+
+class HLSRelay:
+    def __init__(self, upstream_url: str, max_segment_bytes: int = MAX_SEGMENT_BYTES,
+                 max_playlists: int = MAX_PLAYLISTS):
+        self.upstream_url = upstream_url.rstrip("/")
+        self.max_segment_bytes = max_segment_bytes
+        self.max_playlists = max_playlists
+        self._playlists: "OrderedDict[str, CachedResource]" = OrderedDict()
+        self._segments: "OrderedDict[str, CachedResource]" = OrderedDict()
+        self._segment_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.upstream_fetches = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=UPSTREAM_TIMEOUT_SECONDS)
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "playlists": len(self._playlists),
+            "segments": len(self._segments),
+            "segment_bytes": self._segment_bytes,
+            "upstream_fetches": self.upstream_fetches,
+        }
+
+    # ------------------------------------------------------------------
+    async def get(self, cam_id: str, path: str, query: str = "") -> CachedResource:
+        """Retorna el recurso `{cam_id}/{path}` desde caché o desde mediamtx."""
+        key = f"{cam_id}/{path}" + (f"?{query}" if query else "")
+        is_playlist = path.endswith(".m3u8")
+
+        cached = self._lookup(key, is_playlist)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # Otro espectador ya está descargando este recurso
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            resource = await self._fetch(key, is_playlist)
+            future.set_result(resource)
+            return resource
+        except Exception as e:
+            future.set_exception(e)
+            # Evita "exception was never retrieved" si nadie más esperaba
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _lookup(self, key: str, is_playlist: bool) -> Optional[CachedResource]:
+        if is_playlist:
+            cached = self._playlists.get(key)
+            if cached is not None and cached.expires > time.monotonic():
+                self._playlists.move_to_end(key)
+                return cached
+            return None
+        cached = self._segments.get(key)
+        if cached is not None:
+            self._segments.move_to_end(key)
+        return cached
+
+    async def _fetch(self, key: str, is_playlist: bool) -> CachedResource:
+        self.upstream_fetches += 1
+        try:
+            r = await self._get_client().get(f"{self.upstream_url}/{key}")
+        except httpx.HTTPError as e:
+            raise UpstreamError(502, f"mediamtx no disponible: {e}")
+        if r.status_code != 200:
+            raise UpstreamError(r.status_code if r.status_code == 404 else 502,
+                                f"mediamtx respondió {r.status_code}")
+
+        default_type = "application/vnd.apple.mpegurl" if is_playlist else "application/octet-stream"
+        resource = CachedResource(r.content, r.headers.get("content-type", default_type))
+        if is_playlist:
+            resource.expires = time.monotonic() + playlist_ttl(resource.body)
+            self._store_playlist(key, resource)
+        else:
+            self._store_segment(key, resource)
+        return resource
+
+    def _store_playlist(self, key: str, resource: CachedResource) -> None:
+        now = time.monotonic()
+        for old in [k for k, p in self._playlists.items() if p.expires <= now]:
+            del self._playlists[old]
+        self._playlists[key] = resource
+        self._playlists.move_to_end(key)
+        while len(self._playlists) > self.max_playlists:
+            self._playlists.popitem(last=False)
+
+    def _store_segment(self, key: str, resource: CachedResource) -> None:
+        size = len(resource.body)
+        if size > self.max_segment_bytes:
+            return
+        self._segments[key] = resource
+        self._segment_bytes += size
+        while self._segment_bytes > self.max_segment_bytes:
+            _, evicted = self._segments.popitem(last=False)
+            self._segment_bytes -= len(evicted.body)
@@ -2,13 +2,14 @@ from fastapi import FastAPI, Depends, HTTPException, Security, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST  # type: ignore[reportMissingImports]
+from prometheus_client import Counter  # type: ignore[reportMissingImports]
 import httpx  # type: ignore[reportMissingImports]
 import os
 import json
 import traceback
 import logging
+from datetime import date
+from typing import Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from .auth import (
@@ -22,6 +23,18 @@ from .db import SessionLocal, engine
 from . import models
 from .delivery_routes import router as delivery_router
 from .routers.camaras import router as camaras_router
+from .routers.live import router as live_router
+from .change_bus import cache, listener as change_listener
+from .compression import CompressionMiddleware
+from .metrics import MetricsMiddleware, metrics_response, mark_process_dead
+from .sql_metrics import SQLMetricsMiddleware, instrument_engine
+from .tracing import TracingMiddleware, configure_tracing, shutdown_tracing, trace_engine, traced_client
+from .fast_json import fast_json, json_array
+from .profiling import ProfileRequest, ProfilingMiddleware, profiler, profiling_result, profiling_status
+from .weekly_coverage import cobertura_semanal, invalidar_cobertura
+from .driver_ledger import SIN_REGISTROS, ledger_dia
+from .keyset import NEXT_CURSOR_HEADER, cursor_turno, leer_cursor_turno
+from .rrhh_outbox import encolar as encolar_sync_rrhh, worker as rrhh_outbox_worker
 
 # ------------------------------------------------------
 # CONFIGURACIÓN INICIAL
@@ -45,6 +58,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor de paginación (app/keyset.py): sin esto el navegador no lo expone
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Métricas Prometheus
@@ -52,16 +67,23 @@ REQUESTS = Counter("gateway_requests_total", "Total gateway HTTP requests")
 
 security = HTTPBearer()
 
-# Middleware para garantizar UTF-8 en todas las respuestas
-class UTF8Middleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        # Asegurar que todas las respuestas JSON tengan charset=utf-8
-        if response.headers.get('content-type', '').startswith('application/json'):
-            response.headers['content-type'] = 'application/json; charset=utf-8'
-        return response
+# Compresión gzip/brotli y ETag con If-None-Match → 304
+app.add_middleware(CompressionMiddleware)
 
-app.add_middleware(UTF8Middleware)
+# Métricas por ruta + charset=utf-8 en respuestas JSON (middleware ASGI puro)
+app.add_middleware(MetricsMiddleware)
+
+# Conteo/tiempo de consultas SQL por request (Server-Timing + detección N+1)
+instrument_engine(engine)
+app.add_middleware(SQLMetricsMiddleware)
+
+# Trazas distribuidas (W3C traceparent, export OTLP/JSON con TRACE_EXPORT)
+configure_tracing("gateway")
+trace_engine(engine)
+app.add_middleware(TracingMiddleware)
+
+# Profiling bajo demanda (/admin/profiling); sin sesión activa no agrega trabajo
+app.add_middleware(ProfilingMiddleware)
 
 # ------------------------------------------------------
 # MANEJO GLOBAL DE ERRORES
@@ -129,6 +151,25 @@ async def totp_verify(code: str, user=Depends(get_current_user)):
 # MÉTRICAS Y SALUD DEL SERVICIO
 # ------------------------------------------------------
 
+@app.on_event("startup")
+async def start_change_listener():
+    # Invalidación de caché vía LISTEN/NOTIFY (infra/sql/019_change_notifications.sql)
+    change_listener.start(engine)
+    # Sincronización rutas → RR.HH. en segundo plano (infra/sql/025_rrhh_sync_outbox.sql)
+    change_listener.subscribe(rrhh_outbox_worker.handle_notification)
+    rrhh_outbox_worker.start(engine, SessionLocal)
+
+
+@app.on_event("shutdown")
+async def stop_change_listener():
+    await rrhh_outbox_worker.stop()
+    await change_listener.stop()
+    if reportes is not None:
+        await reportes.close_client()
+    shutdown_tracing()
+    mark_process_dead()
+
+
 @app.get("/health")
 async def health():
     REQUESTS.inc()
@@ -137,8 +178,63 @@ async def health():
 
 @app.get("/metrics")
 async def metrics():
-    data = generate_latest()
-    return Response(content=data, media_type=CONTENT_TYPE_LATEST)
+    return metrics_response()
+
+# ------------------------------------------------------
+# PROFILING BAJO DEMANDA (SOLO ADMIN)
+# ------------------------------------------------------
+
+PROFILING_TARGETS = {
+    "ms-inventario": os.environ.get("MS_INVENTARIO_URL") or "http://127.0.0.1:8002",
+    "ms-logistica": os.environ.get("MS_LOGISTICA_URL") or "http://127.0.0.1:8001",
+    "ms-rrhh": os.environ.get("MS_RRHH_URL") or "http://ms-rrhh:8000",
+}
+
+
+async def _forward_profiling(service: str, method: str, action: str, payload: dict = None):
+    base = PROFILING_TARGETS.get(service)
+    if base is None:
+        raise HTTPException(status_code=404, detail=f"Servicio desconocido: {service}")
+    headers = {"X-Profiling-Token": os.environ.get("PROFILING_TOKEN", "")}
+    try:
+        async with traced_client() as client:
+            r = await client.request(method, f"{base}/admin/profiling{action}", json=payload, headers=headers, timeout=20)
+    except httpx.RequestError as e:
+        return JSONResponse(status_code=502, content={"error": f"{service}_unreachable", "detail": str(e)})
+    if r.headers.get("content-type", "").startswith("application/json"):
+        return JSONResponse(status_code=r.status_code, content=r.json())
+    return Response(content=r.content, status_code=r.status_code, media_type="text/plain")
+
+
+@app.get("/api/admin/profiling/{service}")
+async def admin_profiling_status(service: str, user=Depends(rbac(["admin"]))):
+    if service == "gateway":
+        return profiling_status()
+    return await _forward_profiling(service, "GET", "")
+
+
+@app.post("/api/admin/profiling/{service}/start")
+async def admin_profiling_start(service: str, req: ProfileRequest, user=Depends(rbac(["admin"]))):
+    """Captura los próximos N requests de `route` (o una ventana de tiempo) en `service`"""
+    if service == "gateway":
+        return profiler.start(req).describe()
+    return await _forward_profiling(service, "POST", "/start", req.model_dump())
+
+
+@app.post("/api/admin/profiling/{service}/stop")
+async def admin_profiling_stop(service: str, user=Depends(rbac(["admin"]))):
+    if service == "gateway":
+        session = profiler.stop()
+        return session.describe() if session else {"active": None}
+    return await _forward_profiling(service, "POST", "/stop")
+
+
+@app.get("/api/admin/profiling/{service}/result")
+async def admin_profiling_result(service: str, user=Depends(rbac(["admin"]))):
+    """Stacks colapsados (modo sample) o reporte pstats (modo cprofile)"""
+    if service == "gateway":
+        return profiling_result()
+    return await _forward_profiling(service, "GET", "/result")
 
 # ------------------------------------------------------
 # BASE DE DATOS
@@ -168,10 +264,12 @@ async def get_maintenance_tasks():
     base = os.environ.get("MS_INVENTARIO_URL") or "http://127.0.0.1:8002"
     ms_url = f"{base}/maintenance/tasks"
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             r = await client.get(ms_url, timeout=20)
-        content = r.json() if r.headers.get("content-type", "").startswith("application/json") else {"raw_text": r.text}
-        return JSONResponse(status_code=r.status_code, content=content)
+        if r.headers.get("content-type", "").startswith("application/json"):
+            # Reenviar el cuerpo tal cual: sin decodificar y volver a serializar la lista
+            return Response(content=r.content, status_code=r.status_code, media_type="application/json")
+        return JSONResponse(status_code=r.status_code, content={"raw_text": r.text})
     except httpx.RequestError as e:
         logging.error("ms-inventario maintenance tasks request failed: %s", str(e))
         return JSONResponse(status_code=502, content={"error": "ms_inventario_unreachable", "detail": str(e)})
@@ -185,7 +283,7 @@ async def create_maintenance_task(payload: dict):
     base = os.environ.get("MS_INVENTARIO_URL") or "http://127.0.0.1:8002"
     ms_url = f"{base}/maintenance/tasks"
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             r = await client.post(ms_url, json=payload, timeout=20)
         content = r.json() if r.headers.get("content-type", "").startswith("application/json") else {"raw_text": r.text}
         return JSONResponse(status_code=r.status_code, content=content)
@@ -202,7 +300,7 @@ async def update_maintenance_task(task_id: str, payload: dict):
     base = os.environ.get("MS_INVENTARIO_URL") or "http://127.0.0.1:8002"
     ms_url = f"{base}/maintenance/tasks/{task_id}"
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             r = await client.put(ms_url, json=payload, timeout=20)
         content = r.json() if r.headers.get("content-type", "").startswith("application/json") else {"raw_text": r.text}
         return JSONResponse(status_code=r.status_code, content=content)
@@ -219,7 +317,7 @@ async def get_maintenance_stats():
     base = os.environ.get("MS_INVENTARIO_URL") or "http://127.0.0.1:8002"
     ms_url = f"{base}/maintenance/tasks/stats"
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             r = await client.get(ms_url, timeout=20)
         content = r.json() if r.headers.get("content-type", "").startswith("application/json") else {"raw_text": r.text}
         return JSONResponse(status_code=r.status_code, content=content)
@@ -236,7 +334,7 @@ async def get_maintenance_assets():
     base = os.environ.get("MS_INVENTARIO_URL") or "http://127.0.0.1:8002"
     ms_url = f"{base}/maintenance/assets"
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             r = await client.get(ms_url, timeout=20)
         content = r.json() if r.headers.get("content-type", "").startswith("application/json") else {"raw_text": r.text}
         return JSONResponse(status_code=r.status_code, content=content)
@@ -257,7 +355,7 @@ async def maps_geocode(payload: dict):
     base = os.environ.get("MS_LOGISTICA_URL") or os.environ.get("MS_LOGISTICA_BASE")
     ms_url = f"{base}/maps/geocode" if base else "http://127.0.0.1:8001/maps/geocode"
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             r = await client.post(ms_url, json=payload, timeout=20)
         content = r.json() if r.headers.get("content-type", "").startswith("application/json") else {"raw_text": r.text}
         return JSONResponse(status_code=r.status_code, content=content)
@@ -275,7 +373,7 @@ async def maps_directions(payload: dict, request: Request, db: Session = Depends
     base = os.environ.get("MS_LOGISTICA_URL") or os.environ.get("MS_LOGISTICA_BASE")
     ms_url = f"{base}/maps/directions" if base else "http://127.0.0.1:8001/maps/directions"
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             r = await client.post(ms_url, json=payload, timeout=30)
     except httpx.RequestError as e:
         logging.error("ms-logistica directions request failed: %s", str(e))
@@ -333,7 +431,7 @@ async def proxy_routes_optimize(payload: dict):
     base = os.environ.get("MS_LOGISTICA_URL") or os.environ.get("MS_LOGISTICA_BASE")
     ms_url = f"{base}/routes/optimize" if base else "http://127.0.0.1:8001/routes/optimize"
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             r = await client.post(ms_url, json=payload, timeout=30)
         try:
             content = r.json()
@@ -352,7 +450,7 @@ async def proxy_routes_get(route_id: int):
     base = os.environ.get("MS_LOGISTICA_URL") or os.environ.get("MS_LOGISTICA_BASE")
     ms_url = f"{base}/routes/{route_id}" if base else f"http://127.0.0.1:8001/routes/{route_id}"
     try:
-        async with httpx.AsyncClient() as client:
+        async with traced_client() as client:
             r = await client.get(ms_url, timeout=20)
         try:
             content = r.json()
@@ -404,30 +502,38 @@ def get_route_request(request_id: int, db: Session = Depends(get_db)):
 async def get_active_drivers(db: Session = Depends(get_db)):
     """
     Obtiene conductores activos desde la tabla employees (ms-rrhh)
-    Retorna: Lista de conductores con role_id relacionado a 'Conductor'
+    Retorna: Lista de conductores con role_id relacionado a 'Conductor',
+    con sus horas de servicio de hoy (libro diario driver_daily_ledger)
     """
     try:
-        # Query directo a PostgreSQL - tabla employees
-        query = text("""
-            SELECT 
-                e.id,
-                e.rut,
-                e.nombre,
-                e.email,
-                e.activo,
-                e.role_id,
-                r.nombre as role_name
-            FROM employees e
-            LEFT JOIN roles r ON e.role_id = r.id
-            WHERE e.activo = TRUE
-            AND (r.nombre ILIKE '%conductor%' OR r.nombre ILIKE '%driver%' OR e.role_id IN (
-                SELECT id FROM roles WHERE nombre IN ('Conductor', 'Driver', 'Chofer')
-            ))
-            ORDER BY e.nombre
-        """)
-        result = db.execute(query)
+        def load_drivers():
+            # Query directo a PostgreSQL - tabla employees
+            query = text("""
+                SELECT 
+                    e.id,
+                    e.rut,
+                    e.nombre,
+                    e.email,
+                    e.activo,
+                    e.role_id,
+                    r.nombre as role_name
+                FROM employees e
+                LEFT JOIN roles r ON e.role_id = r.id
+                WHERE e.activo = TRUE
+                AND (r.nombre ILIKE '%conductor%' OR r.nombre ILIKE '%driver%' OR e.role_id IN (
+                    SELECT id FROM roles WHERE nombre IN ('Conductor', 'Driver', 'Chofer')
+                ))
+                ORDER BY e.nombre
+            """)
+            return [tuple(row) for row in db.execute(query)]
+
+        # Lista cacheada hasta que cambien employees o roles (ver change_bus)
+        rows = cache.get_or_load(("gateway", "drivers_active"), load_drivers, tables=["employees", "roles"])
+        ledger = ledger_dia(db, date.today())
+
         drivers = []
-        for row in result:
+        for row in rows:
+            dia = ledger.get(row[0], SIN_REGISTROS)
             drivers.append({
                 "id": row[0],
                 "rut": row[1],
@@ -435,7 +541,10 @@ async def get_active_drivers(db: Session = Depends(get_db)):
                 "email": row[3],
                 "activo": row[4],
                 "role_id": row[5],
-                "role_name": row[6] if len(row) > 6 else None
+                "role_name": row[6] if len(row) > 6 else None,
+                "horas_conduccion_hoy": dia.minutos_conduccion / 60,
+                "racha_continua_minutos": dia.racha_continua_minutos,
+                "ultimo_descanso_at": dia.ultimo_descanso_at.isoformat() if dia.ultimo_descanso_at else None
             })
         
         logging.info(f"✓ Conductores activos encontrados: {len(drivers)}")
@@ -447,6 +556,25 @@ async def get_active_drivers(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error al consultar conductores: {str(e)}")
 
 
+# ------------------------------------------------------
+# REGLAS DE ASIGNACIÓN DE RR.HH. (MS-RRHH)
+# ------------------------------------------------------
+# Los choques de horario (índice en memoria, app/schedule_index.py) viven en
+# ms-rrhh; las escrituras de asignaciones que los requieren pasan por ahí.
+
+MS_RRHH_URL = os.environ.get("MS_RRHH_URL") or "http://ms-rrhh:8000"
+
+
+async def _rrhh_request(method: str, path: str, **kwargs) -> httpx.Response:
+    """Request a ms-rrhh; 502 si no responde (las reglas no se omiten)."""
+    try:
+        async with traced_client() as client:
+            return await client.request(method, f"{MS_RRHH_URL}{path}", timeout=20, **kwargs)
+    except httpx.RequestError as e:
+        logging.error("ms-rrhh request failed: %s", str(e))
+        raise HTTPException(status_code=502, detail=f"ms-rrhh no disponible: {e}")
+
+
 # ------------------------------------------------------
 # GESTIÓN DE CARGAS Y CANCELACIÓN DE RUTAS (HU2)
 # ------------------------------------------------------
@@ -530,6 +658,54 @@ async def cancel_route(route_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error al cancelar ruta: {str(e)}")
 
 
+# Columnas compartidas por /api/loads/summary y el feed /api/changes/deliveries
+LOADS_SELECT = """
+    SELECT 
+        dr.id,
+        dr.origin_address,
+        dr.destination_address,
+        dr.status,
+        dr.vehicle_id,
+        dr.driver_id,
+        dr.created_at,
+        dr.updated_at,
+        v.name as vehicle_name,
+        e.nombre as driver_name,
+        CASE 
+            WHEN dr.status IN ('assigned', 'asignado', 'en_progreso', 'in_progress') 
+                 AND dr.vehicle_id IS NOT NULL 
+            THEN 'Asignada'
+            ELSE 'No asignada'
+        END as assignment_status,
+        o.status as rrhh_sync_status,
+        o.dynamic_shift_id,
+        o.ultimo_error as rrhh_sync_error
+    FROM delivery_requests dr
+    LEFT JOIN vehicles v ON dr.vehicle_id = v.id
+    LEFT JOIN employees e ON dr.driver_id = e.id
+    LEFT JOIN rrhh_sync_outbox o ON o.delivery_request_id = dr.id
+"""
+
+
+def load_row_to_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "origin": row[1],
+        "destination": row[2],
+        "status": row[3],
+        "vehicle_id": row[4],
+        "driver_id": row[5],
+        "created_at": row[6].isoformat() if row[6] else None,
+        "updated_at": row[7].isoformat() if row[7] else None,
+        "vehicle_name": row[8],
+        "driver_name": row[9],
+        "assignment_status": row[10],
+        "rrhh_sync_status": row[11],
+        "dynamic_shift_id": row[12],
+        "rrhh_sync_error": row[13]
+    }
+
+
 @app.get("/api/loads/summary")
 async def get_loads_summary(db: Session = Depends(get_db)):
     """
@@ -539,29 +715,7 @@ async def get_loads_summary(db: Session = Depends(get_db)):
     try:
         from sqlalchemy import text
         
-        query = text("""
-            SELECT 
-                dr.id,
-                dr.origin_address,
-                dr.destination_address,
-                dr.status,
-                dr.vehicle_id,
-                dr.driver_id,
-                dr.created_at,
-                dr.updated_at,
-                v.name as vehicle_name,
-                e.nombre as driver_name,
-                CASE 
-                    WHEN dr.status IN ('assigned', 'asignado', 'en_progreso', 'in_progress') 
-                         AND dr.vehicle_id IS NOT NULL 
-                    THEN 'Asignada'
-                    ELSE 'No asignada'
-                END as assignment_status
-            FROM delivery_requests dr
-            LEFT JOIN vehicles v ON dr.vehicle_id = v.id
-            LEFT JOIN employees e ON dr.driver_id = e.id
-            ORDER BY dr.created_at DESC
-        """)
+        query = text(LOADS_SELECT + " ORDER BY dr.created_at DESC")
         
         result = db.execute(query)
         loads = []
@@ -578,30 +732,18 @@ async def get_loads_summary(db: Session = Depends(get_db)):
             else:
                 unassigned_count += 1
             
-            loads.append({
-                "id": row[0],
-                "origin": row[1],
-                "destination": row[2],
-                "status": row[3],
-                "vehicle_id": row[4],
-                "driver_id": row[5],
-                "created_at": row[6].isoformat() if row[6] else None,
-                "updated_at": row[7].isoformat() if row[7] else None,
-                "vehicle_name": row[8],
-                "driver_name": row[9],
-                "assignment_status": assignment_status
-            })
+            loads.append(load_row_to_dict(row))
         
         logging.info(f"📊 Resumen de cargas: Total={total_count}, Asignadas={assigned_count}, No asignadas={unassigned_count}")
         
-        return {
+        return fast_json({
             "loads": loads,
             "summary": {
                 "total": total_count,
                 "assigned": assigned_count,
                 "unassigned": unassigned_count
             }
-        }
+        })
     
     except Exception as e:
         logging.error(f"❌ Error al obtener resumen de cargas: {e}")
@@ -609,6 +751,65 @@ async def get_loads_summary(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error al obtener resumen de cargas: {str(e)}")
 
 
+@app.get("/api/changes/deliveries")
+async def get_delivery_changes(since: str = None, db: Session = Depends(get_db)):
+    """
+    Feed incremental de cargas (delta-sync) - ver infra/sql/020_delivery_change_feed.sql
+
+    - Sin `since` (o con un cursor anterior al horizonte de tombstones):
+      devuelve todas las cargas con `full=true`.
+    - Con `since`: solo las cargas insertadas/actualizadas y los ids
+      eliminados desde ese cursor.
+
+    El cliente aplica `upserts` por id, elimina `deleted` y guarda `cursor`
+    para la siguiente consulta. Las filas usan el mismo formato que
+    /api/loads/summary.
+    """
+    try:
+        # El cursor se toma ANTES de leer: toda transacción que aún no sea
+        # visible tiene xid >= xmin y aparecerá en la siguiente consulta.
+        cursor = db.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text")).scalar()
+
+        full = since is None
+        if not full:
+            if not since.isdigit():
+                raise HTTPException(status_code=400, detail="Cursor inválido")
+            expired = db.execute(text("""
+                SELECT CAST(:since AS xid8) <= min_xid
+                FROM change_feed_horizon
+                WHERE feed = 'deliveries'
+            """), {"since": since}).scalar()
+            full = bool(expired)
+
+        if full:
+            rows = db.execute(text(LOADS_SELECT + " ORDER BY dr.created_at DESC")).fetchall()
+            deleted = []
+        else:
+            rows = db.execute(text(
+                LOADS_SELECT + " WHERE dr.change_xid >= CAST(:since AS xid8) ORDER BY dr.created_at DESC"
+            ), {"since": since}).fetchall()
+            deleted = [r[0] for r in db.execute(text("""
+                SELECT delivery_request_id
+                FROM delivery_request_tombstones
+                WHERE change_xid >= CAST(:since AS xid8)
+                ORDER BY delivery_request_id
+            """), {"since": since})]
+
+        return {
+            "cursor": cursor,
+            "full": full,
+            "upserts": [load_row_to_dict(row) for row in rows],
+            "deleted": deleted
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"❌ Error al obtener cambios de cargas: {e}")
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error al obtener cambios de cargas: {str(e)}")
+
+
 
 @app.post("/api/routes/assign")
 async def assign_route_to_driver(payload: dict, db: Session = Depends(get_db)):
@@ -619,8 +820,13 @@ async def assign_route_to_driver(payload: dict, db: Session = Depends(get_db)):
         "driver_name": "Juan Pérez",
         "origin": "...",
         "destination": "...",
-        "route_data": { polyline, distance, duration }
+        "route_data": { polyline, distance_m, duration_s, estimated_start }
     }
+
+    En la misma transacción encola la sincronización con RR.HH. (turno
+    dinámico + asignación), que el worker de app/rrhh_outbox.py procesa en
+    segundo plano. El estado (rrhh_sync_status) llega a la vista de cargas por
+    /api/changes/deliveries.
     """
     try:
         from sqlalchemy import text
@@ -634,7 +840,6 @@ async def assign_route_to_driver(payload: dict, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail="Faltan campos requeridos: driver_id, origin, destination")
         
         # Insertar en delivery_requests usando columnas correctas de la tabla
-        import json
         insert_query = text("""
             INSERT INTO delivery_requests 
                 (origin_address, destination_address, driver_id, status, notes)
@@ -654,12 +859,13 @@ async def assign_route_to_driver(payload: dict, db: Session = Depends(get_db)):
             "status": "assigned",
             "notes": f"Ruta - {driver_name}"
         })
-        db.commit()
-        
         row = result.fetchone()
         request_id = row[0]
         created_at = row[1]
         tracking_number = f"RT-{request_id:06d}"
+
+        outbox = encolar_sync_rrhh(db, request_id, driver_id, route_data)
+        db.commit()
         
         logging.info(f"✓ Ruta asignada ID: {request_id}, Conductor: {driver_name} (ID: {driver_id}), Tracking: {tracking_number}")
         
@@ -670,9 +876,13 @@ async def assign_route_to_driver(payload: dict, db: Session = Depends(get_db)):
             "driver_id": driver_id,
             "driver_name": driver_name,
             "created_at": created_at.isoformat() if created_at else None,
+            "rrhh_sync_status": outbox["status"],
             "message": f"Ruta asignada a {driver_name}"
         }
     
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         logging.error(f"❌ Error al asignar ruta: {e}")
@@ -680,11 +890,14 @@ async def assign_route_to_driver(payload: dict, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error al asignar ruta: {str(e)}")
 
 
-@app.post("/api/rrhh/sync-route")
+@app.post("/api/rrhh/sync-route", status_code=202)
 async def sync_route_with_rrhh(payload: dict, db: Session = Depends(get_db)):
     """
     Sincroniza ruta con sistema de RR.HH. (dinámico)
-    Crea registro de asignación de turno dinámico basado en la ruta
+    Encola la creación del turno dinámico y la asignación del conductor;
+    responde de inmediato (202) y el worker del outbox la procesa.
+    Si la ruta aún no se procesó, se reprograma con los datos nuevos; si ya se
+    procesó con otro conductor, el nuevo reemplaza al anterior en el turno.
     Payload: {
         "tracking_number": "RT-000001",
         "driver_id": 1,
@@ -692,103 +905,42 @@ async def sync_route_with_rrhh(payload: dict, db: Session = Depends(get_db)):
         "route_data": { origin, destination, distance_m, duration_s, estimated_start }
     }
     """
+    tracking_number = payload.get("tracking_number")
+    driver_id = payload.get("driver_id")
+    driver_name = payload.get("driver_name")
+    route_data = payload.get("route_data", {})
+
+    if not tracking_number or not driver_id:
+        raise HTTPException(status_code=400, detail="Faltan campos requeridos: tracking_number, driver_id")
+
+    # Extraer route_id del tracking_number (formato: RT-000001 → id=1)
     try:
-        from sqlalchemy import text
-        from datetime import datetime, timedelta
-        
-        tracking_number = payload.get("tracking_number")
-        driver_id = payload.get("driver_id")
-        driver_name = payload.get("driver_name")
-        route_data = payload.get("route_data", {})
-        
-        logging.info(f"🔄 Sincronizando ruta con RR.HH.: {tracking_number}, Driver: {driver_id}")
-        
-        if not tracking_number or not driver_id:
-            raise HTTPException(status_code=400, detail="Faltan campos requeridos: tracking_number, driver_id")
-        
-        # Calcular duración estimada en minutos
-        duration_minutes = route_data.get("duration_s", 0) // 60
-        if duration_minutes == 0:
-            duration_minutes = 30  # Mínimo 30 minutos
-        
-        logging.info(f"⏱️ Duración calculada: {duration_minutes} minutos")
-        
-        # Fecha y hora de inicio estimada
-        estimated_start = route_data.get("estimated_start")
-        if estimated_start:
-            try:
-                start_datetime = datetime.fromisoformat(estimated_start.replace('Z', '+00:00'))
-            except Exception as e:
-                logging.warning(f"⚠️ Error parseando fecha, usando ahora: {e}")
-                start_datetime = datetime.now()
-        else:
-            start_datetime = datetime.now()
-        
-        logging.info(f"📅 Fecha/hora inicio: {start_datetime}")
-        
-        # Extraer route_id del tracking_number (formato: RT-000001 → id=1)
-        route_id = None
-        if tracking_number and tracking_number.startswith("RT-"):
-            try:
-                route_id = int(tracking_number.split("-")[1])
-                logging.info(f"🔗 route_id extraído: {route_id}")
-            except (IndexError, ValueError) as e:
-                logging.warning(f"⚠️ No se pudo extraer route_id de {tracking_number}: {e}")
-        
-        # Crear turno dinámico en la tabla dynamic_shifts
-        # FLUJO DIRECTO: Ruta creada desde Mapa ya está confirmada y lista para ejecutar
-        insert_dynamic_shift = text("""
-            INSERT INTO dynamic_shifts 
-                (route_id, fecha_programada, hora_inicio, duracion_minutos, status)
-            VALUES 
-                (:route_id, :fecha, :hora, :duracion, :status)
-            RETURNING id
-        """)
-        
-        result = db.execute(insert_dynamic_shift, {
-            "route_id": route_id,
-            "fecha": start_datetime.date(),
-            "hora": start_datetime.time(),
-            "duracion": duration_minutes,
-            "status": "asignado"  # ✅ OPTIMIZADO: Ruta lista para ejecutar inmediatamente
-        })
-        
-        dynamic_shift_id = result.fetchone()[0]
-        logging.info(f"✅ Turno dinámico creado: ID={dynamic_shift_id}")
-        
-        # Asignar conductor al turno dinámico
-        insert_assignment = text("""
-            INSERT INTO dynamic_shift_assignments 
-                (dynamic_shift_id, employee_id, role_in_shift, status)
-            VALUES 
-                (:shift_id, :employee_id, :role, :status)
-        """)
-        
-        db.execute(insert_assignment, {
-            "shift_id": dynamic_shift_id,
-            "employee_id": driver_id,
-            "role": "Conductor Principal",
-            "status": "asignado"
-        })
-        
+        prefix, number = tracking_number.split("-", 1)
+        if prefix != "RT":
+            raise ValueError(tracking_number)
+        route_id = int(number)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"tracking_number inválido: {tracking_number}")
+
+    try:
+        outbox = encolar_sync_rrhh(db, route_id, driver_id, route_data)
+        if outbox is None:
+            raise HTTPException(status_code=404, detail=f"Ruta {tracking_number} no encontrada")
         db.commit()
-        
-        logging.info(f"✅ Sincronizado con RR.HH.: Turno dinámico {dynamic_shift_id} para {driver_name}")
-        
+
+        logging.info(f"🔄 Sincronización con RR.HH. encolada: {tracking_number}, Driver: {driver_id} ({outbox['status']})")
+
         return {
             "success": True,
-            "dynamic_shift_id": dynamic_shift_id,
+            "delivery_request_id": route_id,
+            "outbox_id": outbox["id"],
+            "status": outbox["status"],
+            "dynamic_shift_id": outbox["dynamic_shift_id"],
             "driver_id": driver_id,
             "driver_name": driver_name,
-            "message": f"Turno dinámico creado para {driver_name}",
-            "debug": {
-                "fecha": str(start_datetime.date()),
-                "hora": str(start_datetime.time()),
-                "duracion_minutos": duration_minutes,
-                "status": "asignado"
-            }
+            "message": f"Sincronización con RR.HH. encolada para {driver_name}"
         }
-    
+
     except HTTPException:
         db.rollback()
         raise
@@ -800,6 +952,12 @@ async def sync_route_with_rrhh(payload: dict, db: Session = Depends(get_db)):
 
 
 
+# Listado paginado de turnos dinámicos (keyset) y resumen mensual
+DYNAMIC_SHIFTS_PAGE_SIZE = 200
+DYNAMIC_SHIFTS_MAX_PAGE = 1000
+DYNAMIC_SHIFTS_SUMMARY_MAX_DAYS = 62
+
+
 @app.get("/api/rrhh/dynamic-shifts/pending")
 async def get_pending_dynamic_shifts(db: Session = Depends(get_db)):
     """
@@ -862,15 +1020,55 @@ async def get_pending_dynamic_shifts(db: Session = Depends(get_db)):
 
 
 @app.get("/api/rrhh/dynamic-shifts")
-async def list_dynamic_shifts(db: Session = Depends(get_db)):
+async def list_dynamic_shifts(
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    status: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """
-    Lista todos los turnos dinámicos con detalles incluyendo asignaciones
+    Lista turnos dinámicos con detalles incluyendo asignaciones
+
+    Sin limit ni cursor devuelve todo el rango, como antes. Con limit o
+    cursor se pagina por keyset (fecha, hora, id descendente): la siguiente
+    página se pide con el cursor del header X-Next-Cursor. Las asignaciones
+    se traen solo para los turnos devueltos, en una consulta.
     """
+    paginado = limit is not None or cursor is not None
+    if paginado and limit is None:
+        limit = DYNAMIC_SHIFTS_PAGE_SIZE
+    if paginado and not 1 <= limit <= DYNAMIC_SHIFTS_MAX_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit debe estar entre 1 y {DYNAMIC_SHIFTS_MAX_PAGE}")
     try:
-        from sqlalchemy import text
-        
-        # Query principal: obtener turnos dinámicos
-        query = text("""
+        despues = leer_cursor_turno(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        where_clauses = []
+        params = {}
+        if fecha_desde:
+            where_clauses.append("ds.fecha_programada >= :fecha_desde")
+            params["fecha_desde"] = fecha_desde
+        if fecha_hasta:
+            where_clauses.append("ds.fecha_programada <= :fecha_hasta")
+            params["fecha_hasta"] = fecha_hasta
+        if status:
+            where_clauses.append("ds.status = :status")
+            params["status"] = status
+        if despues:
+            where_clauses.append("(ds.fecha_programada, ds.hora_inicio, ds.id) < (:c_fecha, :c_hora, :c_id)")
+            params.update(c_fecha=despues[0], c_hora=despues[1], c_id=despues[2])
+        where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+        limit_sql = ""
+        if paginado:
+            limit_sql = "LIMIT :limit"
+            params["limit"] = limit + 1
+
+        # Query principal: todo el rango o una página (+1 para saber si hay más)
+        query = text(f"""
             SELECT 
                 ds.id,
                 ds.route_id,
@@ -879,44 +1077,45 @@ async def list_dynamic_shifts(db: Session = Depends(get_db)):
                 ds.duracion_minutos,
                 ds.status
             FROM dynamic_shifts ds
-            ORDER BY ds.fecha_programada DESC, ds.hora_inicio DESC
-        """)
-        
-        result = db.execute(query)
-        shifts = []
-        
-        # Query para obtener asignaciones
-        assignments_query = text("""
-            SELECT 
-                dsa.dynamic_shift_id,
-                dsa.employee_id,
-                e.nombre,
-                e.email,
-                dsa.role_in_shift,
-                dsa.status
-            FROM dynamic_shift_assignments dsa
-            JOIN employees e ON dsa.employee_id = e.id
-            ORDER BY dsa.dynamic_shift_id, dsa.employee_id
+            {where_sql}
+            ORDER BY ds.fecha_programada DESC, ds.hora_inicio DESC, ds.id DESC
+            {limit_sql}
         """)
-        
-        assignments_result = db.execute(assignments_query)
-        
-        # Agrupar asignaciones por shift_id
+        rows = db.execute(query, params).fetchall()
+        headers = {}
+        if paginado and len(rows) > limit:
+            rows = rows[:limit]
+            ultima = rows[-1]
+            headers[NEXT_CURSOR_HEADER] = cursor_turno(ultima[2], ultima[3], ultima[0])
+
+        # Asignaciones solo de los turnos devueltos
         assignments_by_shift = {}
-        for asg_row in assignments_result:
-            shift_id = asg_row[0]
-            if shift_id not in assignments_by_shift:
-                assignments_by_shift[shift_id] = []
-            assignments_by_shift[shift_id].append({
-                "employee_id": asg_row[1],
-                "nombre": asg_row[2],
-                "email": asg_row[3],
-                "role_in_shift": asg_row[4],
-                "status": asg_row[5]
-            })
+        if rows:
+            assignments_query = text("""
+                SELECT 
+                    dsa.dynamic_shift_id,
+                    dsa.employee_id,
+                    e.nombre,
+                    e.email,
+                    dsa.role_in_shift,
+                    dsa.status
+                FROM dynamic_shift_assignments dsa
+                JOIN employees e ON dsa.employee_id = e.id
+                WHERE dsa.dynamic_shift_id = ANY(:ids)
+                ORDER BY dsa.dynamic_shift_id, dsa.employee_id
+            """)
+            for asg_row in db.execute(assignments_query, {"ids": [row[0] for row in rows]}):
+                assignments_by_shift.setdefault(asg_row[0], []).append({
+                    "employee_id": asg_row[1],
+                    "nombre": asg_row[2],
+                    "email": asg_row[3],
+                    "role_in_shift": asg_row[4],
+                    "status": asg_row[5]
+                })
         
         # Construir respuesta con asignaciones
-        for row in result:
+        shifts = []
+        for row in rows:
             shift_id = row[0]
             shift_assignments = assignments_by_shift.get(shift_id, [])
             
@@ -932,7 +1131,7 @@ async def list_dynamic_shifts(db: Session = Depends(get_db)):
                 "assignments": shift_assignments  # ✅ Datos estructurados para frontend
             })
         
-        return shifts
+        return json_array(shifts, headers=headers)
     
     except Exception as e:
         logging.error(f"❌ Error al listar turnos dinámicos: {e}")
@@ -940,23 +1139,91 @@ async def list_dynamic_shifts(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error al listar turnos dinámicos: {str(e)}")
 
 
-@app.get("/api/rrhh/dynamic-shifts/available-drivers/{shift_id}")
-async def get_available_drivers_for_shift(shift_id: int, db: Session = Depends(get_db)):
+@app.get("/api/rrhh/dynamic-shifts/summary")
+async def dynamic_shifts_summary(fecha_desde: date, fecha_hasta: date, db: Session = Depends(get_db)):
     """
-    Obtiene conductores disponibles para un turno dinámico
-    Retorna lista vacía para compatibilidad con frontend
+    Resumen compacto por día para la vista mensual del calendario:
+    total de turnos, conteo por estado y conductores asignados.
+    Una consulta agrupada sobre el rango (máximo DYNAMIC_SHIFTS_SUMMARY_MAX_DAYS días).
     """
+    if fecha_hasta < fecha_desde:
+        raise HTTPException(status_code=400, detail="fecha_hasta debe ser posterior a fecha_desde")
+    if (fecha_hasta - fecha_desde).days + 1 > DYNAMIC_SHIFTS_SUMMARY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"El rango no puede superar {DYNAMIC_SHIFTS_SUMMARY_MAX_DAYS} días")
     try:
-        from sqlalchemy import text
-        
-        # Por ahora retornamos lista vacía ya que no tenemos la lógica completa
-        # El frontend puede manejar esto mostrando "Sin disponibles"
-        return []
-    
+        query = text("""
+            WITH turnos AS (
+                SELECT 
+                    ds.fecha_programada,
+                    COUNT(*) AS total,
+                    COUNT(*) FILTER (WHERE ds.status = 'pendiente') AS pendientes,
+                    COUNT(*) FILTER (WHERE ds.status = 'asignado') AS asignados,
+                    COUNT(*) FILTER (WHERE ds.status = 'en_curso') AS en_curso,
+                    COUNT(*) FILTER (WHERE ds.status = 'completado') AS completados,
+                    COUNT(*) FILTER (WHERE ds.status = 'cancelado') AS cancelados,
+                    SUM(ds.duracion_minutos) AS minutos
+                FROM dynamic_shifts ds
+                WHERE ds.fecha_programada BETWEEN :fecha_desde AND :fecha_hasta
+                GROUP BY ds.fecha_programada
+            ), conductores AS (
+                SELECT ds.fecha_programada, COUNT(DISTINCT dsa.employee_id) AS conductores
+                FROM dynamic_shift_assignments dsa
+                JOIN dynamic_shifts ds ON ds.id = dsa.dynamic_shift_id
+                WHERE ds.fecha_programada BETWEEN :fecha_desde AND :fecha_hasta
+                  AND dsa.status != 'cancelado'
+                GROUP BY ds.fecha_programada
+            )
+            SELECT t.fecha_programada, t.total, t.pendientes, t.asignados, t.en_curso,
+                   t.completados, t.cancelados, t.minutos, COALESCE(c.conductores, 0)
+            FROM turnos t
+            LEFT JOIN conductores c ON c.fecha_programada = t.fecha_programada
+            ORDER BY t.fecha_programada
+        """)
+        days = [
+            {
+                "fecha": row[0].isoformat(),
+                "total": row[1],
+                "pendientes": row[2],
+                "asignados": row[3],
+                "en_curso": row[4],
+                "completados": row[5],
+                "cancelados": row[6],
+                "minutos": int(row[7] or 0),
+                "conductores": row[8],
+            }
+            for row in db.execute(query, {"fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta})
+        ]
+        return {"fecha_desde": fecha_desde.isoformat(), "fecha_hasta": fecha_hasta.isoformat(), "days": days}
+
     except Exception as e:
-        logging.error(f"❌ Error al obtener conductores disponibles: {e}")
+        logging.error(f"❌ Error al resumir turnos dinámicos: {e}")
         logging.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error al obtener conductores: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al resumir turnos dinámicos: {str(e)}")
+
+
+@app.get("/api/rrhh/dynamic-shifts/available-drivers/{shift_id}")
+async def get_available_drivers_for_shift(shift_id: int):
+    """
+    Obtiene conductores disponibles para un turno dinámico
+    Evaluados en ms-rrhh (app/eligibility.py): rol, choques de horario y
+    conducción continua/descanso (app/driving_rules.py).
+    """
+    r = await _rrhh_request("GET", f"/dynamic-shifts/available-drivers/{shift_id}")
+    return Response(content=r.content, status_code=r.status_code, media_type="application/json")
+
+
+async def _verificar_elegibilidad(shift_id: int, employee_id: int) -> None:
+    """409 si el conductor no puede tomar el turno según las reglas de ms-rrhh."""
+    r = await _rrhh_request(
+        "GET", f"/dynamic-shifts/available-drivers/{shift_id}", params={"employee_id": employee_id}
+    )
+    if r.status_code == 404:
+        raise HTTPException(status_code=404, detail="Turno dinámico no encontrado")
+    if r.status_code != 200:
+        raise HTTPException(status_code=502, detail=f"ms-rrhh respondió {r.status_code} al evaluar elegibilidad")
+    elegibilidad = r.json()[0]
+    if not elegibilidad["puede_asignarse"]:
+        raise HTTPException(status_code=409, detail=f"No disponible: {elegibilidad['razon_no_disponible']}")
 
 
 @app.post("/api/rrhh/dynamic-shifts/{shift_id}/auto-assign")
@@ -964,10 +1231,17 @@ async def auto_assign_driver_to_shift(shift_id: int, employee_id: int, db: Sessi
     """
     Asigna un conductor a un turno dinámico (confirmación desde RR.HH.)
     LOGICA MEJORADA: Cambia el status del turno de 'pendiente' a 'asignado'
+    El conductor se valida antes con las reglas de ms-rrhh (409 si no es elegible).
     """
+    # Reconfirmar al conductor actual no se evalúa: chocaría con su propio turno
+    actual = db.execute(text("""
+        SELECT 1 FROM dynamic_shift_assignments
+        WHERE dynamic_shift_id = :shift_id AND employee_id = :employee_id AND status <> 'cancelado'
+    """), {"shift_id": shift_id, "employee_id": employee_id}).fetchone()
+    if actual is None:
+        await _verificar_elegibilidad(shift_id, employee_id)
+
     try:
-        from sqlalchemy import text
-        
         # 1. Actualizar la asignación existente
         update_assignment = text("""
             UPDATE dynamic_shift_assignments
@@ -1068,19 +1342,22 @@ async def get_employees(db: Session = Depends(get_db)):
             ORDER BY nombre
         """)
         
-        result = db.execute(query)
-        rows = result.fetchall()
-        
-        employees = []
-        for row in rows:
-            employees.append({
-                "id": row[0],
-                "nombre": row[1],
-                "email": row[2],
-                "rut": row[3],
-                "activo": row[4],
-                "created_at": row[5].isoformat() if row[5] else None
-            })
+        def load_employees():
+            rows = db.execute(query).fetchall()
+            return [
+                {
+                    "id": row[0],
+                    "nombre": row[1],
+                    "email": row[2],
+                    "rut": row[3],
+                    "activo": row[4],
+                    "created_at": row[5].isoformat() if row[5] else None
+                }
+                for row in rows
+            ]
+        
+        # Cacheado hasta que cambie la tabla employees (ver change_bus)
+        employees = cache.get_or_load(("gateway", "employees"), load_employees, tables=["employees"])
         
         logging.info(f"📋 Listado de empleados: {len(employees)} encontrados")
         
@@ -1148,18 +1425,20 @@ async def get_shifts(db: Session = Depends(get_db)):
             ORDER BY start_time
         """)
         
-        result = db.execute(query)
-        shifts = []
-        
-        for row in result:
-            shifts.append({
-                "id": row[0],
-                "tipo": row[1],
-                "start_time": str(row[2]) if row[2] else None,
-                "end_time": str(row[3]) if row[3] else None,
-                "timezone": row[4] or "America/Santiago",
-                "created_at": row[5].isoformat() if row[5] else None
-            })
+        def load_shifts():
+            return [
+                {
+                    "id": row[0],
+                    "tipo": row[1],
+                    "start_time": str(row[2]) if row[2] else None,
+                    "end_time": str(row[3]) if row[3] else None,
+                    "timezone": row[4] or "America/Santiago",
+                    "created_at": row[5].isoformat() if row[5] else None
+                }
+                for row in db.execute(query)
+            ]
+        
+        shifts = cache.get_or_load(("gateway", "shifts"), load_shifts, tables=["shifts"])
         
         logging.info(f"📋 Turnos regulares: {len(shifts)} encontrados")
         return shifts
@@ -1279,59 +1558,20 @@ async def list_assignments(
 
 
 @app.post("/api/rrhh/assignments")
-async def create_assignment(assignment_data: dict, db: Session = Depends(get_db)):
+async def create_assignment(assignment_data: dict):
     """
     Crea una nueva asignación de turno regular
+    Se delega en ms-rrhh (POST /assignments/), que rechaza con 409 los choques
+    de horario con turnos manuales o dinámicos (índice de horarios).
     """
+    r = await _rrhh_request("POST", "/assignments/", json=assignment_data)
+    if r.status_code == 200:
+        invalidar_cobertura()
     try:
-        from sqlalchemy import text
-        
-        # Verificar si ya existe una asignación para ese empleado en esa fecha
-        check_query = text("""
-            SELECT id FROM shift_assignments
-            WHERE employee_id = :employee_id AND date = :date
-        """)
-        
-        existing = db.execute(check_query, {
-            "employee_id": assignment_data.get("employee_id"),
-            "date": assignment_data.get("date")
-        }).fetchone()
-        
-        if existing:
-            raise HTTPException(
-                status_code=409,
-                detail="Este empleado ya tiene un turno asignado en esta fecha"
-            )
-        
-        insert_query = text("""
-            INSERT INTO shift_assignments (employee_id, shift_id, date)
-            VALUES (:employee_id, :shift_id, :date)
-            RETURNING id, employee_id, shift_id, date
-        """)
-        
-        result = db.execute(insert_query, {
-            "employee_id": assignment_data.get("employee_id"),
-            "shift_id": assignment_data.get("shift_id"),
-            "date": assignment_data.get("date")
-        })
-        
-        row = result.fetchone()
-        db.commit()
-        
-        return {
-            "id": row[0],
-            "employee_id": row[1],
-            "shift_id": row[2],
-            "date": row[3].isoformat()
-        }
-    
-    except HTTPException:
-        db.rollback()
-        raise
-    except Exception as e:
-        db.rollback()
-        logging.error(f"❌ Error al crear asignación: {e}")
-        raise HTTPException(status_code=500, detail=f"Error al crear asignación: {str(e)}")
+        content = r.json()
+    except ValueError:
+        content = {"detail": r.text}
+    return JSONResponse(status_code=r.status_code, content=content)
 
 
 @app.delete("/api/rrhh/assignments/{assignment_id}")
@@ -1355,6 +1595,7 @@ async def delete_assignment(assignment_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="Asignación no encontrada")
         
         db.commit()
+        invalidar_cobertura()
         logging.info(f"✓ Asignación {assignment_id} eliminada")
         
         return {"success": True, "message": "Asignación eliminada correctamente"}
@@ -1375,72 +1616,28 @@ async def get_weekly_suggestions(db: Session = Depends(get_db)):
     Retorna empleados sin asignar y turnos sin cubrir
     """
     try:
-        from sqlalchemy import text
-        from datetime import datetime, timedelta
-        
-        # Calcular inicio y fin de semana
-        today = datetime.now().date()
-        week_start = today - timedelta(days=today.weekday())
-        week_end = week_start + timedelta(days=6)
+        # Matriz día x turno y conteo por empleado con una consulta agrupada,
+        # cacheada por semana ISO (app/weekly_coverage.py)
+        cobertura = cobertura_semanal(db)
         
         # Empleados sin asignar esta semana
-        unassigned_query = text("""
-            SELECT 
-                e.id,
-                e.nombre,
-                e.email,
-                COUNT(sa.id) as assignments_this_week
-            FROM employees e
-            LEFT JOIN shift_assignments sa ON e.id = sa.employee_id
-                AND sa.date BETWEEN :week_start AND :week_end
-            WHERE e.activo = true
-            GROUP BY e.id, e.nombre, e.email
-            HAVING COUNT(sa.id) = 0
-            ORDER BY e.nombre
-        """)
-        
-        result = db.execute(unassigned_query, {
-            "week_start": week_start,
-            "week_end": week_end
-        })
-        
-        unassigned_employees = []
-        for row in result:
-            unassigned_employees.append({
-                "id": row[0],
-                "nombre": row[1],
-                "email": row[2],
-                "assignments_this_week": row[3]
-            })
-        
-        # Turnos sin cubrir (simplificado)
-        uncovered_shifts = []
-        
-        # Estadísticas generales
-        stats_query = text("""
-            SELECT 
-                COUNT(DISTINCT e.id) as total_employees,
-                COUNT(DISTINCT s.id) as total_shifts,
-                COUNT(sa.id) as total_assignments
-            FROM employees e
-            CROSS JOIN shifts s
-            LEFT JOIN shift_assignments sa ON sa.date BETWEEN :week_start AND :week_end
-            WHERE e.activo = true
-        """)
-        
-        stats = db.execute(stats_query, {
-            "week_start": week_start,
-            "week_end": week_end
-        }).fetchone()
+        unassigned_employees = sorted(
+            (
+                {"id": emp_id, "nombre": nombre, "email": email, "assignments_this_week": count}
+                for emp_id, nombre, email, count in cobertura.empleados
+                if count == 0
+            ),
+            key=lambda e: e["nombre"] or ""
+        )
         
         return {
             "unassigned_employees": unassigned_employees,
-            "uncovered_shifts": uncovered_shifts,
-            "week_start": week_start.isoformat(),
-            "week_end": week_end.isoformat(),
-            "total_employees": stats[0] or 0,
-            "total_shifts": stats[1] or 0,
-            "total_assignments_this_week": stats[2] or 0
+            "uncovered_shifts": cobertura.turnos_sin_cubrir(),
+            "week_start": cobertura.week_start.isoformat(),
+            "week_end": cobertura.week_end.isoformat(),
+            "total_employees": len(cobertura.empleados),
+            "total_shifts": len(cobertura.shifts),
+            "total_assignments_this_week": cobertura.total_asignaciones
         }
     
     except Exception as e:
@@ -1460,30 +1657,35 @@ async def list_trainings(db: Session = Depends(get_db)):
     Trazabilidad: trainings → employee_trainings → employees
     """
     try:
-        result = db.execute(text("""
-            SELECT 
-                t.id,
-                t.title,
-                t.topic,
-                t.required,
-                t.created_at,
-                COUNT(DISTINCT et.employee_id) as enrolled_employees
-            FROM trainings t
-            LEFT JOIN employee_trainings et ON t.id = et.training_id
-            GROUP BY t.id, t.title, t.topic, t.required, t.created_at
-            ORDER BY t.created_at DESC
-        """))
-        
-        trainings = []
-        for row in result:
-            trainings.append({
-                "id": row[0],
-                "title": row[1],
-                "topic": row[2],
-                "required": row[3],
-                "created_at": row[4].isoformat() if row[4] else None,
-                "enrolled_employees": row[5]
-            })
+        def load_trainings():
+            result = db.execute(text("""
+                SELECT 
+                    t.id,
+                    t.title,
+                    t.topic,
+                    t.required,
+                    t.created_at,
+                    COUNT(DISTINCT et.employee_id) as enrolled_employees
+                FROM trainings t
+                LEFT JOIN employee_trainings et ON t.id = et.training_id
+                GROUP BY t.id, t.title, t.topic, t.required, t.created_at
+                ORDER BY t.created_at DESC
+            """))
+            return [
+                {
+                    "id": row[0],
+                    "title": row[1],
+                    "topic": row[2],
+                    "required": row[3],
+                    "created_at": row[4].isoformat() if row[4] else None,
+                    "enrolled_employees": row[5]
+                }
+                for row in result
+            ]
+        
+        trainings = cache.get_or_load(
+            ("gateway", "trainings"), load_trainings, tables=["trainings", "employee_trainings"]
+        )
         
         return {"trainings": trainings, "total": len(trainings)}
     
@@ -1765,7 +1967,7 @@ async def get_incidents(
             })
         
         logging.info(f"📋 Incidentes encontrados: {len(incidents)}")
-        return incidents
+        return json_array(incidents)
     
     except Exception as e:
         logging.error(f"❌ Error al obtener incidentes: {e}")
@@ -1934,9 +2136,13 @@ logging.info("Incluyendo camaras_router...")
 app.include_router(camaras_router, prefix="/api", tags=["camaras"])
 logging.info("✅ Módulo de cámaras (HU6) cargado correctamente.")
 
+# Canal push de cambios (SSE / WebSocket)
+app.include_router(live_router, prefix="/api")
+
 try:
     from . import reportes  # HU11 y HU12
     app.include_router(reportes.router)
     logging.info("✅ Módulo de reportes (HU11/HU12) cargado correctamente.")
 except ImportError as e:
+    reportes = None
     logging.warning(f"No se pudo importar el módulo de reportes: {e}")
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación HTTP (Prometheus) como middleware ASGI puro
+
+Registra por request:
+- http_request_duration_seconds  (method, route, status)
+- http_request_size_bytes        (method, route)
+- http_response_size_bytes       (method, route)
+- http_requests_in_progress      (method)
+
+`route` es la plantilla de la ruta (p.ej. /api/camaras/delivery/{delivery_id}),
+no la URL concreta, para acotar la cardinalidad. Requests que no coinciden con
+ninguna ruta se etiquetan como "unmatched".
+
+Además garantiza `charset=utf-8` en las respuestas JSON (reemplaza al antiguo
+UTF8Middleware basado en BaseHTTPMiddleware, sin su costo por request).
+
+Multiproceso: con varios workers de uvicorn/gunicorn definir
+PROMETHEUS_MULTIPROC_DIR (directorio vacío y escribible) ANTES de iniciar el
+proceso; /metrics agregará entonces los valores de todos los workers.
+"""
+
+import os
+import time
+
+from prometheus_client import (  # type: ignore[reportMissingImports]
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from starlette.responses import Response
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duración de requests HTTP",
+    ["method", "route", "status"],
+    buckets=DURATION_BUCKETS,
+)
+REQUEST_SIZE = Histogram(
+    "http_request_size_bytes",
+    "Tamaño del cuerpo de los requests HTTP",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Tamaño del cuerpo de las respuestas HTTP",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests HTTP en curso",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+_JSON = b"application/json"
+_JSON_UTF8 = b"application/json; charset=utf-8"
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if not path:
+        return "unmatched"
+    regex = getattr(route, "path_regex", None)
+    actual = scope.get("path", "")
+    if regex is None or regex.match(actual):
+        return path
+    # Routers incluidos con prefijo: la ruta guarda solo su path relativo
+    i = actual.find("/", 1)
+    while i != -1:
+        if regex.match(actual[i:]):
+            return actual[:i] + path
+        i = actual.find("/", i + 1)
+    return path
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        request_size = 0
+        response_size = 0
+
+        async def receive_wrapper():
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = message.get("headers")
+                if headers:
+                    # Asegurar que todas las respuestas JSON tengan charset=utf-8
+                    for i, (name, value) in enumerate(headers):
+                        if name.lower() == b"content-type":
+                            if value.startswith(_JSON) and value != _JSON_UTF8:
+                                headers = list(headers)
+                                headers[i] = (name, _JSON_UTF8)
+                                message["headers"] = headers
+                            break
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            route = _route_template(scope)
+            REQUEST_DURATION.labels(method, route, str(status_code)).observe(elapsed)
+            REQUEST_SIZE.labels(method, route).observe(request_size)
+            RESPONSE_SIZE.labels(method, route).observe(response_size)
+
+
+def metrics_response() -> Response:
+    """Respuesta para /metrics (agrega todos los workers en modo multiproceso)."""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess  # type: ignore[reportMissingImports]
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        data = generate_latest(registry)
+    else:
+        data = generate_latest()
+    return Response(content=data, media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead() -> None:
+    """Limpia los gauges `live*` de este worker al apagarse (modo multiproceso)."""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess  # type: ignore[reportMissingImports]
+
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,58 +1,95 @@
 from fastapi import APIRouter, Query
+import asyncio
+import logging
 import os
 import httpx
 
+from .change_bus import cache
+from .tracing import traced_client
+
 router = APIRouter(prefix="/reportes", tags=["Reportes Consolidados"])
 
 MS_INVENTARIO = os.environ.get("MS_INVENTARIO_URL", "http://ms-inventario:8000")
 MS_LOGISTICA = os.environ.get("MS_LOGISTICA_URL", "http://ms-logistica:8000")
 
+# Tablas de las que depende el reporte (invalidación vía change_bus)
+REPORTE_TABLES = ["productos", "incidents", "movimientos", "alertas", "delivery_requests"]
 
-@router.get("/consolidados")
-async def generar_reporte_consolidado(
-    desde: str = Query(..., description="Fecha de inicio (YYYY-MM-DD)"),
-    hasta: str = Query(..., description="Fecha de fin (YYYY-MM-DD)")
-):
-    """Consolida métricas desde ms-inventario y ms-logistica con filtros de fecha."""
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        # Productos totales
-        inv_products = await client.get(f"{MS_INVENTARIO}/productos")
-        productos = inv_products.json() if inv_products.status_code == 200 else []
-
-        # Incidentes en rango
-        incidents = await client.get(
-            f"{MS_LOGISTICA}/maps/incidents",
-            params={"created_from": desde + "T00:00:00", "created_to": hasta + "T23:59:59"}
-        )
-        incidentes = incidents.json() if incidents.status_code == 200 else []
+# Cliente compartido: reutiliza conexiones keep-alive hacia los microservicios
+_client: httpx.AsyncClient | None = None
 
-        # Movimientos count en rango
-        mov_count = await client.get(
-            f"{MS_INVENTARIO}/movements/count",
-            params={"desde": desde, "hasta": hasta}
-        )
-        movimientos_en_rango = mov_count.json().get("count", 0) if mov_count.status_code == 200 else 0
 
-        # Alertas count en rango
-        alerts_count = await client.get(
-            f"{MS_INVENTARIO}/alerts/count",
-            params={"desde": desde, "hasta": hasta}
-        )
-        alertas_en_rango = alerts_count.json().get("count", 0) if alerts_count.status_code == 200 else 0
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = traced_client(timeout=20.0)
+    return _client
 
-        # Rutas (delivery requests) activas en rango
-        dr_count = await client.get(
-            f"{MS_LOGISTICA}/maps/delivery_requests/count",
-            params={"created_from": desde + "T00:00:00", "created_to": hasta + "T23:59:59"}
-        )
-        rutas_activas = dr_count.json().get("count", 0) if dr_count.status_code == 200 else 0
+
+async def close_client() -> None:
+    """Cierra el cliente compartido (hook de shutdown de app/main.py)."""
+    if _client is not None:
+        await _client.aclose()
+
+
+async def _count(url: str, params: dict | None = None) -> int | None:
+    """GET a un endpoint /count; None si el servicio no respondió."""
+    try:
+        r = await _get_client().get(url, params=params)
+        if r.status_code == 200:
+            return r.json().get("count", 0)
+        logging.warning(f"⚠️ {url} respondió {r.status_code}")
+    except httpx.HTTPError as e:
+        logging.warning(f"⚠️ Error consultando {url}: {e}")
+    return None
+
+
+class _ReporteParcial(Exception):
+    def __init__(self, reporte: dict):
+        super().__init__("reporte parcial")
+        self.reporte = reporte
+
+
+async def _armar_reporte(desde: str, hasta: str) -> dict:
+    rango_fecha = {"desde": desde, "hasta": hasta}
+    rango_ts = {"created_from": desde + "T00:00:00", "created_to": hasta + "T23:59:59"}
+
+    # Las cinco consultas en paralelo: la latencia es la de la más lenta
+    productos, incidentes, movimientos, alertas, rutas = await asyncio.gather(
+        _count(f"{MS_INVENTARIO}/productos/count"),
+        _count(f"{MS_LOGISTICA}/maps/incidents/count", rango_ts),
+        _count(f"{MS_INVENTARIO}/movements/count", rango_fecha),
+        _count(f"{MS_INVENTARIO}/alerts/count", rango_fecha),
+        _count(f"{MS_LOGISTICA}/maps/delivery_requests/count", rango_ts),
+    )
+    completo = None not in (productos, incidentes, movimientos, alertas, rutas)
 
     reporte = {
         "periodo": f"{desde} - {hasta}",
-        "total_productos": len(productos),
-        "rutas_activas": rutas_activas,
-        "incidentes_registrados": len(incidentes),
-        "movimientos_en_rango": movimientos_en_rango,
-        "alertas_en_rango": alertas_en_rango,
+        "total_productos": productos or 0,
+        "rutas_activas": rutas or 0,
+        "incidentes_registrados": incidentes or 0,
+        "movimientos_en_rango": movimientos or 0,
+        "alertas_en_rango": alertas or 0,
     }
+    if not completo:
+        # Un reporte parcial no se cachea
+        raise _ReporteParcial(reporte)
+    return reporte
+
+
+@router.get("/consolidados")
+async def generar_reporte_consolidado(
+    desde: str = Query(..., description="Fecha de inicio (YYYY-MM-DD)"),
+    hasta: str = Query(..., description="Fecha de fin (YYYY-MM-DD)")
+):
+    """Consolida métricas desde ms-inventario y ms-logistica con filtros de fecha."""
+    try:
+        reporte = await cache.aget_or_load(
+            ("reporte_consolidado", desde, hasta),
+            lambda: _armar_reporte(desde, hasta),
+            tables=REPORTE_TABLES,
+        )
+    except _ReporteParcial as e:
+        reporte = e.reporte
     return {"status": "success", "reporte": reporte}
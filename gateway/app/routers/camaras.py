@@ -1,9 +1,12 @@
 ﻿import os
-import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from pydantic import BaseModel
 from typing import List, Dict, Any
 from sqlalchemy import text
 from ..db import SessionLocal
+from ..camera_health import CameraHealthMonitor
+from ..hls_relay import HLSRelay, RELAY_ENABLED, UpstreamError
 
 router = APIRouter(prefix="/camaras", tags=["camaras"])
 
@@ -12,33 +15,66 @@ CAM_LIST = [c.strip() for c in os.getenv("CAM_IDS", "cam1,cam2").split(",") if c
 MTX_PUBLIC_URL = os.getenv("MTX_PUBLIC_URL", "http://localhost:8888").rstrip("/")
 MTX_INTERNAL_URL = os.getenv("MTX_INTERNAL_URL", "http://mediamtx:8888").rstrip("/")
 
+# Estado de las cámaras mantenido en segundo plano (sin sondeos en línea)
+monitor = CameraHealthMonitor(MTX_INTERNAL_URL, CAM_LIST, SessionLocal)
+
+# Relay HLS opcional (HLS_RELAY=1): los espectadores comparten descargas
+relay = HLSRelay(MTX_INTERNAL_URL)
+
+
+@router.on_event("startup")
+async def _start_monitor():
+    monitor.start()
+
+
+@router.on_event("shutdown")
+async def _stop_monitor():
+    await monitor.stop()
+    await relay.close()
+
 @router.get("/list")
 def listar_camaras() -> Dict[str, List[str]]:
     return {"camaras": CAM_LIST}
 
 @router.get("/hls/{cam_id}")
-def obtener_hls(cam_id: str) -> Dict[str, str]:
+def obtener_hls(cam_id: str, request: Request) -> Dict[str, str]:
     if cam_id not in CAM_LIST:
         raise HTTPException(status_code=404, detail="Cámara no encontrada")
+    if RELAY_ENABLED:
+        relay_url = request.url_for("relay_hls", cam_id=cam_id, path="index.m3u8")
+        return {"m3u8": str(relay_url)}
     return {"m3u8": f"{MTX_PUBLIC_URL}/{cam_id}/index.m3u8"}
 
-async def _probe_manifest(hls_url: str) -> bool:
-    """Usa GET (no HEAD) y verifica presencia de #EXTM3U."""
+@router.get("/relay/{cam_id}/{path:path}", name="relay_hls")
+async def relay_hls(cam_id: str, path: str, request: Request) -> Response:
+    """Playlist/segmento HLS servido desde la micro-caché del gateway."""
+    if not RELAY_ENABLED:
+        raise HTTPException(status_code=404, detail="Relay HLS deshabilitado")
+    if cam_id not in CAM_LIST and cam_id not in monitor.statuses:
+        raise HTTPException(status_code=404, detail="Cámara no encontrada")
+    if ".." in path.split("/"):
+        raise HTTPException(status_code=400, detail="Ruta inválida")
     try:
-        async with httpx.AsyncClient(timeout=3.0) as client:
-            r = await client.get(hls_url)
-            return (r.status_code == 200) and ("#EXTM3U" in r.text[:300])
-    except Exception:
-        return False
+        resource = await relay.get(cam_id, path, request.url.query)
+    except UpstreamError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    cache_control = "no-cache" if path.endswith(".m3u8") else "public, max-age=60"
+    return Response(
+        content=resource.body,
+        media_type=resource.content_type,
+        headers={"Cache-Control": cache_control},
+    )
 
 @router.get("/health/{cam_id}")
 async def health_cam(cam_id: str) -> Dict[str, Any]:
     if cam_id not in CAM_LIST:
         raise HTTPException(status_code=404, detail="Cámara no encontrada")
-    online = await _probe_manifest(f"{MTX_INTERNAL_URL}/{cam_id}/index.m3u8")
+    st = monitor.status(cam_id)
     return {
         "cam_id": cam_id,
-        "online": online,
+        "online": st.online,
+        "last_seen": st.last_seen,
+        "last_checked": st.last_checked,
         "url": f"{MTX_PUBLIC_URL}/{cam_id}/index.m3u8"
     }
 
@@ -46,10 +82,12 @@ async def health_cam(cam_id: str) -> Dict[str, Any]:
 async def health_all() -> Dict[str, List[Dict[str, Any]]]:
     res: List[Dict[str, Any]] = []
     for cam in CAM_LIST:
-        ok = await _probe_manifest(f"{MTX_INTERNAL_URL}/{cam}/index.m3u8")
+        st = monitor.status(cam)
         res.append({
             "cam_id": cam,
-            "online": ok,
+            "online": st.online,
+            "last_seen": st.last_seen,
+            "last_checked": st.last_checked,
             "url": f"{MTX_PUBLIC_URL}/{cam}/index.m3u8"
         })
     return {"camaras": res}
@@ -112,15 +150,16 @@ async def obtener_camaras_por_carga(delivery_id: int) -> Dict[str, Any]:
         
         cameras_list = []
         for cam in cameras:
-            # Verificar si stream está online
-            is_online = await _probe_manifest(f"{MTX_INTERNAL_URL}/{cam.camera_id}/index.m3u8")
+            # Estado del stream desde el monitor en segundo plano
+            st = monitor.status(cam.camera_id)
             cameras_list.append({
                 "id": cam.id,
                 "camera_id": cam.camera_id,
                 "camera_name": cam.camera_name,
                 "position": cam.position,
                 "stream_url": cam.stream_url,
-                "online": is_online,
+                "online": st.online,
+                "last_seen": st.last_seen,
                 "m3u8_url": f"{MTX_PUBLIC_URL}/{cam.camera_id}/index.m3u8"
             })
         
@@ -137,6 +176,118 @@ async def obtener_camaras_por_carga(delivery_id: int) -> Dict[str, Any]:
     finally:
         db.close()
 
+MAX_BULK_IDS = 500
+
+
+class BulkCamerasRequest(BaseModel):
+    delivery_ids: List[int] = []
+    vehicle_ids: List[int] = []
+
+
+def _camera_dict(row) -> Dict[str, Any]:
+    st = monitor.status(row.camera_id)
+    return {
+        "id": row.camera_db_id,
+        "camera_id": row.camera_id,
+        "camera_name": row.camera_name,
+        "position": row.position,
+        "stream_url": row.stream_url,
+        "online": st.online,
+        "last_seen": st.last_seen,
+        "m3u8_url": f"{MTX_PUBLIC_URL}/{row.camera_id}/index.m3u8"
+    }
+
+
+@router.post("/bulk")
+async def obtener_camaras_bulk(payload: BulkCamerasRequest) -> Dict[str, Any]:
+    """
+    HU6 (vista de cargas): cámaras de varias cargas y/o vehículos en una sola consulta.
+    El estado online sale del monitor en segundo plano (sin sondeos en línea).
+    """
+    delivery_ids = list(dict.fromkeys(payload.delivery_ids))
+    vehicle_ids = list(dict.fromkeys(payload.vehicle_ids))
+    if len(delivery_ids) + len(vehicle_ids) > MAX_BULK_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BULK_IDS} ids por consulta")
+    if not delivery_ids and not vehicle_ids:
+        return {"deliveries": [], "vehicles": [], "not_found": {"deliveries": [], "vehicles": []}}
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text("""
+            SELECT
+                src.kind,
+                src.delivery_id,
+                src.status,
+                src.origin_address,
+                src.destination_address,
+                src.vehicle_id,
+                v.id AS existing_vehicle_id,
+                v.code AS vehicle_code,
+                vc.id AS camera_db_id,
+                vc.camera_id,
+                vc.camera_name,
+                vc.position,
+                vc.stream_url
+            FROM (
+                SELECT 'delivery' AS kind, dr.id AS delivery_id, dr.status,
+                       dr.origin_address, dr.destination_address, dr.vehicle_id
+                FROM delivery_requests dr
+                WHERE dr.id = ANY(:delivery_ids)
+                UNION ALL
+                SELECT 'vehicle', NULL, NULL, NULL, NULL, vid
+                FROM unnest(CAST(:vehicle_ids AS INTEGER[])) AS vid
+            ) src
+            LEFT JOIN vehicles v ON v.id = src.vehicle_id
+            LEFT JOIN vehicle_cameras vc ON vc.vehicle_id = src.vehicle_id AND vc.active = true
+            ORDER BY vc.position
+            """),
+            {"delivery_ids": delivery_ids, "vehicle_ids": vehicle_ids}
+        ).fetchall()
+    finally:
+        db.close()
+
+    deliveries: Dict[int, Dict[str, Any]] = {}
+    vehicles: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        if row.kind == "delivery":
+            entry = deliveries.get(row.delivery_id)
+            if entry is None:
+                entry = deliveries[row.delivery_id] = {
+                    "delivery_id": row.delivery_id,
+                    "status": row.status,
+                    "vehicle_id": row.vehicle_id,
+                    "vehicle_code": row.vehicle_code,
+                    "origin": row.origin_address,
+                    "destination": row.destination_address,
+                    "camaras": []
+                }
+        else:
+            if row.existing_vehicle_id is None:
+                continue  # vehículo inexistente
+            entry = vehicles.get(row.vehicle_id)
+            if entry is None:
+                entry = vehicles[row.vehicle_id] = {
+                    "vehicle_id": row.vehicle_id,
+                    "vehicle_code": row.vehicle_code,
+                    "camaras": []
+                }
+        if row.camera_id is not None:
+            entry["camaras"].append(_camera_dict(row))
+
+    for entry in list(deliveries.values()) + list(vehicles.values()):
+        entry["total_camaras"] = len(entry["camaras"])
+
+    return {
+        "deliveries": [deliveries[i] for i in delivery_ids if i in deliveries],
+        "vehicles": [vehicles[i] for i in vehicle_ids if i in vehicles],
+        "not_found": {
+            "deliveries": [i for i in delivery_ids if i not in deliveries],
+            "vehicles": [i for i in vehicle_ids if i not in vehicles]
+        }
+    }
+
+
 @router.post("/vehicle/{vehicle_id}/camera")
 async def asignar_camara_a_vehiculo(
     vehicle_id: int,
@@ -255,7 +406,7 @@ async def listar_camaras_de_vehiculo(vehicle_id: int) -> Dict[str, Any]:
         
         cameras_list = []
         for cam in cameras:
-            is_online = await _probe_manifest(f"{MTX_INTERNAL_URL}/{cam.camera_id}/index.m3u8")
+            st = monitor.status(cam.camera_id)
             cameras_list.append({
                 "id": cam.id,
                 "camera_id": cam.camera_id,
@@ -263,7 +414,8 @@ async def listar_camaras_de_vehiculo(vehicle_id: int) -> Dict[str, Any]:
                 "position": cam.position,
                 "stream_url": cam.stream_url,
                 "active": cam.active,
-                "online": is_online,
+                "online": st.online,
+                "last_seen": st.last_seen,
                 "m3u8_url": f"{MTX_PUBLIC_URL}/{cam.camera_id}/index.m3u8"
             })
         
@@ -0,0 +1,225 @@
+"""
+Canal push de cambios para el dashboard (SSE y WebSocket)
+
+En lugar de que cada dashboard haga polling cada pocos segundos, el gateway
+recibe los cambios de la base de datos por LISTEN/NOTIFY (change_bus) y los
+reparte a los clientes suscritos: un cambio en la BD = un fan-out.
+
+Tópicos:
+- deliveries: delivery_requests
+- shifts:     dynamic_shifts, dynamic_shift_assignments
+- incidents:  incidents
+
+Los eventos solo llevan {table, op, id}; el cliente recarga lo necesario
+(p.ej. /api/changes/deliveries?since=<cursor>).
+
+Cada cliente tiene un buffer acotado que coalesce ráfagas por (tabla, id).
+Si el cliente es lento y el buffer se llena, o si el listener pierde la
+conexión con la BD, se descartan los cambios pendientes y se envía un evento
+`resync` para que el cliente recargue completo.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from ..change_bus import listener as change_listener
+
+router = APIRouter(prefix="/live", tags=["live"])
+
+TOPIC_TABLES: Dict[str, Set[str]] = {
+    "deliveries": {"delivery_requests"},
+    "shifts": {"dynamic_shifts", "dynamic_shift_assignments"},
+    "incidents": {"incidents"},
+}
+TABLE_TOPIC: Dict[str, str] = {t: topic for topic, tables in TOPIC_TABLES.items() for t in tables}
+
+HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+COALESCE_SECONDS = float(os.getenv("LIVE_COALESCE_SECONDS", "0.25"))
+MAX_PENDING = int(os.getenv("LIVE_MAX_PENDING", "500"))
+SEND_TIMEOUT_SECONDS = 10.0
+
+
+class Subscriber:
+    """Buffer de cambios pendientes de un cliente."""
+
+    def __init__(self, topics: Iterable[str], max_pending: int = MAX_PENDING):
+        self.topics: Set[str] = set(topics)
+        self.max_pending = max_pending
+        self.pending: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.resync = False
+        self.wakeup = asyncio.Event()
+
+    def offer(self, topic: str, change: Dict[str, Any]) -> None:
+        if topic not in self.topics or self.resync:
+            return
+        key = (change.get("table"), change.get("id"))
+        if key in self.pending:
+            # Coalescer: solo interesa el último estado de la fila
+            self.pending.move_to_end(key)
+        elif len(self.pending) >= self.max_pending:
+            self.mark_resync()
+            return
+        self.pending[key] = {"topic": topic, **change}
+        self.wakeup.set()
+
+    def mark_resync(self) -> None:
+        self.pending.clear()
+        self.resync = True
+        self.wakeup.set()
+
+    async def next_message(self) -> Optional[Dict[str, Any]]:
+        """Espera el siguiente lote; retorna None si venció el heartbeat."""
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            return None
+        # Ventana corta para agrupar ráfagas (p.ej. triggers en cascada)
+        await asyncio.sleep(COALESCE_SECONDS)
+        self.wakeup.clear()
+        if self.resync:
+            self.resync = False
+            return {"event": "resync", "topics": sorted(self.topics)}
+        changes = list(self.pending.values())
+        self.pending.clear()
+        if not changes:
+            return None
+        return {"event": "changes", "changes": changes}
+
+
+class ChangeHub:
+    """Reparte cada notificación de change_bus a los suscriptores del tópico."""
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+
+    def subscribe(self, topics: Iterable[str]) -> Subscriber:
+        sub = Subscriber(topics)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self.subscribers.discard(sub)
+
+    def publish(self, change: Dict[str, Any]) -> None:
+        topic = TABLE_TOPIC.get(change.get("table"))
+        if topic is None:
+            return
+        for sub in self.subscribers:
+            sub.offer(topic, change)
+
+    def on_connection_change(self, connected: bool) -> None:
+        # Pudieron perderse notificaciones mientras no había conexión
+        if connected:
+            for sub in self.subscribers:
+                sub.mark_resync()
+
+
+hub = ChangeHub()
+change_listener.subscribe(hub.publish)
+change_listener.on_connection_change(hub.on_connection_change)
+
+
+def _parse_topics(topics: Optional[str]) -> List[str]:
+    if not topics:
+        return list(TOPIC_TABLES)
+    requested = [t.strip() for t in topics.split(",") if t.strip()]
+    unknown = [t for t in requested if t not in TOPIC_TABLES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Tópicos desconocidos: {', '.join(unknown)}")
+    return requested
+
+
+@router.get("/topics")
+def listar_topicos() -> Dict[str, Any]:
+    return {
+        "topics": {topic: sorted(tables) for topic, tables in TOPIC_TABLES.items()},
+        "listener_connected": change_listener.connected,
+    }
+
+
+@router.get("/stream")
+async def stream_sse(request: Request, topics: Optional[str] = None):
+    """
+    Server-Sent Events: /api/live/stream?topics=deliveries,incidents
+    Eventos `changes` y `resync`; comentario `: ping` como heartbeat.
+    """
+    sub = hub.subscribe(_parse_topics(topics))
+
+    async def event_source():
+        try:
+            yield f"retry: 5000\nevent: ready\ndata: {json.dumps({'topics': sorted(sub.topics)})}\n\n"
+            while not await request.is_disconnected():
+                message = await sub.next_message()
+                if message is None:
+                    yield ": ping\n\n"
+                    continue
+                event = message.pop("event")
+                yield f"event: {event}\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def stream_ws(websocket: WebSocket, topics: Optional[str] = None):
+    """
+    WebSocket: /api/live/ws?topics=shifts
+    El cliente puede cambiar la suscripción enviando
+    {"subscribe": ["incidents"]} o {"unsubscribe": ["shifts"]}.
+    """
+    try:
+        requested = _parse_topics(topics)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    await websocket.accept()
+    sub = hub.subscribe(requested)
+
+    async def read_commands():
+        while True:
+            data = await websocket.receive_json()
+            for topic in data.get("subscribe", []):
+                if topic in TOPIC_TABLES:
+                    sub.topics.add(topic)
+            for topic in data.get("unsubscribe", []):
+                sub.topics.discard(topic)
+            await websocket.send_json({"event": "subscribed", "topics": sorted(sub.topics)})
+
+    reader = asyncio.create_task(read_commands())
+    try:
+        await websocket.send_json({"event": "ready", "topics": sorted(sub.topics)})
+        while True:
+            waiter = asyncio.ensure_future(sub.next_message())
+            await asyncio.wait({waiter, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if reader.done():
+                waiter.cancel()
+                break
+            message = waiter.result()
+            if message is None:
+                message = {"event": "ping"}
+            # Back-pressure: un cliente que no consume se desconecta en vez de
+            # acumular memoria en el gateway
+            await asyncio.wait_for(websocket.send_json(message), SEND_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logging.warning("⚠️ Cliente WebSocket lento desconectado")
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        hub.unsubscribe(sub)
+        if reader.done() and not reader.cancelled() and reader.exception() is not None:
+            if not isinstance(reader.exception(), WebSocketDisconnect):
+                logging.warning(f"⚠️ Error leyendo comandos WebSocket: {reader.exception()}")
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Outbox de sincronización rutas → RR.HH. (infra/sql/025_rrhh_sync_outbox.sql)
+
+La asignación de una ruta solo escribe la delivery_request y una fila en
+rrhh_sync_outbox (``encolar``) en la misma transacción, y responde. El
+``OutboxWorker`` crea después el turno dinámico y la asignación del
+conductor:
+
+- Toma lotes con ``FOR UPDATE SKIP LOCKED``: varios procesos del gateway
+  pueden drenar la cola sin pisarse.
+- Cada lote es una sola sentencia (CTEs) y es idempotente: reutiliza el
+  turno de la ruta si ya existe y no duplica asignaciones. Si la ruta se
+  reencola con otro conductor, el anterior sale del turno (una ruta, un
+  conductor).
+- Si el lote falla, reprocesa sus filas de a una; la que falla queda con
+  ``ultimo_error`` y se reintenta con backoff hasta MAX_INTENTOS.
+
+El worker despierta con el aviso de INSERT en erp_changes (change_bus) y,
+si el listener está caído, con un sondeo cada OUTBOX_POLL_SECONDS. El estado
+(rrhh_sync_status) viaja en las filas de /api/loads/summary y del feed
+/api/changes/deliveries; la vista de cargas (LoadsManagement) lo muestra.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+TABLA = "rrhh_sync_outbox"
+ROL = "Conductor Principal"
+# Roles de conducción de un turno (igual que ROLES_CONDUCCION en ms-rrhh/app/driving_rules.py)
+ROLES_CONDUCCION = ("conductor", ROL)
+LOTE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "10"))
+MAX_INTENTOS = 5
+BACKOFF_BASE_SECONDS = 5
+DURACION_MINIMA = 30
+# Zona de los turnos (shifts.timezone): fecha y hora se guardan como hora local
+ZONA_TURNOS = os.getenv("SHIFTS_TIMEZONE", "America/Santiago")
+
+_ENCOLAR = text("""
+    INSERT INTO rrhh_sync_outbox
+        (delivery_request_id, employee_id, fecha_programada, hora_inicio, duracion_minutos)
+    SELECT dr.id, :employee_id, :fecha, :hora, :duracion
+    FROM delivery_requests dr
+    WHERE dr.id = :delivery_request_id
+    ON CONFLICT (delivery_request_id) DO UPDATE SET
+        employee_id = EXCLUDED.employee_id,
+        fecha_programada = EXCLUDED.fecha_programada,
+        hora_inicio = EXCLUDED.hora_inicio,
+        duracion_minutos = EXCLUDED.duracion_minutos,
+        status = 'pendiente',
+        intentos = 0,
+        ultimo_error = NULL,
+        disponible_at = NOW()
+    -- Ya procesada: solo se reprocesa si cambió el conductor
+    WHERE rrhh_sync_outbox.status <> 'procesado'
+       OR rrhh_sync_outbox.employee_id IS DISTINCT FROM EXCLUDED.employee_id
+    RETURNING id, status, dynamic_shift_id
+""")
+
+_ESTADO = text("""
+    SELECT id, status, dynamic_shift_id FROM rrhh_sync_outbox WHERE delivery_request_id = :delivery_request_id
+""")
+
+# Un lote completo en una sentencia. :solo_id limita a una fila (reproceso).
+_PROCESAR = text("""
+    WITH lote AS (
+        SELECT id, delivery_request_id, employee_id, fecha_programada, hora_inicio, duracion_minutos
+        FROM rrhh_sync_outbox
+        WHERE status = 'pendiente' AND disponible_at <= NOW()
+          AND (CAST(:solo_id AS BIGINT) IS NULL OR id = CAST(:solo_id AS BIGINT))
+        ORDER BY disponible_at, id
+        LIMIT :lote
+        FOR UPDATE SKIP LOCKED
+    ), existentes AS (
+        SELECT DISTINCT ON (ds.route_id) ds.route_id, ds.id
+        FROM dynamic_shifts ds
+        WHERE ds.route_id IN (SELECT delivery_request_id FROM lote)
+        ORDER BY ds.route_id, ds.id
+    ), nuevos AS (
+        INSERT INTO dynamic_shifts (route_id, fecha_programada, hora_inicio, duracion_minutos, status)
+        SELECT l.delivery_request_id, l.fecha_programada, l.hora_inicio, l.duracion_minutos, 'asignado'
+        FROM lote l
+        WHERE NOT EXISTS (SELECT 1 FROM existentes e WHERE e.route_id = l.delivery_request_id)
+        RETURNING route_id, id
+    ), turnos AS (
+        SELECT route_id, id FROM existentes
+        UNION ALL
+        SELECT route_id, id FROM nuevos
+    ), reemplazados AS (
+        -- Conductor anterior de la ruta (reencolada con otro conductor)
+        DELETE FROM dynamic_shift_assignments a
+        USING lote l
+        JOIN turnos t ON t.route_id = l.delivery_request_id
+        WHERE a.dynamic_shift_id = t.id
+          AND a.employee_id <> l.employee_id
+          AND a.role_in_shift = ANY(:roles)
+    ), asignaciones AS (
+        INSERT INTO dynamic_shift_assignments (dynamic_shift_id, employee_id, role_in_shift, status)
+        SELECT t.id, l.employee_id, :rol, 'asignado'
+        FROM lote l
+        JOIN turnos t ON t.route_id = l.delivery_request_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM dynamic_shift_assignments a
+            WHERE a.dynamic_shift_id = t.id AND a.employee_id = l.employee_id
+              AND a.status <> 'cancelado'
+        )
+        ON CONFLICT (dynamic_shift_id, employee_id, role_in_shift) DO UPDATE SET status = 'asignado'
+    ), feed AS (
+        -- Nuevo change_xid: el feed de entregas publica el estado
+        UPDATE delivery_requests SET updated_at = NOW()
+        WHERE id IN (SELECT delivery_request_id FROM lote)
+    )
+    UPDATE rrhh_sync_outbox o SET
+        status = 'procesado',
+        dynamic_shift_id = t.id,
+        intentos = o.intentos + 1,
+        ultimo_error = NULL,
+        procesado_at = NOW()
+    FROM lote l
+    JOIN turnos t ON t.route_id = l.delivery_request_id
+    WHERE o.id = l.id
+    RETURNING o.id
+""")
+
+_PARAMS = {"rol": ROL, "roles": list(ROLES_CONDUCCION)}
+
+_PENDIENTES = text("""
+    SELECT id FROM rrhh_sync_outbox
+    WHERE status = 'pendiente' AND disponible_at <= NOW()
+    ORDER BY disponible_at, id
+    LIMIT :lote
+""")
+
+_FALLIDA = text("""
+    WITH fila AS (
+        UPDATE rrhh_sync_outbox SET
+            intentos = intentos + 1,
+            ultimo_error = :error,
+            status = CASE WHEN intentos + 1 >= :max_intentos THEN 'error' ELSE 'pendiente' END,
+            disponible_at = NOW() + make_interval(secs => :backoff * power(2, intentos))
+        WHERE id = :id
+        RETURNING delivery_request_id, status
+    )
+    UPDATE delivery_requests SET updated_at = NOW()
+    FROM fila
+    WHERE delivery_requests.id = fila.delivery_request_id AND fila.status = 'error'
+""")
+
+
+def _zona_turnos():
+    try:
+        return ZoneInfo(ZONA_TURNOS)
+    except ZoneInfoNotFoundError:
+        # Sin base de zonas horarias: hora local del proceso
+        logger.warning("Zona horaria %s no disponible, se usa la local", ZONA_TURNOS)
+        return None
+
+
+def parsear_ruta(route_data: Optional[Dict[str, Any]], ahora: Optional[datetime] = None):
+    """
+    (fecha, hora, duración en minutos) del turno a partir de route_data.
+
+    Un estimated_start con zona (p. ej. "...Z") se pasa a la zona de los
+    turnos antes de separar fecha y hora; uno sin zona se toma como hora
+    local de los turnos, igual que ``ahora``.
+    """
+    route_data = route_data or {}
+    zona = _zona_turnos()
+    ahora = ahora or datetime.now(zona).replace(tzinfo=None)
+    duracion = int(route_data.get("duration_s") or 0) // 60 or DURACION_MINIMA
+    inicio = ahora
+    estimated_start = route_data.get("estimated_start")
+    if estimated_start:
+        try:
+            inicio = datetime.fromisoformat(estimated_start.replace("Z", "+00:00"))
+        except (AttributeError, ValueError) as e:
+            logger.warning("Fecha de inicio inválida (%s), se usa la actual: %s", estimated_start, e)
+    if inicio.tzinfo is not None:
+        inicio = inicio.astimezone(zona).replace(tzinfo=None)
+    return inicio.date(), inicio.time().replace(microsecond=0), duracion
+
+
+def encolar(db: Session, delivery_request_id: int, employee_id: int,
+            route_data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Registra (o reprograma, si aún no se procesó) la sincronización de una
+    ruta. No confirma la transacción: el llamador la confirma junto con la
+    ruta. Retorna {id, status, dynamic_shift_id} o None si la ruta no existe.
+    """
+    fecha, hora, duracion = parsear_ruta(route_data)
+    row = db.execute(_ENCOLAR, {
+        "delivery_request_id": delivery_request_id,
+        "employee_id": employee_id,
+        "fecha": fecha,
+        "hora": hora,
+        "duracion": duracion,
+    }).fetchone()
+    if row is None:
+        # Ruta inexistente o ya procesada (el upsert no la toca)
+        row = db.execute(_ESTADO, {"delivery_request_id": delivery_request_id}).fetchone()
+    if row is None:
+        return None
+    return {"id": row[0], "status": row[1], "dynamic_shift_id": row[2]}
+
+
+def _motivo(exc: Exception) -> str:
+    # Error del driver, sin la sentencia SQL que agrega SQLAlchemy
+    return str(getattr(exc, "orig", None) or exc).strip()
+
+
+def _marcar_fallida(db: Session, outbox_id: int, exc: Exception) -> None:
+    """Registra el error y el backoff de una fila sin cortar el reproceso del resto."""
+    try:
+        db.execute(_FALLIDA, {
+            "id": outbox_id,
+            "error": _motivo(exc)[:500],
+            "max_intentos": MAX_INTENTOS,
+            "backoff": BACKOFF_BASE_SECONDS,
+        })
+        db.commit()
+    except Exception as e:
+        # La fila sigue pendiente y se reintenta en el próximo ciclo
+        db.rollback()
+        logger.error("Outbox %s: no se pudo registrar el error: %s", outbox_id, _motivo(e))
+
+
+def procesar_lote(session_factory, lote: int = LOTE) -> int:
+    """Procesa hasta ``lote`` filas pendientes. Retorna cuántas se tomaron."""
+    db = session_factory()
+    try:
+        try:
+            procesadas = len(db.execute(_PROCESAR, {"solo_id": None, "lote": lote, **_PARAMS}).fetchall())
+            db.commit()
+            return procesadas
+        except Exception as e:
+            db.rollback()
+            logger.warning("Lote de outbox falló (%s); se reprocesa fila por fila", _motivo(e))
+
+        ids = [r[0] for r in db.execute(_PENDIENTES, {"lote": lote})]
+        db.rollback()
+        for outbox_id in ids:
+            try:
+                db.execute(_PROCESAR, {"solo_id": outbox_id, "lote": 1, **_PARAMS})
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error("Outbox %s: error al sincronizar con RR.HH.: %s", outbox_id, _motivo(e))
+                _marcar_fallida(db, outbox_id, e)
+        return len(ids)
+    finally:
+        db.close()
+
+
+class OutboxWorker:
+    """Tarea asyncio que drena rrhh_sync_outbox en lotes."""
+
+    def __init__(self, lote: int = LOTE, poll_seconds: float = POLL_SECONDS):
+        self.lote = lote
+        self.poll_seconds = poll_seconds
+        self._despertar: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def handle_notification(self, change: Dict[str, Any]) -> None:
+        if change.get("table") == TABLA and change.get("op") == "INSERT":
+            self.despertar()
+
+    def despertar(self) -> None:
+        if self._despertar is not None:
+            self._despertar.set()
+
+    def start(self, engine, session_factory) -> Optional[asyncio.Task]:
+        """Inicia el worker si ``engine`` apunta a Postgres."""
+        if engine is None or engine.dialect.name != "postgresql":
+            logger.info("Worker de outbox RR.HH. deshabilitado (base de datos no es Postgres)")
+            return None
+        self._despertar = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run(session_factory))
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self, session_factory) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._despertar.clear()
+            try:
+                # Drenar: mientras salgan lotes llenos hay más pendientes
+                while await loop.run_in_executor(None, procesar_lote, session_factory, self.lote) >= self.lote:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Worker de outbox RR.HH.: %s", exc)
+            try:
+                await asyncio.wait_for(self._despertar.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+worker = OutboxWorker()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Cobertura semanal de turnos (base de las sugerencias de asignación)
+
+Una sola consulta agrupada con GROUPING SETS sobre shift_assignments de la
+semana entrega a la vez:
+
+- (date, shift_id): cuántas asignaciones tiene cada turno cada día.
+- (employee_id):     cuántas asignaciones tiene cada empleado.
+- ():                total de la semana.
+
+Con eso se arma una matriz densa día x turno y un conteo por empleado en
+O(días·turnos + empleados), sin volver a recorrer las asignaciones por cada
+empleado o por cada (día, turno).
+
+El resultado se cachea por semana ISO en la caché de change_bus y se
+invalida con cualquier cambio en shift_assignments, shifts o employees
+(notificaciones LISTEN/NOTIFY o `invalidar_cobertura()` tras una escritura).
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .change_bus import cache
+
+TABLAS = ("shift_assignments", "shifts", "employees")
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+
+@dataclass(frozen=True)
+class CoberturaSemanal:
+    week_start: date
+    week_end: date
+    # (id, tipo, start_time, end_time) en orden de start_time
+    shifts: Tuple[tuple, ...]
+    # matriz[día][índice del turno] = asignaciones
+    matriz: Tuple[Tuple[int, ...], ...]
+    # (id, nombre, email, asignaciones de la semana) de empleados activos
+    empleados: Tuple[tuple, ...]
+    total_asignaciones: int
+
+    def turnos_sin_cubrir(self) -> List[dict]:
+        sin_cubrir = []
+        for dia, fila in enumerate(self.matriz):
+            fecha = self.week_start + timedelta(days=dia)
+            for (shift_id, tipo, start_time, end_time), asignados in zip(self.shifts, fila):
+                if asignados == 0:
+                    sin_cubrir.append({
+                        "date": fecha.isoformat(),
+                        "weekday": DIAS_SEMANA[dia],
+                        "shift_tipo": tipo,
+                        "shift_id": shift_id,
+                        "start_time": start_time,
+                        "end_time": end_time,
+                        "assigned_count": 0,
+                        "has_coverage": False,
+                    })
+        return sin_cubrir
+
+
+def inicio_semana(hoy: date) -> date:
+    return hoy - timedelta(days=hoy.weekday())
+
+
+def _cargar(session: Session, week_start: date) -> CoberturaSemanal:
+    week_end = week_start + timedelta(days=6)
+
+    shifts = tuple(tuple(row) for row in session.execute(text(
+        "SELECT id, tipo, start_time, end_time FROM shifts ORDER BY start_time, id"
+    )))
+    columna = {row[0]: i for i, row in enumerate(shifts)}
+
+    matriz = [[0] * len(shifts) for _ in range(7)]
+    por_empleado: Dict[int, int] = {}
+    total = 0
+    rows = session.execute(text("""
+        SELECT date, shift_id, employee_id, COUNT(*) AS n,
+               GROUPING(date, shift_id) AS g_turno, GROUPING(employee_id) AS g_empleado
+        FROM shift_assignments
+        WHERE date BETWEEN :week_start AND :week_end
+        GROUP BY GROUPING SETS ((date, shift_id), (employee_id), ())
+    """), {"week_start": week_start, "week_end": week_end})
+    for fecha, shift_id, employee_id, n, g_turno, g_empleado in rows:
+        if g_turno == 0:
+            if shift_id in columna:
+                matriz[(fecha - week_start).days][columna[shift_id]] = n
+        elif g_empleado == 0:
+            por_empleado[employee_id] = n
+        else:
+            total = n
+
+    empleados = tuple(
+        (emp_id, nombre, email, por_empleado.get(emp_id, 0))
+        for emp_id, nombre, email in session.execute(text(
+            "SELECT id, nombre, email FROM employees WHERE activo = true ORDER BY id"
+        ))
+    )
+    return CoberturaSemanal(
+        week_start=week_start,
+        week_end=week_end,
+        shifts=shifts,
+        matriz=tuple(tuple(fila) for fila in matriz),
+        empleados=empleados,
+        total_asignaciones=total,
+    )
+
+
+def cobertura_semanal(session: Session, hoy: Optional[date] = None) -> CoberturaSemanal:
+    """Cobertura de la semana (lunes a domingo) que contiene `hoy`."""
+    week_start = inicio_semana(hoy or date.today())
+    anio, semana, _ = week_start.isocalendar()
+    return cache.get_or_load(
+        ("cobertura_semanal", anio, semana),
+        lambda: _cargar(session, week_start),
+        tables=TABLAS,
+    )
+
+
+def invalidar_cobertura() -> None:
+    """Invalida las coberturas cacheadas tras escribir asignaciones."""
+    cache.invalidate("shift_assignments")
@@ -0,0 +1,41 @@
+"""
+Pruebas de la caché de app/change_bus.py (sin base de datos).
+
+Ejecutar desde gateway/:  python -m pytest tests/test_change_bus.py
+"""
+
+from app.change_bus import EntityCache
+
+
+def make_cache(**kwargs):
+    cache = EntityCache(**kwargs)
+    cache.set_active(True)
+    return cache
+
+
+def test_claves_vencidas_y_antiguas_se_desalojan():
+    cache = make_cache(max_entries=10)
+    # Claves por rango/semana que vencen y no se vuelven a pedir
+    for i in range(5):
+        cache.get_or_load(("semana", i), lambda: i, tables=["shifts"], ttl=0)
+    for i in range(6):
+        cache.get_or_load(("rango", i), lambda: i, tables=["shifts"], entities=[("employees", i)])
+    # Al pasarse del tope se barren las 5 vencidas
+    assert set(cache._entries) == {("rango", i) for i in range(6)}
+    assert cache._by_table["shifts"] == set(cache._entries)
+
+    for i in range(6, 12):
+        cache.get_or_load(("rango", i), lambda: i, entities=[("employees", i)])
+    # Todas vigentes: al pasarse (rango 10) salen las más antiguas hasta
+    # dejar un 10 % libre
+    assert set(cache._entries) == {("rango", i) for i in range(2, 12)}
+    assert ("employees", "0") not in cache._by_entity
+    assert ("employees", "2") in cache._by_entity
+
+
+def test_invalidacion_limpia_todos_los_indices():
+    cache = make_cache()
+    cache.get_or_load("k", lambda: 1, tables=["shifts"], entities=[("employees", 7)])
+    assert cache.invalidate("employees", 7) == 1
+    assert not cache._entries and not cache._by_table and not cache._by_entity
+    assert cache.get_or_load("k", lambda: 2, tables=["shifts"]) == 2
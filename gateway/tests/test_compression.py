@@ -0,0 +1,99 @@
+"""
+Pruebas del middleware de compresión y ETag/304.
+
+Ejecutar desde gateway/:  python -m pytest tests/test_compression.py
+"""
+
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, etag_matches
+from app.fast_json import STREAM_THRESHOLD, json_array
+
+ROWS = [{"id": i, "nombre": f"Empleado {i}", "estado": "activo"} for i in range(200)]
+GRANDE = [{"id": i, "nombre": f"Empleado {i}"} for i in range(STREAM_THRESHOLD + 1)]
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/lista")
+    def lista():
+        return ROWS
+
+    @app.get("/chico")
+    def chico():
+        return {"ok": True}
+
+    @app.get("/grande")
+    def grande():
+        return json_array(GRANDE)
+
+    @app.get("/eventos")
+    def eventos():
+        return StreamingResponse(iter([b"data: 1\n\n"]), media_type="text/event-stream")
+
+    return TestClient(app)
+
+
+def test_gzip_above_threshold_and_plain_below():
+    client = make_client()
+    r = client.get("/lista", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert r.json() == ROWS
+    assert int(r.headers["content-length"]) < len(r.content)
+
+    r = client.get("/chico", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+    assert r.json() == {"ok": True}
+
+
+def test_if_none_match_returns_304():
+    client = make_client()
+    first = client.get("/lista")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+
+    second = client.get("/lista", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+
+    # El ETag no depende de la codificación negociada
+    compressed = client.get("/lista", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["etag"] == etag
+
+
+def test_event_stream_is_not_buffered():
+    client = make_client()
+    r = client.get("/eventos", headers={"Accept-Encoding": "gzip"})
+    assert "etag" not in r.headers
+    assert "content-encoding" not in r.headers
+
+
+def test_stream_is_compressed_incrementally_without_etag():
+    client = make_client()
+    with client.stream("GET", "/grande", headers={"Accept-Encoding": "gzip"}) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        assert "etag" not in r.headers
+        assert "content-length" not in r.headers
+        raw = b"".join(r.iter_raw())
+    # Un bloque gzip por bloque de filas, no un único cuerpo acumulado
+    assert raw.count(b"\x00\x00\xff\xff") > 1
+    assert gzip.decompress(raw).decode() == client.get("/grande").text
+
+    plano = client.get("/grande", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plano.headers
+    assert plano.json() == GRANDE
+
+
+def test_weak_comparison():
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"x", "abc"', 'W/"abc"')
+    assert etag_matches("*", 'W/"abc"')
+    assert not etag_matches('W/"abd"', 'W/"abc"')
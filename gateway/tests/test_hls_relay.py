@@ -0,0 +1,145 @@
+"""
+Pruebas del relay HLS contra un servidor HLS estático local (sustituto de mediamtx).
+
+Ejecutar desde gateway/:  python -m pytest tests/test_hls_relay.py
+"""
+
+import asyncio
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.hls_relay import HLSRelay, UpstreamError, playlist_ttl
+
+MASTER = b"#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\nstream.m3u8\n"
+MEDIA = (
+    b"#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:1\n#EXT-X-MEDIA-SEQUENCE:0\n"
+    b"#EXTINF:1.0,\nseg0.ts\n#EXTINF:1.0,\nseg1.ts\n#EXTINF:1.0,\nseg2.ts\n"
+)
+
+
+@pytest.fixture
+def hls_server(tmp_path):
+    cam = tmp_path / "cam1"
+    cam.mkdir()
+    (cam / "index.m3u8").write_bytes(MASTER)
+    (cam / "stream.m3u8").write_bytes(MEDIA)
+    for i in range(3):
+        (cam / f"seg{i}.ts").write_bytes(bytes([i]) * 1000)
+
+    hits = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(0.05)  # latencia de mediamtx: fuerza solapamiento
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=str(tmp_path)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+
+
+def test_concurrent_viewers_share_one_upstream_fetch(hls_server):
+    url, hits = hls_server
+
+    async def run():
+        relay = HLSRelay(url)
+        try:
+            results = await asyncio.gather(*(relay.get("cam1", "seg1.ts") for _ in range(20)))
+            playlists = await asyncio.gather(*(relay.get("cam1", "stream.m3u8") for _ in range(20)))
+            return results, playlists
+        finally:
+            await relay.close()
+
+    results, playlists = asyncio.run(run())
+    assert all(r.body == bytes([1]) * 1000 for r in results)
+    assert all(p.body == MEDIA for p in playlists)
+    assert hits.count("/cam1/seg1.ts") == 1
+    assert hits.count("/cam1/stream.m3u8") == 1
+
+
+def test_playlist_expires_after_fraction_of_target_duration(hls_server):
+    url, hits = hls_server
+    assert playlist_ttl(MEDIA) == pytest.approx(0.5)
+
+    async def run():
+        relay = HLSRelay(url)
+        try:
+            await relay.get("cam1", "stream.m3u8")
+            await relay.get("cam1", "stream.m3u8")
+            await asyncio.sleep(0.6)
+            await relay.get("cam1", "stream.m3u8")
+        finally:
+            await relay.close()
+
+    asyncio.run(run())
+    assert hits.count("/cam1/stream.m3u8") == 2
+
+
+def test_segment_buffer_is_bounded(hls_server):
+    url, hits = hls_server
+
+    async def run():
+        relay = HLSRelay(url, max_segment_bytes=2000)
+        try:
+            for i in range(3):
+                await relay.get("cam1", f"seg{i}.ts")
+            stats = relay.stats()
+            # seg0 fue desalojado; seg2 sigue en caché
+            await relay.get("cam1", "seg2.ts")
+            await relay.get("cam1", "seg0.ts")
+            return stats
+        finally:
+            await relay.close()
+
+    stats = asyncio.run(run())
+    assert stats["segments"] == 2
+    assert stats["segment_bytes"] == 2000
+    assert hits.count("/cam1/seg2.ts") == 1
+    assert hits.count("/cam1/seg0.ts") == 2
+
+
+def test_playlist_cache_is_bounded(hls_server):
+    url, _ = hls_server
+
+    async def run():
+        relay = HLSRelay(url, max_playlists=5)
+        try:
+            # Un query distinto por petición (LL-HLS / cache busters)
+            for i in range(20):
+                await relay.get("cam1", "stream.m3u8", f"x={i}")
+            vigentes = relay.stats()["playlists"]
+            await asyncio.sleep(0.6)
+            await relay.get("cam1", "stream.m3u8", "x=final")
+            return vigentes, relay.stats()["playlists"]
+        finally:
+            await relay.close()
+
+    vigentes, tras_vencer = asyncio.run(run())
+    assert vigentes == 5
+    # Al guardar uno nuevo se descartan los vencidos
+    assert tras_vencer == 1
+
+
+def test_missing_resource_maps_to_404(hls_server):
+    url, _ = hls_server
+
+    async def run():
+        relay = HLSRelay(url)
+        try:
+            await relay.get("cam9", "index.m3u8")
+        finally:
+            await relay.close()
+
+    with pytest.raises(UpstreamError) as exc:
+        asyncio.run(run())
+    assert exc.value.status_code == 404
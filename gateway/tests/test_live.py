@@ -0,0 +1,115 @@
+"""
+Pruebas del canal push (app/routers/live.py): coalescencia, resync y
+desconexión de clientes lentos. No requieren base de datos.
+
+Ejecutar desde gateway/:  python -m pytest tests/test_live.py
+"""
+
+import asyncio
+
+import pytest
+
+from app.routers import live
+from app.routers.live import ChangeHub, Subscriber
+
+
+@pytest.fixture(autouse=True)
+def sin_esperas(monkeypatch):
+    monkeypatch.setattr(live, "COALESCE_SECONDS", 0)
+    monkeypatch.setattr(live, "HEARTBEAT_SECONDS", 0.05)
+
+
+def cambio(id_, op="UPDATE", table="delivery_requests"):
+    return {"table": table, "op": op, "id": id_}
+
+
+def test_offer_coalesce_por_fila_y_filtra_topicos():
+    async def run():
+        sub = Subscriber(["deliveries"])
+        sub.offer("deliveries", cambio(1, "INSERT"))
+        sub.offer("deliveries", cambio(2))
+        sub.offer("deliveries", cambio(1, "UPDATE"))
+        sub.offer("incidents", cambio(9, table="incidents"))
+        return await sub.next_message(), await sub.next_message()
+
+    mensaje, heartbeat = asyncio.run(run())
+    assert mensaje["event"] == "changes"
+    # Una entrada por (tabla, id), con el último estado y en orden de llegada
+    assert [(c["id"], c["op"]) for c in mensaje["changes"]] == [(2, "UPDATE"), (1, "UPDATE")]
+    assert all(c["topic"] == "deliveries" for c in mensaje["changes"])
+    assert heartbeat is None
+
+
+def test_buffer_lleno_pide_resync():
+    async def run():
+        sub = Subscriber(["deliveries"], max_pending=2)
+        for i in range(3):
+            sub.offer("deliveries", cambio(i))
+        # Con resync pendiente no se acumulan más cambios
+        sub.offer("deliveries", cambio(10))
+        assert not sub.pending
+        primero = await sub.next_message()
+        sub.offer("deliveries", cambio(11))
+        return primero, await sub.next_message()
+
+    primero, segundo = asyncio.run(run())
+    assert primero == {"event": "resync", "topics": ["deliveries"]}
+    assert [c["id"] for c in segundo["changes"]] == [11]
+
+
+def test_hub_reparte_por_tabla_y_resync_al_reconectar():
+    async def run():
+        hub = ChangeHub()
+        turnos = hub.subscribe(["shifts"])
+        todos = hub.subscribe(live.TOPIC_TABLES)
+        hub.publish(cambio(5, table="dynamic_shift_assignments"))
+        hub.publish(cambio(6, table="tabla_sin_topico"))
+        mensajes = [await turnos.next_message(), await todos.next_message()]
+        hub.on_connection_change(True)
+        return mensajes, await turnos.next_message()
+
+    mensajes, tras_reconexion = asyncio.run(run())
+    for mensaje in mensajes:
+        assert [(c["topic"], c["id"]) for c in mensaje["changes"]] == [("shifts", 5)]
+    assert tras_reconexion["event"] == "resync"
+
+
+class WebSocketLento:
+    """WebSocket falso cuyo envío se bloquea después del primer mensaje."""
+
+    def __init__(self):
+        self.enviados = []
+        self.cerrado_con = None
+
+    async def accept(self):
+        pass
+
+    async def receive_json(self):
+        await asyncio.Event().wait()
+
+    async def send_json(self, message):
+        if self.enviados:
+            await asyncio.Event().wait()
+        self.enviados.append(message)
+
+    async def close(self, code=1000, reason=None):
+        self.cerrado_con = code
+
+
+def test_cliente_websocket_lento_se_desconecta(monkeypatch):
+    monkeypatch.setattr(live, "SEND_TIMEOUT_SECONDS", 0.05)
+    hub = ChangeHub()
+    monkeypatch.setattr(live, "hub", hub)
+    ws = WebSocketLento()
+
+    async def run():
+        tarea = asyncio.create_task(live.stream_ws(ws, topics="deliveries"))
+        while not hub.subscribers:
+            await asyncio.sleep(0)
+        hub.publish(cambio(1))
+        await asyncio.wait_for(tarea, 1)
+
+    asyncio.run(run())
+    assert ws.enviados[0]["event"] == "ready"
+    assert ws.cerrado_con == 1013
+    assert not hub.subscribers
@@ -0,0 +1,85 @@
+"""
+Pruebas del outbox rutas → RR.HH. (parseo de la ruta, reproceso fila por
+fila y despertar del worker).
+
+Ejecutar desde gateway/:  python -m pytest tests/test_rrhh_outbox.py
+"""
+
+import asyncio
+from datetime import date, datetime, time
+
+from app import rrhh_outbox
+from app.rrhh_outbox import DURACION_MINIMA, OutboxWorker, parsear_ruta, procesar_lote
+
+AHORA = datetime(2025, 7, 1, 9, 15, 30, 123456)
+
+
+def test_parsear_ruta_usa_inicio_estimado_y_duracion():
+    fecha, hora, duracion = parsear_ruta(
+        {"duration_s": 5430, "estimated_start": "2025-07-02T14:30:00"}, AHORA
+    )
+    assert (fecha, hora, duracion) == (date(2025, 7, 2), time(14, 30), 90)
+
+
+def test_parsear_ruta_pasa_inicio_utc_a_la_zona_de_los_turnos(monkeypatch):
+    monkeypatch.setattr(rrhh_outbox, "ZONA_TURNOS", "America/Santiago")
+    # 02:00 UTC del 2 de julio son las 22:00 del 1 de julio en Santiago (UTC-4)
+    fecha, hora, _ = parsear_ruta({"estimated_start": "2025-07-02T02:00:00Z"}, AHORA)
+    assert (fecha, hora) == (date(2025, 7, 1), time(22, 0))
+
+
+def test_parsear_ruta_valores_por_defecto():
+    assert parsear_ruta(None, AHORA) == (date(2025, 7, 1), time(9, 15, 30), DURACION_MINIMA)
+    # Fecha inválida: se usa la actual
+    assert parsear_ruta({"duration_s": 59, "estimated_start": "mañana"}, AHORA)[:2] == (
+        date(2025, 7, 1), time(9, 15, 30)
+    )
+
+
+def test_worker_despierta_solo_con_inserts_del_outbox():
+    async def escenario():
+        worker = OutboxWorker()
+        worker._despertar = asyncio.Event()
+        worker.handle_notification({"table": "rrhh_sync_outbox", "op": "UPDATE", "id": "1"})
+        worker.handle_notification({"table": "delivery_requests", "op": "INSERT", "id": "1"})
+        assert not worker._despertar.is_set()
+        worker.handle_notification({"table": "rrhh_sync_outbox", "op": "INSERT", "id": "1"})
+        assert worker._despertar.is_set()
+
+    asyncio.run(escenario())
+
+
+class SesionFalsa:
+    """Sesión que falla al procesar ``fallan`` y al registrar el error de ``sin_conexion``."""
+
+    def __init__(self, ids, fallan, sin_conexion):
+        self.ids, self.fallan, self.sin_conexion = ids, fallan, sin_conexion
+        self.procesadas, self.fallidas = [], []
+
+    def execute(self, sentencia, params):
+        if sentencia is rrhh_outbox._PENDIENTES:
+            return [(i,) for i in self.ids]
+        if sentencia is rrhh_outbox._PROCESAR:
+            if params["solo_id"] is None or params["solo_id"] in self.fallan:
+                raise RuntimeError("lote inválido")
+            self.procesadas.append(params["solo_id"])
+        elif sentencia is rrhh_outbox._FALLIDA:
+            if params["id"] in self.sin_conexion:
+                raise ConnectionError("conexión perdida")
+            self.fallidas.append(params["id"])
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_fila_que_no_registra_su_error_no_corta_el_reproceso():
+    sesion = SesionFalsa(ids=[1, 2, 3, 4], fallan={2, 3}, sin_conexion={2})
+    assert procesar_lote(lambda: sesion) == 4
+    assert sesion.procesadas == [1, 4]
+    assert sesion.fallidas == [3]
@@ -0,0 +1,49 @@
+"""
+Pruebas de app/tracing.py: propagación con la exportación apagada y tope de
+la cola de exportación. No requieren base de datos.
+
+Ejecutar desde gateway/:  python -m pytest tests/test_tracing.py
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import tracing
+from app.tracing import TracingMiddleware, current_span
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+TRACEPARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/eco")
+    def eco():
+        s = current_span()
+        return {"traceparent": s.traceparent if s else None}
+
+    return TestClient(app)
+
+
+def test_sin_exportar_se_continua_la_traza_entrante(monkeypatch):
+    monkeypatch.setattr(tracing._exporter, "target", "off")
+    client = make_client()
+
+    saliente = client.get("/eco", headers={"traceparent": TRACEPARENT}).json()["traceparent"]
+    # Misma traza, span propio y la decisión de muestreo de origen
+    assert saliente.startswith(f"00-{TRACE_ID}-") and saliente.endswith("-01")
+    assert saliente != TRACEPARENT
+    # Sin header entrante no se crean spans
+    assert client.get("/eco").json()["traceparent"] is None
+
+
+def test_cola_llena_descarta_spans(monkeypatch):
+    monkeypatch.setattr(tracing, "EXPORT_QUEUE_MAX", 3)
+    exporter = tracing._Exporter()
+    exporter.target = "stdout"
+    for i in range(5):
+        exporter.submit(tracing.Span(f"s{i}", tracing.KIND_INTERNAL, TRACE_ID, None, True))
+    assert exporter._queue.qsize() == 3
+    assert exporter.dropped == 2
@@ -0,0 +1,86 @@
+-- ============================================================================
+-- 019_change_notifications.sql
+-- Bus de cambios entre servicios mediante LISTEN/NOTIFY
+-- ============================================================================
+-- Todos los servicios comparten la misma base de datos y varios triggers
+-- (sync_delivery_to_dynamic_shift, sync_delivery_cancellation, ...) modifican
+-- filas de otros dominios. Para que cada servicio pueda cachear lecturas sin
+-- servir datos obsoletos, cada cambio de fila publica en el canal
+-- 'erp_changes' un payload JSON:
+--
+--     {"table": "delivery_requests", "op": "UPDATE", "id": 42}
+--
+-- Los servicios escuchan el canal (app/change_bus.py) e invalidan las
+-- entradas de caché que dependen de esa tabla/entidad.
+-- Postgres descarta notificaciones idénticas dentro de una misma transacción,
+-- por lo que una ráfaga de UPDATEs sobre la misma fila genera un solo aviso.
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION notify_entity_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_id TEXT;
+BEGIN
+    IF TG_LEVEL = 'STATEMENT' THEN
+        -- TRUNCATE: invalidar la tabla completa
+        v_id := NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        v_id := to_jsonb(OLD) ->> 'id';
+    ELSE
+        v_id := to_jsonb(NEW) ->> 'id';
+    END IF;
+
+    PERFORM pg_notify(
+        'erp_changes',
+        json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', v_id)::text
+    );
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION notify_entity_change() IS
+'Publica en el canal erp_changes cada cambio de fila para invalidar cachés de los servicios';
+
+
+-- Registrar triggers en las tablas que los servicios leen/cachéan
+DO $$
+DECLARE
+    v_table TEXT;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY[
+        -- Logística
+        'delivery_requests', 'incidents', 'vehicles', 'vehicle_cameras',
+        -- RR.HH.
+        'employees', 'roles', 'shifts', 'shift_assignments',
+        'dynamic_shifts', 'dynamic_shift_assignments', 'driving_logs',
+        'trainings', 'employee_trainings',
+        -- Inventario y mantenimiento
+        'productos', 'stock', 'movimientos', 'alertas', 'umbrales_stock',
+        'assets', 'maintenance_tasks'
+    ]
+    LOOP
+        IF to_regclass(v_table) IS NULL THEN
+            RAISE NOTICE 'Tabla % no existe, se omite trigger de notificación', v_table;
+            CONTINUE;
+        END IF;
+
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_notify_change ON %I', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER trigger_notify_change
+             AFTER INSERT OR UPDATE OR DELETE ON %I
+             FOR EACH ROW EXECUTE FUNCTION notify_entity_change()',
+            v_table
+        );
+
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_notify_truncate ON %I', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER trigger_notify_truncate
+             AFTER TRUNCATE ON %I
+             FOR EACH STATEMENT EXECUTE FUNCTION notify_entity_change()',
+            v_table
+        );
+    END LOOP;
+END $$;
+
+\echo '✅ Notificaciones de cambios (erp_changes) configuradas'
@@ -0,0 +1,116 @@
+-- ============================================================================
+-- 020_delivery_change_feed.sql
+-- Feed incremental de cambios de delivery_requests (delta-sync)
+-- ============================================================================
+-- El mapa web y la vista de cargas hacían polling de /api/delivery-requests y
+-- /api/loads/summary trayendo todas las filas en cada ciclo. Con esta
+-- migración el gateway expone /api/changes/deliveries?since=<cursor>, que
+-- solo devuelve las filas insertadas/actualizadas y los ids eliminados desde
+-- el cursor del cliente.
+--
+-- Cursor: id de transacción (xid8). Cada fila guarda en change_xid la
+-- transacción que la modificó por última vez. El gateway entrega como nuevo
+-- cursor el xmin del snapshot de lectura (la transacción más antigua aún en
+-- curso), de modo que una transacción que confirma tarde nunca queda detrás
+-- del cursor: en el peor caso una fila se reenvía dos veces (upsert idempotente).
+-- ============================================================================
+
+-- 1. Columna de versión en delivery_requests
+ALTER TABLE delivery_requests
+    ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+
+CREATE INDEX IF NOT EXISTS idx_delivery_requests_change_xid
+    ON delivery_requests (change_xid);
+
+CREATE OR REPLACE FUNCTION stamp_delivery_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_stamp_delivery_change ON delivery_requests;
+
+CREATE TRIGGER trigger_stamp_delivery_change
+BEFORE INSERT OR UPDATE ON delivery_requests
+FOR EACH ROW
+EXECUTE FUNCTION stamp_delivery_change();
+
+
+-- 2. Tombstones de eliminaciones
+CREATE TABLE IF NOT EXISTS delivery_request_tombstones (
+    delivery_request_id INTEGER PRIMARY KEY,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    change_xid xid8 NOT NULL DEFAULT pg_current_xact_id()
+);
+
+CREATE INDEX IF NOT EXISTS idx_delivery_tombstones_change_xid
+    ON delivery_request_tombstones (change_xid);
+
+-- Horizonte del feed: cursores anteriores a min_xid ya no tienen todos sus
+-- tombstones (fueron purgados) y el cliente debe recargar completo.
+CREATE TABLE IF NOT EXISTS change_feed_horizon (
+    feed TEXT PRIMARY KEY,
+    min_xid xid8 NOT NULL
+);
+
+INSERT INTO change_feed_horizon (feed, min_xid)
+VALUES ('deliveries', pg_current_xact_id())
+ON CONFLICT (feed) DO NOTHING;
+
+
+-- 3. log_cascade_delete (014) ahora además registra el tombstone
+CREATE OR REPLACE FUNCTION log_cascade_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    RAISE NOTICE 'delivery_request % eliminado, dynamic_shifts asociados serán eliminados por CASCADE', OLD.id;
+
+    INSERT INTO delivery_request_tombstones (delivery_request_id, deleted_at, change_xid)
+    VALUES (OLD.id, NOW(), pg_current_xact_id())
+    ON CONFLICT (delivery_request_id) DO UPDATE
+    SET deleted_at = EXCLUDED.deleted_at,
+        change_xid = EXCLUDED.change_xid;
+
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_log_delivery_delete ON delivery_requests;
+
+CREATE TRIGGER trigger_log_delivery_delete
+BEFORE DELETE ON delivery_requests
+FOR EACH ROW
+EXECUTE FUNCTION log_cascade_delete();
+
+
+-- 4. Mantenimiento: purgar tombstones antiguos y avanzar el horizonte
+CREATE OR REPLACE FUNCTION prune_delivery_tombstones(p_keep INTERVAL DEFAULT INTERVAL '30 days')
+RETURNS INTEGER AS $$
+DECLARE
+    v_max_xid xid8;
+    v_deleted INTEGER;
+BEGIN
+    SELECT MAX(change_xid) INTO v_max_xid
+    FROM delivery_request_tombstones
+    WHERE deleted_at < NOW() - p_keep;
+
+    IF v_max_xid IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    DELETE FROM delivery_request_tombstones WHERE change_xid <= v_max_xid;
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+
+    UPDATE change_feed_horizon
+    SET min_xid = GREATEST(min_xid, v_max_xid)
+    WHERE feed = 'deliveries';
+
+    RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION prune_delivery_tombstones(INTERVAL) IS
+'Elimina tombstones de delivery_requests más antiguos que p_keep; clientes con cursores anteriores recargan completo';
+
+\echo '✅ Feed de cambios de delivery_requests configurado'
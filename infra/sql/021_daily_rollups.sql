@@ -0,0 +1,211 @@
+-- ============================================================================
+-- 021_daily_rollups.sql
+-- Conteos diarios pre-agregados para reportes
+-- ============================================================================
+-- count_movements, count_alerts, count_delivery_requests y count_incidents
+-- contaban filas de la tabla original para rangos arbitrarios de fechas
+-- (full scan a medida que crecen las tablas). Ahora:
+--
+--   daily_counts           una fila por (entidad, día, dimensión) con el conteo
+--   daily_counts_watermark hasta qué día (exclusivo) está compactada cada entidad
+--
+-- - compact_daily_counts() agrega los días cerrados (< CURRENT_DATE) que aún
+--   no estaban compactados. Los servicios la ejecutan al iniciar y cada hora.
+-- - Un trigger ajusta el conteo si se inserta/elimina/modifica una fila de un
+--   día ya compactado (cargas retroactivas), así los días cerrados nunca
+--   quedan desactualizados. Las escrituras del día en curso no tocan
+--   daily_counts (sin contención en una fila "caliente").
+-- - Los servicios (app/rollups.py) suman daily_counts para los días completos
+--   anteriores al watermark y consultan la tabla original solo para los
+--   extremos parciales del rango y el día en curso.
+--
+-- Dimensión: delivery_requests → status, incidents → severity, resto → ''.
+-- Los días se calculan con el TimeZone de la sesión (UTC en el contenedor).
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS daily_counts (
+    entity TEXT NOT NULL,
+    dia DATE NOT NULL,
+    dim TEXT NOT NULL DEFAULT '',
+    n INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (entity, dia, dim)
+);
+
+CREATE TABLE IF NOT EXISTS daily_counts_watermark (
+    entity TEXT PRIMARY KEY,
+    compacted_until DATE NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Índices por fecha para los tramos que se leen de la tabla original
+CREATE INDEX IF NOT EXISTS idx_movimientos_fecha ON movimientos (fecha);
+CREATE INDEX IF NOT EXISTS idx_alertas_fecha ON alertas (fecha);
+CREATE INDEX IF NOT EXISTS idx_delivery_requests_created_at ON delivery_requests (created_at);
+CREATE INDEX IF NOT EXISTS idx_incidents_created_at ON incidents (created_at);
+
+
+-- Origen de cada entidad: tabla, columna de fecha y columna de dimensión
+CREATE OR REPLACE FUNCTION daily_counts_source(p_entity TEXT, OUT src_table TEXT, OUT ts_column TEXT, OUT dim_column TEXT)
+AS $$
+BEGIN
+    CASE p_entity
+        WHEN 'movimientos' THEN
+            src_table := 'movimientos'; ts_column := 'fecha'; dim_column := NULL;
+        WHEN 'alertas' THEN
+            src_table := 'alertas'; ts_column := 'fecha'; dim_column := NULL;
+        WHEN 'delivery_requests' THEN
+            src_table := 'delivery_requests'; ts_column := 'created_at'; dim_column := 'status';
+        WHEN 'incidents' THEN
+            src_table := 'incidents'; ts_column := 'created_at'; dim_column := 'severity';
+        ELSE
+            RAISE EXCEPTION 'Entidad de rollup desconocida: %', p_entity;
+    END CASE;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+
+-- Compactación: agrega los días cerrados pendientes
+CREATE OR REPLACE FUNCTION compact_daily_counts(p_entity TEXT DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_entity TEXT;
+    v_src RECORD;
+    v_from DATE;
+    v_to DATE := CURRENT_DATE;
+    v_rows INTEGER;
+    v_total INTEGER := 0;
+BEGIN
+    FOREACH v_entity IN ARRAY CASE WHEN p_entity IS NULL
+                                   THEN ARRAY['movimientos', 'alertas', 'delivery_requests', 'incidents']
+                                   ELSE ARRAY[p_entity] END
+    LOOP
+        SELECT * INTO v_src FROM daily_counts_source(v_entity);
+        IF to_regclass(v_src.src_table) IS NULL THEN
+            CONTINUE;
+        END IF;
+
+        -- Exclusivo frente a los triggers (que toman el lock compartido)
+        PERFORM pg_advisory_xact_lock(hashtext('daily_counts:' || v_entity));
+
+        SELECT compacted_until INTO v_from FROM daily_counts_watermark WHERE entity = v_entity;
+        IF v_from IS NULL THEN
+            EXECUTE format('SELECT MIN(%I)::date FROM %I', v_src.ts_column, v_src.src_table) INTO v_from;
+            v_from := COALESCE(LEAST(v_from, v_to), v_to);
+        END IF;
+
+        IF v_from < v_to THEN
+            DELETE FROM daily_counts WHERE entity = v_entity AND dia >= v_from AND dia < v_to;
+
+            EXECUTE format(
+                'INSERT INTO daily_counts (entity, dia, dim, n)
+                 SELECT $1, %1$I::date, %2$s, COUNT(*)
+                 FROM %3$I
+                 WHERE %1$I >= $2 AND %1$I < $3
+                 GROUP BY 2, 3',
+                v_src.ts_column,
+                CASE WHEN v_src.dim_column IS NULL THEN quote_literal('')
+                     ELSE format('COALESCE(%I::text, %L)', v_src.dim_column, '') END,
+                v_src.src_table
+            ) USING v_entity, v_from, v_to;
+            GET DIAGNOSTICS v_rows = ROW_COUNT;
+            v_total := v_total + v_rows;
+        END IF;
+
+        INSERT INTO daily_counts_watermark (entity, compacted_until, updated_at)
+        VALUES (v_entity, GREATEST(v_from, v_to), NOW())
+        ON CONFLICT (entity) DO UPDATE
+        SET compacted_until = EXCLUDED.compacted_until,
+            updated_at = EXCLUDED.updated_at;
+    END LOOP;
+
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION compact_daily_counts(TEXT) IS
+'Agrega en daily_counts los días cerrados pendientes (ejecutado periódicamente por los servicios)';
+
+
+-- Ajuste incremental de días ya compactados
+-- TG_ARGV: entidad
+CREATE OR REPLACE FUNCTION track_daily_count()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_entity TEXT := TG_ARGV[0];
+    v_src RECORD;
+    v_until DATE;
+    v_old_day DATE;
+    v_old_dim TEXT;
+    v_new_day DATE;
+    v_new_dim TEXT;
+BEGIN
+    SELECT * INTO v_src FROM daily_counts_source(v_entity);
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        v_old_day := (to_jsonb(OLD) ->> v_src.ts_column)::timestamptz::date;
+        v_old_dim := COALESCE(to_jsonb(OLD) ->> v_src.dim_column, '');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        v_new_day := (to_jsonb(NEW) ->> v_src.ts_column)::timestamptz::date;
+        v_new_dim := COALESCE(to_jsonb(NEW) ->> v_src.dim_column, '');
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND v_old_day IS NOT DISTINCT FROM v_new_day AND v_old_dim = v_new_dim THEN
+        RETURN NULL;
+    END IF;
+
+    -- Compartido: no bloquea otras escrituras, sí espera a una compactación en curso
+    PERFORM pg_advisory_xact_lock_shared(hashtext('daily_counts:' || v_entity));
+
+    SELECT compacted_until INTO v_until FROM daily_counts_watermark WHERE entity = v_entity;
+    IF v_until IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    IF v_old_day IS NOT NULL AND v_old_day < v_until THEN
+        UPDATE daily_counts SET n = n - 1
+        WHERE entity = v_entity AND dia = v_old_day AND dim = v_old_dim;
+    END IF;
+
+    IF v_new_day IS NOT NULL AND v_new_day < v_until THEN
+        INSERT INTO daily_counts (entity, dia, dim, n)
+        VALUES (v_entity, v_new_day, v_new_dim, 1)
+        ON CONFLICT (entity, dia, dim) DO UPDATE SET n = daily_counts.n + 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+DO $$
+DECLARE
+    v_entity TEXT;
+    v_src RECORD;
+    v_columns TEXT;
+BEGIN
+    FOREACH v_entity IN ARRAY ARRAY['movimientos', 'alertas', 'delivery_requests', 'incidents']
+    LOOP
+        SELECT * INTO v_src FROM daily_counts_source(v_entity);
+        IF to_regclass(v_src.src_table) IS NULL THEN
+            RAISE NOTICE 'Tabla % no existe, se omite rollup', v_src.src_table;
+            CONTINUE;
+        END IF;
+
+        v_columns := quote_ident(v_src.ts_column)
+            || COALESCE(', ' || quote_ident(v_src.dim_column), '');
+
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_track_daily_count ON %I', v_src.src_table);
+        EXECUTE format(
+            'CREATE TRIGGER trigger_track_daily_count
+             AFTER INSERT OR DELETE OR UPDATE OF %s ON %I
+             FOR EACH ROW EXECUTE FUNCTION track_daily_count(%L)',
+            v_columns, v_src.src_table, v_entity
+        );
+    END LOOP;
+END $$;
+
+-- Compactación inicial del histórico
+SELECT compact_daily_counts();
+
+\echo '✅ Rollups diarios (daily_counts) configurados'
@@ -0,0 +1,79 @@
+-- ============================================================================
+-- 022_bulk_manual_shift_sync.sql
+-- Sincronización calendario → turnos dinámicos a nivel de sentencia
+-- ============================================================================
+-- trigger_sync_manual_shift (016) se ejecutaba FOR EACH ROW: un INSERT de
+-- miles de filas (importación masiva POST /assignments/bulk) hacía por cada
+-- fila un SELECT del turno, un SELECT de existencia y dos INSERT.
+--
+-- Ahora es FOR EACH STATEMENT con tabla de transición: un único INSERT
+-- crea todos los dynamic_shifts y dynamic_shift_assignments que faltan.
+-- Los ids de dynamic_shifts se reservan con nextval() en un CTE
+-- materializado, así ambos INSERT usan el mismo id sin depender del orden
+-- de RETURNING.
+--
+-- El resultado es el mismo que el de 016 (incluida la duración negativa de
+-- los turnos de noche, que el resto del sistema ya compensa).
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION sync_manual_shifts_to_dynamic_bulk()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_creados INTEGER;
+BEGIN
+    WITH pendientes AS MATERIALIZED (
+        SELECT n.employee_id,
+               n.date,
+               s.tipo,
+               s.start_time,
+               (EXTRACT(EPOCH FROM (s.end_time - s.start_time)) / 60)::INTEGER AS duracion,
+               nextval(pg_get_serial_sequence('dynamic_shifts', 'id')) AS dynamic_shift_id
+        FROM (SELECT DISTINCT employee_id, shift_id, date FROM nuevas) n
+        JOIN shifts s ON s.id = n.shift_id
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM dynamic_shifts ds
+            JOIN dynamic_shift_assignments dsa ON dsa.dynamic_shift_id = ds.id
+            WHERE ds.fecha_programada = n.date
+              AND ds.hora_inicio = s.start_time
+              AND dsa.employee_id = n.employee_id
+        )
+    ), turnos AS (
+        INSERT INTO dynamic_shifts (
+            id, route_id, fecha_programada, hora_inicio, duracion_minutos,
+            conduccion_continua_minutos, status, created_at
+        )
+        SELECT dynamic_shift_id, NULL, date, start_time, duracion, duracion, 'asignado', NOW()
+        FROM pendientes
+        RETURNING id
+    )
+    INSERT INTO dynamic_shift_assignments (dynamic_shift_id, employee_id, role_in_shift, status)
+    SELECT p.dynamic_shift_id,
+           p.employee_id,
+           CASE
+               WHEN p.tipo = 'Mañana' THEN 'Conductor Turno Mañana'
+               WHEN p.tipo = 'Tarde' THEN 'Conductor Turno Tarde'
+               WHEN p.tipo = 'Noche' THEN 'Conductor Turno Noche'
+               ELSE 'Conductor'
+           END,
+           'asignado'
+    FROM pendientes p
+    JOIN turnos t ON t.id = p.dynamic_shift_id;
+
+    GET DIAGNOSTICS v_creados = ROW_COUNT;
+    IF v_creados > 0 THEN
+        RAISE NOTICE 'Turnos manuales sincronizados: % dynamic_shifts creados', v_creados;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_sync_manual_shift ON shift_assignments;
+CREATE TRIGGER trigger_sync_manual_shift
+    AFTER INSERT ON shift_assignments
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION sync_manual_shifts_to_dynamic_bulk();
+
+\echo '✅ Sincronización de turnos manuales a nivel de sentencia configurada'
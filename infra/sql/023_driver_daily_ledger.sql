@@ -0,0 +1,181 @@
+-- ============================================================================
+-- 023_driver_daily_ledger.sql
+-- Libro diario de conducción por conductor (horas de servicio)
+-- ============================================================================
+-- Una fila por (empleado, día) con lo ya registrado en driving_logs:
+--
+--   minutos_conduccion / minutos_descanso / registros   totales del día
+--   racha_continua_minutos   conducción continua al cierre del último registro
+--                            (0 si terminó con un descanso >= 120 min)
+--   racha_maxima_minutos     mayor racha continua del día
+--   ultima_conduccion_fin    fin del último tramo de conducción
+--   ultimo_descanso_at       fin del último descanso >= 120 min (el inicio de
+--                            la jornada cuenta como descansado)
+--
+-- Los tramos se ubican igual que en ms-rrhh/app/driving_rules.py: cada
+-- registro empieza a la hora de inicio de su turno y los registros de un
+-- mismo turno se encadenan (conducción + descanso) en orden de id.
+--
+-- Los triggers recalculan solo el día afectado (índice employee_id, fecha)
+-- en cada INSERT/UPDATE/DELETE de driving_logs o cambio de hora de un turno.
+-- Los servicios (app/driver_ledger.py) cachean el libro por día y lo
+-- invalidan con las notificaciones de 019 sobre driver_daily_ledger.
+-- Timestamps en hora local, sin zona (fecha + hora del turno).
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS driver_daily_ledger (
+    id SERIAL PRIMARY KEY,
+    employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    fecha DATE NOT NULL,
+    minutos_conduccion INTEGER NOT NULL DEFAULT 0,
+    minutos_descanso INTEGER NOT NULL DEFAULT 0,
+    registros INTEGER NOT NULL DEFAULT 0,
+    racha_continua_minutos INTEGER NOT NULL DEFAULT 0,
+    racha_maxima_minutos INTEGER NOT NULL DEFAULT 0,
+    ultima_conduccion_fin TIMESTAMP,
+    ultimo_descanso_at TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    UNIQUE (employee_id, fecha)
+);
+
+CREATE INDEX IF NOT EXISTS ix_driver_daily_ledger_fecha ON driver_daily_ledger(fecha);
+
+
+-- Recalcula la fila (empleado, día) desde driving_logs
+CREATE OR REPLACE FUNCTION refresh_driver_daily_ledger(p_employee_id INTEGER, p_fecha DATE)
+RETURNS VOID AS $$
+DECLARE
+    -- Igual que DESCANSO_MINUTOS en ms-rrhh/app/driving_rules.py
+    c_descanso CONSTANT INTERVAL := INTERVAL '120 minutes';
+    r RECORD;
+    v_conduccion INTEGER := 0;
+    v_descanso INTEGER := 0;
+    v_registros INTEGER := 0;
+    v_racha INTEGER := 0;
+    v_racha_max INTEGER := 0;
+    v_fin TIMESTAMP;
+    v_ultimo_descanso TIMESTAMP;
+BEGIN
+    IF p_employee_id IS NULL OR p_fecha IS NULL THEN
+        RETURN;
+    END IF;
+
+    FOR r IN
+        SELECT dl.minutos_conduccion AS conduccion,
+               COALESCE(dl.minutos_descanso, 0) AS descanso,
+               p_fecha + COALESCE(ds.hora_inicio, TIME '00:00') + make_interval(mins => (
+                   SUM(dl.minutos_conduccion + COALESCE(dl.minutos_descanso, 0))
+                       OVER (PARTITION BY dl.dynamic_shift_id ORDER BY dl.id)
+                   - dl.minutos_conduccion - COALESCE(dl.minutos_descanso, 0)
+               )::INTEGER) AS inicio
+        FROM driving_logs dl
+        LEFT JOIN dynamic_shifts ds ON ds.id = dl.dynamic_shift_id
+        WHERE dl.employee_id = p_employee_id AND dl.fecha = p_fecha
+        ORDER BY inicio
+    LOOP
+        v_registros := v_registros + 1;
+        v_conduccion := v_conduccion + r.conduccion;
+        v_descanso := v_descanso + r.descanso;
+
+        -- Un hueco de al menos 2 horas sin conducir reinicia la racha
+        IF v_fin IS NULL OR r.inicio >= v_fin + c_descanso THEN
+            v_racha := 0;
+            v_ultimo_descanso := r.inicio;
+        END IF;
+        v_racha := v_racha + r.conduccion;
+        v_racha_max := GREATEST(v_racha_max, v_racha);
+        v_fin := GREATEST(v_fin, r.inicio + make_interval(mins => r.conduccion));
+
+        -- Descanso declarado en el propio registro
+        IF r.descanso * INTERVAL '1 minute' >= c_descanso THEN
+            v_racha := 0;
+            v_ultimo_descanso := r.inicio + make_interval(mins => r.conduccion + r.descanso);
+        END IF;
+    END LOOP;
+
+    IF v_registros = 0 THEN
+        DELETE FROM driver_daily_ledger WHERE employee_id = p_employee_id AND fecha = p_fecha;
+        RETURN;
+    END IF;
+
+    INSERT INTO driver_daily_ledger (
+        employee_id, fecha, minutos_conduccion, minutos_descanso, registros,
+        racha_continua_minutos, racha_maxima_minutos, ultima_conduccion_fin,
+        ultimo_descanso_at, updated_at
+    ) VALUES (
+        p_employee_id, p_fecha, v_conduccion, v_descanso, v_registros,
+        v_racha, v_racha_max, v_fin, v_ultimo_descanso, now()
+    )
+    ON CONFLICT (employee_id, fecha) DO UPDATE SET
+        minutos_conduccion = EXCLUDED.minutos_conduccion,
+        minutos_descanso = EXCLUDED.minutos_descanso,
+        registros = EXCLUDED.registros,
+        racha_continua_minutos = EXCLUDED.racha_continua_minutos,
+        racha_maxima_minutos = EXCLUDED.racha_maxima_minutos,
+        ultima_conduccion_fin = EXCLUDED.ultima_conduccion_fin,
+        ultimo_descanso_at = EXCLUDED.ultimo_descanso_at,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- driving_logs → libro del día (y del día anterior si el registro se movió)
+CREATE OR REPLACE FUNCTION sync_driver_daily_ledger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_driver_daily_ledger(OLD.employee_id, OLD.fecha);
+    END IF;
+    IF TG_OP = 'INSERT'
+       OR (TG_OP = 'UPDATE' AND (NEW.employee_id IS DISTINCT FROM OLD.employee_id
+                                 OR NEW.fecha IS DISTINCT FROM OLD.fecha)) THEN
+        PERFORM refresh_driver_daily_ledger(NEW.employee_id, NEW.fecha);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_sync_driver_daily_ledger ON driving_logs;
+CREATE TRIGGER trigger_sync_driver_daily_ledger
+    AFTER INSERT OR UPDATE OR DELETE ON driving_logs
+    FOR EACH ROW
+    EXECUTE FUNCTION sync_driver_daily_ledger();
+
+
+-- Cambio de hora de un turno: se mueven todos sus tramos
+CREATE OR REPLACE FUNCTION sync_driver_daily_ledger_on_shift()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_driver_daily_ledger(k.employee_id, k.fecha)
+    FROM (
+        SELECT DISTINCT employee_id, fecha FROM driving_logs WHERE dynamic_shift_id = NEW.id
+    ) k;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_sync_driver_daily_ledger_on_shift ON dynamic_shifts;
+CREATE TRIGGER trigger_sync_driver_daily_ledger_on_shift
+    AFTER UPDATE OF hora_inicio ON dynamic_shifts
+    FOR EACH ROW
+    WHEN (OLD.hora_inicio IS DISTINCT FROM NEW.hora_inicio)
+    EXECUTE FUNCTION sync_driver_daily_ledger_on_shift();
+
+
+-- Notificaciones (019) para invalidar las cachés de los servicios
+DROP TRIGGER IF EXISTS trigger_notify_change ON driver_daily_ledger;
+CREATE TRIGGER trigger_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON driver_daily_ledger
+    FOR EACH ROW EXECUTE FUNCTION notify_entity_change();
+
+DROP TRIGGER IF EXISTS trigger_notify_truncate ON driver_daily_ledger;
+CREATE TRIGGER trigger_notify_truncate
+    AFTER TRUNCATE ON driver_daily_ledger
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_entity_change();
+
+
+-- Carga inicial del histórico
+SELECT refresh_driver_daily_ledger(k.employee_id, k.fecha)
+FROM (SELECT DISTINCT employee_id, fecha FROM driving_logs) k;
+
+\echo '✅ Libro diario de conducción (driver_daily_ledger) configurado'
@@ -0,0 +1,14 @@
+-- ============================================================================
+-- 024_dynamic_shifts_keyset_index.sql
+-- Índice para el listado paginado de turnos dinámicos
+-- ============================================================================
+-- GET /api/rrhh/dynamic-shifts (gateway) y GET /dynamic-shifts (ms-rrhh)
+-- paginan por keyset sobre (fecha_programada, hora_inicio, id) y filtran por
+-- rango de fechas. Con este índice cada página es un recorrido acotado del
+-- índice (en cualquier dirección) en vez de ordenar toda la tabla.
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS ix_dynamic_shifts_fecha_hora_id
+    ON dynamic_shifts (fecha_programada, hora_inicio, id);
+
+\echo '✅ Índice de paginación de turnos dinámicos creado'
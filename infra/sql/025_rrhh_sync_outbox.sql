@@ -0,0 +1,57 @@
+-- ============================================================================
+-- 025_rrhh_sync_outbox.sql
+-- Outbox para la sincronización rutas → RR.HH. (turnos dinámicos)
+-- ============================================================================
+-- POST /api/routes/assign y POST /api/rrhh/sync-route creaban en la misma
+-- petición la delivery_request, el dynamic_shift y su asignación, más las
+-- escrituras en cascada de los triggers (sync_driver_assignment, ...).
+--
+-- Ahora la petición solo escribe la ruta y una fila en rrhh_sync_outbox en
+-- la misma transacción, y responde. El worker del gateway
+-- (gateway/app/rrhh_outbox.py) toma lotes con FOR UPDATE SKIP LOCKED y crea
+-- turnos y asignaciones de forma idempotente:
+--
+--   - una fila de outbox por ruta (UNIQUE delivery_request_id)
+--   - si la ruta ya tiene turno dinámico se reutiliza
+--   - la asignación (turno, conductor) solo se inserta si no existe
+--   - si la ruta se reencola con otro conductor, se borra la asignación de
+--     conducción del anterior (una ruta, un conductor)
+--
+-- Estados: pendiente → procesado | error (tras MAX_INTENTOS reintentos).
+-- Al procesar, el worker toca delivery_requests.updated_at para que el feed
+-- /api/changes/deliveries (020) publique el nuevo rrhh_sync_status, que la
+-- vista de cargas (web/src/pages/LoadsManagement.tsx) muestra por ruta.
+-- El INSERT notifica en erp_changes (019), lo que despierta al worker.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS rrhh_sync_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    delivery_request_id INTEGER NOT NULL UNIQUE
+        REFERENCES delivery_requests(id) ON DELETE CASCADE,
+    employee_id INTEGER NOT NULL,
+    fecha_programada DATE NOT NULL,
+    hora_inicio TIME NOT NULL,
+    duracion_minutos INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pendiente'
+        CHECK (status IN ('pendiente', 'procesado', 'error')),
+    intentos INTEGER NOT NULL DEFAULT 0,
+    ultimo_error TEXT,
+    dynamic_shift_id INTEGER REFERENCES dynamic_shifts(id) ON DELETE SET NULL,
+    disponible_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    procesado_at TIMESTAMPTZ
+);
+
+-- Cola: solo las filas pendientes, en orden de llegada
+CREATE INDEX IF NOT EXISTS ix_rrhh_sync_outbox_pendientes
+    ON rrhh_sync_outbox (disponible_at, id)
+    WHERE status = 'pendiente';
+
+
+-- Aviso al worker: solo los INSERT (sus propios UPDATE no lo despiertan)
+DROP TRIGGER IF EXISTS trigger_notify_change ON rrhh_sync_outbox;
+CREATE TRIGGER trigger_notify_change
+    AFTER INSERT ON rrhh_sync_outbox
+    FOR EACH ROW EXECUTE FUNCTION notify_entity_change();
+
+\echo '✅ Outbox de sincronización rutas → RR.HH. configurado'
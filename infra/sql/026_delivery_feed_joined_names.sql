@@ -0,0 +1,57 @@
+-- ============================================================================
+-- 026_delivery_feed_joined_names.sql
+-- El feed de delivery_requests refleja cambios de nombre de vehículo/conductor
+-- ============================================================================
+-- Las filas del feed /api/changes/deliveries (020) incluyen vehicle_name y
+-- driver_name, que vienen de un JOIN con vehicles y employees. Renombrar un
+-- vehículo o un empleado no tocaba delivery_requests, así que change_xid no
+-- avanzaba y los clientes en delta-sync conservaban el nombre antiguo.
+--
+-- Con estos triggers, al cambiar vehicles.name o employees.nombre se
+-- reestampa change_xid de las cargas que los referencian (el trigger de 020
+-- pone la transacción actual) y el feed las reenvía con el nombre nuevo. Solo
+-- se actualiza change_xid: no cambian status ni updated_at, por lo que no se
+-- disparan las sincronizaciones de 014/017.
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION touch_deliveries_on_vehicle_rename()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE delivery_requests
+    SET change_xid = pg_current_xact_id()
+    WHERE vehicle_id = NEW.id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_touch_deliveries_vehicle_name ON vehicles;
+
+CREATE TRIGGER trigger_touch_deliveries_vehicle_name
+AFTER UPDATE OF name ON vehicles
+FOR EACH ROW
+WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION touch_deliveries_on_vehicle_rename();
+
+
+CREATE OR REPLACE FUNCTION touch_deliveries_on_employee_rename()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE delivery_requests
+    SET change_xid = pg_current_xact_id()
+    WHERE driver_id = NEW.id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_touch_deliveries_employee_name ON employees;
+
+CREATE TRIGGER trigger_touch_deliveries_employee_name
+AFTER UPDATE OF nombre ON employees
+FOR EACH ROW
+WHEN (OLD.nombre IS DISTINCT FROM NEW.nombre)
+EXECUTE FUNCTION touch_deliveries_on_employee_rename();
+
+CREATE INDEX IF NOT EXISTS idx_delivery_requests_vehicle_id ON delivery_requests (vehicle_id);
+CREATE INDEX IF NOT EXISTS idx_delivery_requests_driver_id ON delivery_requests (driver_id);
+
+\echo '✅ Feed de delivery_requests sigue los renombres de vehículos y conductores'
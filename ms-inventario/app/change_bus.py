@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Bus de invalidación de caché sobre Postgres LISTEN/NOTIFY
+
+Los triggers de infra/sql/019_change_notifications.sql publican en el canal
+``erp_changes`` un JSON {"table", "op", "id"} por cada fila modificada
+(incluidas las escrituras en cascada de otros triggers). Este módulo:
+
+- ``EntityCache``: caché en memoria con dependencias por tabla y por entidad,
+  acotada a CACHE_MAX_ENTRIES claves (al pasarse se barren las vencidas y,
+  si no alcanza, las más antiguas).
+- ``ChangeListener``: tarea asyncio que escucha el canal y reparte cada
+  notificación a los suscriptores (por defecto, la invalidación de la caché).
+
+La caché solo sirve datos mientras el listener está conectado: si la conexión
+se pierde, se vacía y todas las lecturas van directo a la base de datos hasta
+reconectar, así nunca se devuelve algo que pudo cambiar sin aviso.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = os.getenv("CHANGE_CHANNEL", "erp_changes")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+RECONNECT_MAX_SECONDS = 30.0
+KEEPALIVE_SECONDS = 30.0
+
+
+class EntityCache:
+    """Caché clave → valor invalidada por cambios en tablas/entidades."""
+
+    def __init__(self, default_ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.active = False
+        self._lock = threading.Lock()
+        # clave → (vence, valor, tablas, entidades), en orden de inserción
+        self._entries: Dict[Hashable, Tuple[float, Any, tuple, tuple]] = {}
+        self._by_table: Dict[str, Set[Hashable]] = {}
+        self._by_entity: Dict[Tuple[str, str], Set[Hashable]] = {}
+        # Generación por tabla: evita guardar un resultado leído antes de una
+        # invalidación que llegó mientras el loader aún estaba ejecutándose.
+        self._generations: Dict[str, int] = {}
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        tables: Iterable[str] = (),
+        entities: Iterable[Tuple[str, Any]] = (),
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """
+        Retorna el valor cacheado para ``key`` o lo calcula con ``loader``.
+
+        ``tables``: el valor se invalida ante cualquier cambio en esas tablas.
+        ``entities``: pares (tabla, id); se invalida solo si cambia esa fila
+        (o si la tabla completa es truncada).
+        """
+        tables = tuple(tables)
+        entities = tuple((t, str(i)) for t, i in entities)
+        if not self.active:
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] > now:
+                return hit[1]
+            watched = set(tables) | {t for t, _ in entities}
+            generation = {t: self._generations.get(t, 0) for t in watched}
+
+        value = loader()
+        self._store(key, value, tables, entities, generation, ttl)
+        return value
+
+    async def aget_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        tables: Iterable[str] = (),
+        entities: Iterable[Tuple[str, Any]] = (),
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """Igual que ``get_or_load`` pero con un loader asíncrono."""
+        tables = tuple(tables)
+        entities = tuple((t, str(i)) for t, i in entities)
+        if not self.active:
+            return await loader()
+
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] > time.monotonic():
+                return hit[1]
+            watched = set(tables) | {t for t, _ in entities}
+            generation = {t: self._generations.get(t, 0) for t in watched}
+
+        value = await loader()
+        self._store(key, value, tables, entities, generation, ttl)
+        return value
+
+    def _store(self, key, value, tables, entities, generation, ttl) -> None:
+        with self._lock:
+            if not self.active:
+                return
+            if any(self._generations.get(t, 0) != g for t, g in generation.items()):
+                # Hubo una invalidación durante la carga: no guardar
+                return
+            now = time.monotonic()
+            expires = now + (self.default_ttl if ttl is None else ttl)
+            # Reinsertar al final: el orden de _entries es el de antigüedad
+            self._discard(key)
+            self._entries[key] = (expires, value, tables, entities)
+            for t in tables:
+                self._by_table.setdefault(t, set()).add(key)
+            for ent in entities:
+                self._by_entity.setdefault(ent, set()).add(key)
+            if len(self._entries) > self.max_entries:
+                self._evict(now)
+
+    def _discard(self, key) -> None:
+        # Requiere self._lock. Quita la clave y sus referencias en los índices.
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for index, deps in ((self._by_table, entry[2]), (self._by_entity, entry[3])):
+            for dep in deps:
+                keys = index.get(dep)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[dep]
+
+    def _evict(self, now: float) -> None:
+        # Requiere self._lock. Primero las vencidas; si no alcanza, las más
+        # antiguas hasta dejar un 10 % libre (no barrer en cada inserción).
+        for key in [k for k, e in self._entries.items() if e[0] <= now]:
+            self._discard(key)
+        target = self.max_entries - self.max_entries // 10
+        while len(self._entries) > target:
+            self._discard(next(iter(self._entries)))
+
+    def invalidate(self, table: str, entity_id: Any = None) -> int:
+        """Invalida lo que depende de ``table`` (y de la fila ``entity_id``)."""
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            keys = set(self._by_table.pop(table, set()))
+            if entity_id is None:
+                # Cambio sin id (TRUNCATE): todas las entidades de la tabla
+                for ent in [e for e in self._by_entity if e[0] == table]:
+                    keys |= self._by_entity.pop(ent)
+            else:
+                keys |= self._by_entity.pop((table, str(entity_id)), set())
+            for key in keys:
+                self._discard(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._by_entity.clear()
+            for t in self._generations:
+                self._generations[t] += 1
+
+    def set_active(self, active: bool) -> None:
+        self.clear()
+        self.active = active
+
+    def handle_notification(self, change: Dict[str, Any]) -> None:
+        table = change.get("table")
+        if table:
+            self.invalidate(table, change.get("id"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"active": self.active, "entries": len(self._entries)}
+
+
+class ChangeListener:
+    """Escucha ``CHANNEL`` con psycopg2 y reparte las notificaciones."""
+
+    def __init__(self, channel: str = CHANNEL):
+        self.channel = channel
+        self.connected = False
+        self._handlers: List[Callable[[Dict[str, Any]], Any]] = []
+        self._connection_handlers: List[Callable[[bool], Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, handler: Callable[[Dict[str, Any]], Any]) -> None:
+        """Registra un handler (sync o async) que recibe cada cambio."""
+        self._handlers.append(handler)
+
+    def on_connection_change(self, handler: Callable[[bool], Any]) -> None:
+        """Registra un callback que recibe True/False al conectar/desconectar."""
+        self._connection_handlers.append(handler)
+
+    def start(self, engine) -> Optional[asyncio.Task]:
+        """Inicia la escucha si ``engine`` apunta a Postgres."""
+        if engine is None or engine.dialect.name != "postgresql":
+            logger.info("Change listener deshabilitado (base de datos no es Postgres)")
+            return None
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        self._task = asyncio.get_running_loop().create_task(self._run(dsn))
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def _set_connected(self, connected: bool) -> None:
+        if self.connected == connected:
+            return
+        self.connected = connected
+        for handler in self._connection_handlers:
+            try:
+                handler(connected)
+            except Exception:
+                logger.exception("Error en callback de conexión del change listener")
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            logger.warning("Notificación con payload inválido: %s", payload)
+            return
+        for handler in self._handlers:
+            try:
+                result = handler(change)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception:
+                logger.exception("Error procesando notificación %s", change)
+
+    async def _run(self, dsn: str) -> None:
+        import psycopg2
+        import psycopg2.extensions
+
+        loop = asyncio.get_running_loop()
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = await loop.run_in_executor(None, psycopg2.connect, dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+
+                lost: asyncio.Future = loop.create_future()
+
+                def on_readable():
+                    try:
+                        conn.poll()
+                    except Exception as exc:
+                        if not lost.done():
+                            lost.set_exception(exc)
+                        return
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+
+                loop.add_reader(conn.fileno(), on_readable)
+                self._set_connected(True)
+                backoff = 1.0
+                logger.info("Change listener escuchando canal %s", self.channel)
+                try:
+                    while True:
+                        try:
+                            await asyncio.wait_for(asyncio.shield(lost), KEEPALIVE_SECONDS)
+                        except asyncio.TimeoutError:
+                            # Keepalive: detecta conexiones muertas sin tráfico
+                            with conn.cursor() as cur:
+                                cur.execute("SELECT 1")
+                finally:
+                    loop.remove_reader(conn.fileno())
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Change listener desconectado: %s (reintento en %.0fs)", exc, backoff)
+            finally:
+                self._set_connected(False)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
+
+
+cache = EntityCache()
+listener = ChangeListener()
+listener.subscribe(cache.handle_notification)
+listener.on_connection_change(cache.set_active)
@@ -2,10 +2,18 @@ from fastapi import FastAPI
 from app.routers import inventario, movimientos, alerts, export, maintenance
 from app.allocation_service import router as allocation_router
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi import Request
 from app.db import engine, Base
 from app import models
+from app.change_bus import listener as change_listener
+from app import rollups
+from app.db import SessionLocal
+from app.compression import CompressionMiddleware
+from app.metrics import MetricsMiddleware, metrics_response, mark_process_dead
+from app.sql_metrics import SQLMetricsMiddleware, instrument_engine
+from app.tracing import TracingMiddleware, configure_tracing, shutdown_tracing, trace_engine
+from app.profiling import ProfilingMiddleware, router as profiling_router
+import asyncio
 import os
 import logging
 
@@ -23,16 +31,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware para garantizar UTF-8 en todas las respuestas
-class UTF8Middleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        # Asegurar que todas las respuestas JSON tengan charset=utf-8
-        if response.headers.get('content-type', '').startswith('application/json'):
-            response.headers['content-type'] = 'application/json; charset=utf-8'
-        return response
+# Compresión gzip/brotli y ETag con If-None-Match → 304
+app.add_middleware(CompressionMiddleware)
 
-app.add_middleware(UTF8Middleware)
+# Métricas por ruta + charset=utf-8 en respuestas JSON (middleware ASGI puro)
+app.add_middleware(MetricsMiddleware)
+
+# Conteo/tiempo de consultas SQL por request (Server-Timing + detección N+1)
+instrument_engine(engine)
+app.add_middleware(SQLMetricsMiddleware)
+
+# Trazas distribuidas (W3C traceparent, export OTLP/JSON con TRACE_EXPORT)
+configure_tracing("ms-inventario")
+trace_engine(engine)
+app.add_middleware(TracingMiddleware)
+
+# Profiling bajo demanda (/admin/profiling); sin sesión activa no agrega trabajo
+app.add_middleware(ProfilingMiddleware)
 
 # Crear todas las tablas al iniciar la aplicación
 @app.on_event("startup")
@@ -52,13 +67,31 @@ async def startup_event():
         except Exception as e2:
             logger.error(f"❌ Error persistente: {e2}")
 
+    # Invalidación de caché vía LISTEN/NOTIFY (infra/sql/019_change_notifications.sql)
+    change_listener.start(engine)
+
+    # Compactación periódica de conteos diarios (infra/sql/021_daily_rollups.sql)
+    app.state.rollup_task = asyncio.create_task(rollups.run_compaction(SessionLocal))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.rollup_task.cancel()
+    await change_listener.stop()
+    shutdown_tracing()
+    mark_process_dead()
+
 @app.get('/health')
 def health():
     return {'status':'ok'}
 
+@app.get('/metrics')
+def metrics():
+    return metrics_response()
+
 app.include_router(inventario.router, prefix="", tags=["inventario"]) 
 app.include_router(movimientos.router, prefix="", tags=["movimientos"]) 
 app.include_router(alerts.router, prefix="", tags=["alerts"]) 
 app.include_router(export.router, prefix="/export", tags=["export"])  # HU12
 app.include_router(maintenance.router, prefix="", tags=["maintenance"])  # HU7
 app.include_router(allocation_router, tags=["delivery-allocations"])
+app.include_router(profiling_router)
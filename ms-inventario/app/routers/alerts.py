@@ -4,6 +4,7 @@ from app.db import get_db
 from sqlalchemy.orm import Session
 from app.models import Alerta
 from app.schemas import AlertOut
+from app import rollups
 
 router = APIRouter()
 
@@ -27,7 +28,6 @@ def ack_alert(id: int, db: Session = Depends(get_db)):
 @router.get('/alerts/count')
 def count_alerts(desde: str | None = None, hasta: str | None = None, db: Session = Depends(get_db)):
     """Cantidad de alertas generadas en un rango (fecha)."""
-    q = db.query(Alerta)
     def parse_dt(s: str):
         try:
             return datetime.fromisoformat(s) if len(s) > 10 else datetime.fromisoformat(s + 'T00:00:00')
@@ -35,8 +35,12 @@ def count_alerts(desde: str | None = None, hasta: str | None = None, db: Session
             return None
     dts = parse_dt(desde) if desde else None
     dte = parse_dt(hasta) if hasta else None
-    if dts:
-        q = q.filter(Alerta.fecha >= dts)
-    if dte:
-        q = q.filter(Alerta.fecha <= dte)
-    return {"count": q.count()}
+    def raw_count(inicio, fin):
+        q = db.query(Alerta)
+        if inicio:
+            q = q.filter(Alerta.fecha >= inicio)
+        if fin:
+            q = q.filter(Alerta.fecha < fin)
+        return q.count()
+    # Días completos desde daily_counts; solo los extremos sobre la tabla
+    return {"count": rollups.count_range(db, 'alertas', raw_count, dts, dte)}
@@ -2,18 +2,35 @@ from fastapi import APIRouter, Depends, HTTPException
 from app.db import get_db, engine, SessionLocal
 from sqlalchemy.orm import Session
 from app import crud, schemas, models
+from app.change_bus import cache
 
 router = APIRouter()
 
 @router.get('/productos', response_model=list[schemas.ProductoOut])
 def list_productos(db: Session = Depends(get_db)):
-    return crud.get_productos(db)
+    return cache.get_or_load(
+        ('inventario', 'productos'),
+        lambda: [
+            {"id": p.id, "sku": p.sku, "nombre": p.nombre, "categoria": p.categoria, "precio": p.precio}
+            for p in crud.get_productos(db)
+        ],
+        tables=['productos'],
+    )
+
+@router.get('/productos/count')
+def count_productos(db: Session = Depends(get_db)):
+    """Cantidad total de productos (para reportes, sin descargar el catálogo)."""
+    return {"count": db.query(models.Producto).count()}
 
 @router.get('/inventory/{bodega_id}', response_model=list[schemas.StockItem])
 def inventory_by_bodega(bodega_id: int, db: Session = Depends(get_db)):
-    # Prefer enriched version including product fields; fallback to legacy if empty
-    enriched = crud.get_stock_with_product_by_bodega(db, bodega_id)
-    if enriched:
-        return enriched
-    items = crud.get_stock_by_bodega(db, bodega_id)
-    return items
+    def load():
+        # Prefer enriched version including product fields; fallback to legacy if empty
+        enriched = crud.get_stock_with_product_by_bodega(db, bodega_id)
+        if enriched:
+            return enriched
+        return [
+            {"producto_id": s.producto_id, "cantidad": s.cantidad}
+            for s in crud.get_stock_by_bodega(db, bodega_id)
+        ]
+    return cache.get_or_load(('inventario', 'inventory', bodega_id), load, tables=['stock', 'productos'])
@@ -4,6 +4,7 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from app.db import get_db
 from app import models
+from app.fast_json import json_array
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -285,7 +286,7 @@ def get_maintenance_tasks(status: Optional[str] = None, db: Session = Depends(ge
         result.sort(key=get_priority)
         logger.info(f"Devolviendo {len(result)} tareas ordenadas por prioridad")
         
-        return result
+        return json_array(result)
         
     except Exception as e:
         logger.error(f"Error obteniendo tareas de mantenimiento: {e}")
@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 from app import crud, schemas
 from app.models import Movimiento
+from app import rollups
 
 router = APIRouter()
 
@@ -24,7 +25,6 @@ def post_movement(payload: schemas.MovementIn, db: Session = Depends(get_db)):
 @router.get('/movements/count')
 def count_movements(desde: str | None = None, hasta: str | None = None, db: Session = Depends(get_db)):
     """Cantidad de movimientos registrados en un rango (fecha)."""
-    q = db.query(Movimiento)
     def parse_dt(s: str):
         try:
             return datetime.fromisoformat(s) if len(s) > 10 else datetime.fromisoformat(s + 'T00:00:00')
@@ -32,8 +32,12 @@ def count_movements(desde: str | None = None, hasta: str | None = None, db: Sess
             return None
     dts = parse_dt(desde) if desde else None
     dte = parse_dt(hasta) if hasta else None
-    if dts:
-        q = q.filter(Movimiento.fecha >= dts)
-    if dte:
-        q = q.filter(Movimiento.fecha <= dte)
-    return {"count": q.count()}
+    def raw_count(inicio, fin):
+        q = db.query(Movimiento)
+        if inicio:
+            q = q.filter(Movimiento.fecha >= inicio)
+        if fin:
+            q = q.filter(Movimiento.fecha < fin)
+        return q.count()
+    # Días completos desde daily_counts; solo los extremos sobre la tabla
+    return {"count": rollups.count_range(db, 'movimientos', raw_count, dts, dte)}
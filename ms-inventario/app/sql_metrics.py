@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación de consultas SQL por request
+
+Engancha los eventos de cursor de SQLAlchemy para medir cada sentencia y
+acumula, dentro del request en curso (ContextVar), cuántas consultas se
+ejecutaron y cuánto tiempo pasaron en la BD:
+
+- db_query_duration_seconds          (histograma por sentencia)
+- http_request_db_queries            (route)
+- http_request_db_seconds            (route)
+- header `Server-Timing: db;dur=<ms>;desc="<n> queries"` en la respuesta
+
+Detección de N+1: si un request ejecuta la misma forma de sentencia (SQL con
+literales normalizados) más de SQL_NPLUS1_THRESHOLD veces (por defecto 10) se
+registra un warning con la ruta y la sentencia.
+
+Los endpoints síncronos corren en el threadpool con una copia del contexto;
+como el objeto de estadísticas es mutable, lo que registran es visible para
+el middleware al terminar el request.
+"""
+
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+
+from prometheus_client import Histogram  # type: ignore[reportMissingImports]
+from sqlalchemy import event
+
+from .metrics import _route_template
+
+logger = logging.getLogger(__name__)
+
+NPLUS1_THRESHOLD = int(os.getenv("SQL_NPLUS1_THRESHOLD", "10"))
+
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Duración de cada sentencia SQL",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Consultas SQL ejecutadas por request",
+    ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 1000),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Tiempo en la BD por request",
+    ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0),
+)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+    """SQL con literales reemplazados por ? y espacios colapsados."""
+    return _SPACES.sub(" ", _LITERALS.sub("?", statement)).strip()
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.seconds += elapsed
+        self.shapes[statement] += 1
+
+    def repeated(self, threshold: int = NPLUS1_THRESHOLD):
+        """Formas de sentencia ejecutadas más de `threshold` veces."""
+        if self.count <= threshold:
+            return []
+        by_shape: Counter = Counter()
+        for statement, n in self.shapes.items():
+            by_shape[statement_shape(statement)] += n
+        return [(shape, n) for shape, n in by_shape.items() if n > threshold]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("sql_query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    QUERY_DURATION.observe(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute no corre si la sentencia falla: sin esto las
+    # conexiones del pool acumulan inicios huérfanos
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    QUERY_DURATION.observe(elapsed)
+    stats = _current.get()
+    if stats is not None and exception_context.statement is not None:
+        stats.record(exception_context.statement, elapsed)
+
+
+def instrument_engine(engine) -> None:
+    """Registra los listeners de medición en `engine` (idempotente)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class SQLMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and stats.count:
+                timing = f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"'
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = _route_template(scope)
+            REQUEST_QUERIES.labels(route).observe(stats.count)
+            REQUEST_DB_SECONDS.labels(route).observe(stats.seconds)
+            for shape, n in stats.repeated():
+                logger.warning(
+                    f"⚠️ Posible N+1 en {scope['method']} {route}: {n} ejecuciones de: {shape[:300]}"
+                )
@@ -0,0 +1,159 @@
+"""
+Pruebas de app/rollups.py contra infra/sql/021_daily_rollups.sql.
+
+Necesitan Postgres (funciones plpgsql y triggers): se ejecutan solo si
+TEST_DATABASE_URL apunta a una base de pruebas. Cada prueba crea un schema
+propio con tablas mínimas, aplica la migración 021 ahí y lo elimina al final.
+
+Ejecutar desde ms-inventario/:
+    TEST_DATABASE_URL=postgresql+psycopg2://... python -m pytest tests/test_rollups.py
+"""
+
+import os
+import uuid
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import rollups
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+MIGRACION = Path(__file__).resolve().parents[2] / "infra" / "sql" / "021_daily_rollups.sql"
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="requiere TEST_DATABASE_URL (Postgres)")
+
+TABLAS = """
+    CREATE TABLE movimientos (id SERIAL PRIMARY KEY, fecha TIMESTAMP NOT NULL);
+    CREATE TABLE alertas (id SERIAL PRIMARY KEY, fecha TIMESTAMP NOT NULL);
+    CREATE TABLE delivery_requests (id SERIAL PRIMARY KEY, created_at TIMESTAMPTZ NOT NULL, status TEXT);
+    CREATE TABLE incidents (id SERIAL PRIMARY KEY, created_at TIMESTAMPTZ NOT NULL, severity TEXT);
+"""
+
+
+@pytest.fixture
+def db():
+    schema = f"rollups_test_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(TEST_DATABASE_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    # Días del rollup en UTC, como en el contenedor
+    engine = create_engine(TEST_DATABASE_URL, connect_args={"options": f"-csearch_path={schema} -ctimezone=UTC"})
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(TABLAS)
+        sql = MIGRACION.read_text(encoding="utf-8")
+        cur.execute("\n".join(l for l in sql.splitlines() if not l.startswith("\\")))
+        raw.commit()
+    finally:
+        raw.close()
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+def insertar(db, *fechas):
+    for f in fechas:
+        db.execute(text("INSERT INTO movimientos (fecha) VALUES (:f)"), {"f": f})
+    db.commit()
+
+
+def contador(db, llamadas):
+    """raw_count sobre la tabla original que registra los tramos consultados."""
+    def raw_count(inicio, fin):
+        llamadas.append((inicio, fin))
+        sql = "SELECT COUNT(*) FROM movimientos WHERE TRUE"
+        if inicio is not None:
+            sql += " AND fecha >= :inicio"
+        if fin is not None:
+            sql += " AND fecha < :fin"
+        return db.execute(text(sql), {"inicio": inicio, "fin": fin}).scalar()
+    return raw_count
+
+
+def contar(db, desde, hasta):
+    """(conteo por rollups, COUNT(*) directo, tramos leídos de la tabla)."""
+    llamadas = []
+    por_rollup = rollups.count_range(db, "movimientos", contador(db, llamadas), desde, hasta)
+    fin = hasta + timedelta(microseconds=1) if hasta is not None else None
+    directo = contador(db, [])(desde, fin)
+    return por_rollup, directo, llamadas
+
+
+def dia(hoy, offset, hora=0, minuto=0):
+    return datetime.combine(hoy + timedelta(days=offset), time(hora, minuto))
+
+
+def test_rangos_a_traves_del_watermark_coinciden_con_count(db):
+    hoy = db.execute(text("SELECT CURRENT_DATE")).scalar()
+    insertar(db,
+             dia(hoy, -4, 10), dia(hoy, -4, 23, 59),
+             dia(hoy, -3, 0), dia(hoy, -3, 12), dia(hoy, -3, 18),
+             dia(hoy, -2, 5),
+             dia(hoy, -1, 0), dia(hoy, -1, 23, 30),
+             dia(hoy, 0, 0))
+
+    # Migración recién aplicada: días cerrados compactados hasta hoy
+    assert db.execute(text(
+        "SELECT compacted_until FROM daily_counts_watermark WHERE entity = 'movimientos'"
+    )).scalar() == hoy
+
+    rangos = [
+        (None, None),
+        (dia(hoy, -4, 12), dia(hoy, -2, 6)),              # extremos parciales
+        (dia(hoy, -3), dia(hoy, -1) - timedelta(microseconds=1)),  # días completos
+        (dia(hoy, -2), dia(hoy, 0, 23, 59)),              # cruza el watermark
+        (dia(hoy, -3, 6), dia(hoy, -3, 15)),              # dentro de un día
+        (None, dia(hoy, -2, 4)),
+        (dia(hoy, -1, 12), None),
+    ]
+    for desde, hasta in rangos:
+        por_rollup, directo, _ = contar(db, desde, hasta)
+        assert por_rollup == directo, (desde, hasta)
+
+    # Los días completos salen de daily_counts: la tabla solo se lee en los
+    # extremos parciales y desde el watermark
+    _, _, llamadas = contar(db, dia(hoy, -4, 12), dia(hoy, 0, 6))
+    assert llamadas == [
+        (dia(hoy, -4, 12), dia(hoy, -3)),
+        (dia(hoy, 0), dia(hoy, 0, 6) + timedelta(microseconds=1)),
+    ]
+
+
+def test_carga_retroactiva_en_dia_compactado(db):
+    hoy = db.execute(text("SELECT CURRENT_DATE")).scalar()
+    insertar(db, dia(hoy, -3, 9), dia(hoy, -2, 9))
+    db.execute(text("SELECT compact_daily_counts('movimientos')"))
+    db.commit()
+
+    # Inserción, borrado y cambio de fecha en días ya compactados
+    insertar(db, dia(hoy, -3, 20), dia(hoy, -3, 21))
+    db.execute(text("DELETE FROM movimientos WHERE fecha = :f"), {"f": dia(hoy, -2, 9)})
+    db.execute(text("UPDATE movimientos SET fecha = :nueva WHERE fecha = :f"),
+               {"f": dia(hoy, -3, 21), "nueva": dia(hoy, -1, 7)})
+    db.commit()
+
+    assert db.execute(text(
+        "SELECT dia, n FROM daily_counts WHERE entity = 'movimientos' ORDER BY dia"
+    )).fetchall() == [(hoy - timedelta(days=3), 2), (hoy - timedelta(days=2), 0), (hoy - timedelta(days=1), 1)]
+    for desde, hasta in [(None, None), (dia(hoy, -3), dia(hoy, -1, 23, 59)), (dia(hoy, -2), None)]:
+        por_rollup, directo, _ = contar(db, desde, hasta)
+        assert por_rollup == directo, (desde, hasta)
+
+
+def test_sin_watermark_cuenta_sobre_la_tabla(db):
+    hoy = db.execute(text("SELECT CURRENT_DATE")).scalar()
+    db.execute(text("DELETE FROM daily_counts_watermark WHERE entity = 'movimientos'"))
+    insertar(db, dia(hoy, -2, 9), dia(hoy, -1, 9))
+    por_rollup, directo, llamadas = contar(db, dia(hoy, -5), dia(hoy, 0))
+    assert por_rollup == directo == 2
+    assert len(llamadas) == 1
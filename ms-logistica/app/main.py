@@ -1,15 +1,21 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from pydantic import BaseModel
 from .routes import router as maps_router
 from .routes_routes import router as routes_router
 from .delivery_service import router as delivery_router
 import structlog  # type: ignore[reportMissingImports]
-from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST  # type: ignore[reportMissingImports]
+from prometheus_client import Counter  # type: ignore[reportMissingImports]
+from .compression import CompressionMiddleware
+from .metrics import MetricsMiddleware, metrics_response, mark_process_dead
+from .sql_metrics import SQLMetricsMiddleware, instrument_engine
+from .tracing import TracingMiddleware, configure_tracing, shutdown_tracing, trace_engine
+from .profiling import ProfilingMiddleware, router as profiling_router
 from fastapi.responses import Response
 from .logging_config import configure_logging
-from .db import engine
+from .db import engine, SessionLocal
+from . import rollups
+import asyncio
 from .models import Base
 
 configure_logging()
@@ -20,6 +26,7 @@ app = FastAPI(title="ms-logistica")
 app.include_router(maps_router, prefix="/maps", tags=["maps"])
 app.include_router(routes_router, prefix="/routes", tags=["routes"])
 app.include_router(delivery_router, tags=["deliveries"])
+app.include_router(profiling_router)
 
 # For dev/MVP, ensure tables exist
 try:
@@ -43,16 +50,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware para garantizar UTF-8 en todas las respuestas
-class UTF8Middleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        # Asegurar que todas las respuestas JSON tengan charset=utf-8
-        if response.headers.get('content-type', '').startswith('application/json'):
-            response.headers['content-type'] = 'application/json; charset=utf-8'
-        return response
+# Compresión gzip/brotli y ETag con If-None-Match → 304
+app.add_middleware(CompressionMiddleware)
 
-app.add_middleware(UTF8Middleware)
+# Métricas por ruta + charset=utf-8 en respuestas JSON (middleware ASGI puro)
+app.add_middleware(MetricsMiddleware)
+
+# Conteo/tiempo de consultas SQL por request (Server-Timing + detección N+1)
+instrument_engine(engine)
+app.add_middleware(SQLMetricsMiddleware)
+
+# Trazas distribuidas (W3C traceparent, export OTLP/JSON con TRACE_EXPORT)
+configure_tracing("ms-logistica")
+trace_engine(engine)
+app.add_middleware(TracingMiddleware)
+
+# Profiling bajo demanda (/admin/profiling); sin sesión activa no agrega trabajo
+app.add_middleware(ProfilingMiddleware)
 
 
 # Global exception handler for dev visibility
@@ -72,6 +86,19 @@ async def global_exception_handler(request, exc: Exception):
 REQUESTS = Counter("ms_logistica_requests_total", "Total HTTP requests")
 
 
+@app.on_event("startup")
+async def start_rollup_compaction():
+    # Compactación periódica de conteos diarios (infra/sql/021_daily_rollups.sql)
+    app.state.rollup_task = asyncio.create_task(rollups.run_compaction(SessionLocal))
+
+
+@app.on_event("shutdown")
+async def stop_rollup_compaction():
+    app.state.rollup_task.cancel()
+    shutdown_tracing()
+    mark_process_dead()
+
+
 @app.get("/health")
 async def health():
     REQUESTS.inc()
@@ -80,8 +107,7 @@ async def health():
 
 @app.get("/metrics")
 async def metrics():
-    data = generate_latest()
-    return Response(content=data, media_type=CONTENT_TYPE_LATEST)
+    return metrics_response()
 
 
 @app.get("/")
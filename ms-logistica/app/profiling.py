@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling bajo demanda (sin redeploy)
+
+Una sesión de profiling captura los próximos N requests cuyo path empiece con
+`route` (o todos los que lleguen durante `seconds`) en uno de dos modos:
+
+- sample:   un hilo muestrea `sys._current_frames()` cada `interval_ms` mientras
+            haya requests capturados en curso y acumula stacks colapsados
+            (`frame;frame;frame <n>`, compatibles con flamegraph.pl/speedscope).
+            Cubre tanto endpoints async como los síncronos del threadpool.
+            Límites: muestrea todos los hilos del proceso (menos los ociosos),
+            no solo los de los requests capturados: el hilo del event loop y
+            los del threadpool los comparten todos los requests, así que con
+            tráfico el perfil incluye requests ajenos y tareas de fondo. Cada
+            stack empieza con el nombre del hilo para separarlos. Para un
+            perfil limpio: requests=1 con poco tráfico.
+- cprofile: cProfile alrededor de cada request capturado y reporte pstats
+            ordenado por tiempo acumulado. Límites: solo ve el código que corre
+            en el hilo del event loop (para endpoints síncronos usar sample);
+            mientras el request capturado espera (await), el perfil también
+            registra las demás corrutinas que corren en el loop, así que el
+            reporte mezcla requests ajenos; y los requests capturados se
+            serializan entre sí (un lock), lo que agrega latencia bajo carga.
+            Para un perfil limpio: requests=1 con poco tráfico.
+
+Con la sesión apagada el middleware solo compara un atributo con None.
+
+Endpoints (/admin/profiling) protegidos por el header X-Profiling-Token, que
+debe coincidir con PROFILING_TOKEN; sin esa variable quedan deshabilitados.
+El gateway los expone a administradores vía /api/admin/profiling/{servicio}.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+MAX_STACKS = 20000
+MAX_DEPTH = 64
+
+# Hojas de stack que corresponden a hilos ociosos (no aportan al perfil)
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", os.path.join("concurrent", "futures", "thread.py"))
+
+
+class ProfileRequest(BaseModel):
+    mode: str = Field("sample", pattern="^(sample|cprofile)$")
+    route: Optional[str] = None
+    requests: Optional[int] = Field(None, ge=1, le=10000)
+    seconds: Optional[float] = Field(None, gt=0, le=600)
+    interval_ms: float = Field(5.0, ge=1, le=1000)
+
+
+class ProfileSession:
+    def __init__(self, req: ProfileRequest):
+        self.mode = req.mode
+        self.route = req.route
+        self.remaining = req.requests
+        self.interval = req.interval_ms / 1000.0
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.ended_at: Optional[str] = None
+        # Sin límite explícito, la sesión dura como máximo 60 s
+        window = req.seconds or (None if req.requests else 60.0)
+        self.deadline = time.monotonic() + window if window else None
+        self.in_flight = 0
+        self.captured = 0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.stats: Optional[pstats.Stats] = None
+
+    def matches(self, path: str) -> bool:
+        return self.route is None or path.startswith(self.route)
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def describe(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "route": self.route,
+            "remaining": self.remaining,
+            "captured": self.captured,
+            "in_flight": self.in_flight,
+            "samples": self.samples,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+        }
+
+    def result(self) -> str:
+        if self.mode == "sample":
+            return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common()) + "\n"
+        if self.stats is None:
+            return ""
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats("cumulative").print_stats(60)
+        return out.getvalue()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})".replace(";", ",")
+
+
+class Profiler:
+    def __init__(self):
+        self.session: Optional[ProfileSession] = None
+        self.last: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+        self._cprofile_lock: Optional[asyncio.Lock] = None
+        self._sampler: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    def start(self, req: ProfileRequest) -> ProfileSession:
+        with self._lock:
+            if self.session is not None:
+                raise HTTPException(status_code=409, detail="Ya hay una sesión de profiling activa")
+            session = self.session = ProfileSession(req)
+        if session.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample_loop, args=(session,), name="profiler-sampler", daemon=True)
+            self._sampler.start()
+        return session
+
+    def stop(self) -> Optional[ProfileSession]:
+        with self._lock:
+            session = self.session
+            if session is None:
+                return None
+            self.session = None
+            session.ended_at = datetime.now(timezone.utc).isoformat()
+            self.last = session
+            return session
+
+    def current(self) -> Optional[ProfileSession]:
+        session = self.session
+        if session is not None and session.expired() and session.in_flight == 0:
+            self.stop()
+            return None
+        return session
+
+    # ------------------------------------------------------------------
+    def _claim(self, path: str) -> Optional[ProfileSession]:
+        session = self.current()
+        if session is None or not session.matches(path):
+            return None
+        with self._lock:
+            if self.session is not session or session.expired():
+                return None
+            if session.remaining is not None:
+                if session.remaining <= 0:
+                    return None
+                session.remaining -= 1
+            session.in_flight += 1
+            session.captured += 1
+        return session
+
+    def _release(self, session: ProfileSession) -> None:
+        with self._lock:
+            session.in_flight -= 1
+            done = session.in_flight == 0 and (session.remaining == 0 or session.expired())
+        if done:
+            self.stop()
+
+    def _sample_loop(self, session: ProfileSession) -> None:
+        own = threading.get_ident()
+        while self.session is session:
+            if session.in_flight > 0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for tid, frame in sys._current_frames().items():
+                    if tid == own or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < MAX_DEPTH:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(tid, str(tid)))
+                    key = ";".join(reversed(stack))
+                    if key in session.stacks or len(session.stacks) < MAX_STACKS:
+                        session.stacks[key] += 1
+                session.samples += 1
+            elif session.expired():
+                self.stop()
+                return
+            time.sleep(session.interval)
+
+    async def _run_cprofile(self, session: ProfileSession, call):
+        # cProfile es por hilo: un solo perfil activo en el loop a la vez
+        if self._cprofile_lock is None:
+            self._cprofile_lock = asyncio.Lock()
+        async with self._cprofile_lock:
+            prof = cProfile.Profile()
+            prof.enable()
+            try:
+                await call()
+            finally:
+                prof.disable()
+                with self._lock:
+                    if session.stats is None:
+                        session.stats = pstats.Stats(prof)
+                    else:
+                        session.stats.add(prof)
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if profiler.session is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        session = profiler._claim(scope.get("path", ""))
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            if session.mode == "cprofile":
+                await profiler._run_cprofile(session, lambda: self.app(scope, receive, send))
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            profiler._release(session)
+
+
+# ----------------------------------------------------------------------
+# Endpoints de control (compartidos por todos los servicios)
+# ----------------------------------------------------------------------
+def profiling_status() -> Dict:
+    session = profiler.current()
+    return {
+        "active": session.describe() if session else None,
+        "last": profiler.last.describe() if profiler.last else None,
+    }
+
+
+def profiling_result() -> PlainTextResponse:
+    session = profiler.last
+    if session is None:
+        raise HTTPException(status_code=404, detail="No hay resultados de profiling")
+    return PlainTextResponse(session.result())
+
+
+def _check_token(x_profiling_token: Optional[str] = Header(None)) -> None:
+    # Comparación en tiempo constante
+    if not PROFILING_TOKEN or not hmac.compare_digest(
+            (x_profiling_token or "").encode(), PROFILING_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="forbidden")
+
+
+router = APIRouter(prefix="/admin/profiling", tags=["profiling"])
+
+
+@router.get("")
+def get_status(x_profiling_token: Optional[str] = Header(None)):
+    _check_token(x_profiling_token)
+    return profiling_status()
+
+
+@router.post("/start")
+def start(req: ProfileRequest, x_profiling_token: Optional[str] = Header(None)):
+    _check_token(x_profiling_token)
+    return profiler.start(req).describe()
+
+
+@router.post("/stop")
+def stop(x_profiling_token: Optional[str] = Header(None)):
+    _check_token(x_profiling_token)
+    session = profiler.stop()
+    return session.describe() if session else {"active": None}
+
+
+@router.get("/result")
+def get_result(x_profiling_token: Optional[str] = Header(None)):
+    _check_token(x_profiling_token)
+    return profiling_result()
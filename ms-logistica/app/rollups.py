@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Conteos por rango de fechas usando los rollups diarios (infra/sql/021_daily_rollups.sql)
+
+Para un rango [desde, hasta] se suman las filas de daily_counts de los días
+completos ya compactados, y solo los extremos parciales y los días aún no
+compactados (el día en curso) se cuentan sobre la tabla original.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_INTERVAL_SECONDS = 3600
+
+# raw_count(desde, hasta_exclusivo) -> conteo sobre la tabla original;
+# cualquiera de los dos límites puede ser None (rango abierto)
+RawCount = Callable[[Optional[datetime], Optional[datetime]], int]
+
+
+def _day_start(d: date) -> datetime:
+    return datetime.combine(d, time.min)
+
+
+def _naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    # Los días del rollup se calculan en UTC (TimeZone de la BD)
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def count_range(
+    db: Session,
+    entity: str,
+    raw_count: RawCount,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    dims: Optional[Iterable[str]] = None,
+) -> int:
+    """
+    Cuenta filas de ``entity`` con fecha en [desde, hasta] (ambos inclusive).
+
+    ``dims`` filtra por la dimensión del rollup (status / severity); el mismo
+    filtro debe estar aplicado en ``raw_count``.
+    """
+    desde, hasta = _naive_utc(desde), _naive_utc(hasta)
+    # Intervalo semiabierto [desde, fin)
+    fin = hasta + timedelta(microseconds=1) if hasta is not None else None
+    if db.get_bind().dialect.name != "postgresql":
+        # Fallback SQLite de desarrollo: sin rollups
+        return raw_count(desde, fin)
+
+    watermark = db.execute(
+        text("SELECT compacted_until FROM daily_counts_watermark WHERE entity = :entity"),
+        {"entity": entity},
+    ).scalar()
+    if watermark is None:
+        return raw_count(desde, fin)
+
+    # Días completos: [primer_dia, ultimo_dia_excl), nunca más allá del watermark
+    if desde is None:
+        primer_dia = None
+    elif desde == _day_start(desde.date()):
+        primer_dia = desde.date()
+    else:
+        primer_dia = desde.date() + timedelta(days=1)
+    ultimo_dia_excl = min(fin.date(), watermark) if fin is not None else watermark
+
+    if primer_dia is not None and primer_dia >= ultimo_dia_excl:
+        return raw_count(desde, fin)
+
+    sql = "SELECT COALESCE(SUM(n), 0) FROM daily_counts WHERE entity = :entity AND dia < :hasta_dia"
+    params = {"entity": entity, "hasta_dia": ultimo_dia_excl}
+    if primer_dia is not None:
+        sql += " AND dia >= :desde_dia"
+        params["desde_dia"] = primer_dia
+    if dims is not None:
+        sql += " AND dim = ANY(:dims)"
+        params["dims"] = list(dims)
+    total = int(db.execute(text(sql), params).scalar())
+
+    if primer_dia is not None and desde < _day_start(primer_dia):
+        total += raw_count(desde, _day_start(primer_dia))
+    if fin is None or fin > _day_start(ultimo_dia_excl):
+        total += raw_count(_day_start(ultimo_dia_excl), fin)
+    return total
+
+
+def compact(session_factory) -> None:
+    db = session_factory()
+    if db.get_bind().dialect.name != "postgresql":
+        db.close()
+        return
+    try:
+        rows = db.execute(text("SELECT compact_daily_counts()")).scalar()
+        db.commit()
+        if rows:
+            logger.info(f"📊 Rollups diarios compactados: {rows} filas")
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"⚠️ No se pudo compactar daily_counts: {e}")
+    finally:
+        db.close()
+
+
+async def run_compaction(session_factory, interval: float = COMPACTION_INTERVAL_SECONDS) -> None:
+    """Compacta al iniciar y luego periódicamente (los días cerran a medianoche)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await loop.run_in_executor(None, compact, session_factory)
+        await asyncio.sleep(interval)
@@ -13,6 +13,9 @@ from pydantic import Field
 from fastapi import Depends
 from .db import SessionLocal
 from .models import DeliveryRequest, Incident
+from . import rollups
+from .tracing import traced_client
+from .fast_json import json_array
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
@@ -41,6 +44,10 @@ def encode_polyline(coords):
 router = APIRouter()
 
 GOOGLE_KEY = os.environ.get("GOOGLE_MAPS_SERVER_KEY") or os.environ.get("VITE_GOOGLE_MAPS_API_KEY") or ""
+# Proveedores externos (configurables para apuntar a stand-ins locales en pruebas de carga)
+GOOGLE_MAPS_URL = os.environ.get("GOOGLE_MAPS_URL", "https://maps.googleapis.com").rstrip("/")
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org").rstrip("/")
+OSRM_URL = os.environ.get("OSRM_URL", "https://router.project-osrm.org").rstrip("/")
 logger = logging.getLogger("ms-logistica.routes")
 
 
@@ -60,9 +67,9 @@ async def geocode(req: AddressRequest):
     # Try Google geocoding if key present, otherwise fall back to Nominatim (OSM)
     if GOOGLE_KEY:
         try:
-            url = "https://maps.googleapis.com/maps/api/geocode/json"
+            url = f"{GOOGLE_MAPS_URL}/maps/api/geocode/json"
             params = {"address": req.address, "key": GOOGLE_KEY}
-            async with httpx.AsyncClient() as client:
+            async with traced_client() as client:
                 r = await client.get(url, params=params, timeout=15)
                 try:
                     data = r.json()
@@ -79,7 +86,7 @@ async def geocode(req: AddressRequest):
 
     # Nominatim fallback (OpenStreetMap) with resilient retries/variants
     try:
-        nom_url = "https://nominatim.openstreetmap.org/search"
+        nom_url = f"{NOMINATIM_URL}/search"
 
         def build_variants(addr: str):
             variants = []
@@ -114,7 +121,7 @@ async def geocode(req: AddressRequest):
         async def try_query(q: str):
             params = {"q": q, "format": "json", "limit": 5, "addressdetails": 1}
             headers = {"User-Agent": "lux-logistica/1.0 (dev)", "Accept-Language": "es-CL,es;q=0.9,en;q=0.8"}
-            async with httpx.AsyncClient(headers=headers) as client:
+            async with traced_client(headers=headers) as client:
                 r = await client.get(nom_url, params=params, timeout=15)
                 try:
                     return r.json()
@@ -203,9 +210,9 @@ async def directions(req: DirectionsRequest):
             if len(route_points) >= 2:
                 # OSRM expects lon,lat order
                 coords = ";".join([f"{lng},{lat}" for (lat, lng) in route_points])
-                osrm_url = f"https://router.project-osrm.org/route/v1/driving/{coords}"
+                osrm_url = f"{OSRM_URL}/route/v1/driving/{coords}"
                 params = {"overview": "full", "geometries": "polyline"}
-                async with httpx.AsyncClient() as client:
+                async with traced_client() as client:
                     r = await client.get(osrm_url, params=params, timeout=20)
                     data = r.json()
                 if data.get("code") == "Ok" and data.get("routes"):
@@ -243,8 +250,8 @@ async def directions(req: DirectionsRequest):
     if req.optimize:
         params["optimize"] = "true"
 
-    url = "https://maps.googleapis.com/maps/api/directions/json"
-    async with httpx.AsyncClient() as client:
+    url = f"{GOOGLE_MAPS_URL}/maps/api/directions/json"
+    async with traced_client() as client:
         r = await client.get(url, params=params, timeout=20)
         data = r.json()
 
@@ -318,8 +325,28 @@ def create_delivery_request(req: DeliveryCreate, db: Session = Depends(get_db)):
 
 @router.get('/delivery_requests', response_model=List[DeliveryOut])
 def list_delivery_requests(limit: int = 100, db: Session = Depends(get_db)):
-    items = db.query(DeliveryRequest).order_by(DeliveryRequest.created_at.desc()).limit(limit).all()
-    return items
+    # Solo las columnas necesarias, armadas directo con la forma de DeliveryOut
+    rows = db.execute(text("""
+        SELECT id, origin_address, origin_lat, origin_lng,
+               destination_address, destination_lat, destination_lng,
+               vehicle_id, status, created_at
+        FROM delivery_requests
+        ORDER BY created_at DESC
+        LIMIT :limit
+    """), {"limit": limit})
+    return json_array([
+        {
+            "id": r.id,
+            "origin": {"address": r.origin_address, "lat": r.origin_lat, "lng": r.origin_lng},
+            "destination": {"address": r.destination_address, "lat": r.destination_lat, "lng": r.destination_lng},
+            "vehicle_id": str(r.vehicle_id) if r.vehicle_id is not None else None,
+            "status": r.status,
+            "eta": None,
+            "payload": None,
+            "created_at": r.created_at.isoformat() if r.created_at else None,
+        }
+        for r in rows
+    ])
 
 
 @router.get('/delivery_requests/count')
@@ -329,14 +356,21 @@ def count_delivery_requests(
     status: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    q = db.query(DeliveryRequest)
-    if created_from is not None:
-        q = q.filter(DeliveryRequest.created_at >= created_from)
-    if created_to is not None:
-        q = q.filter(DeliveryRequest.created_at <= created_to)
-    if status is not None:
-        q = q.filter(DeliveryRequest.status == status)
-    return {"count": q.count()}
+    def raw_count(inicio, fin):
+        q = db.query(DeliveryRequest)
+        if inicio is not None:
+            q = q.filter(DeliveryRequest.created_at >= inicio)
+        if fin is not None:
+            q = q.filter(DeliveryRequest.created_at < fin)
+        if status is not None:
+            q = q.filter(DeliveryRequest.status == status)
+        return q.count()
+    # Días completos desde daily_counts; solo los extremos sobre la tabla
+    count = rollups.count_range(
+        db, 'delivery_requests', raw_count, created_from, created_to,
+        dims=[status] if status is not None else None
+    )
+    return {"count": count}
 
 
 # Incidents endpoints (HU5)
@@ -470,6 +504,29 @@ def list_incidents(
     return items
 
 
+@router.get('/incidents/count')
+def count_incidents(
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    severity: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    def raw_count(inicio, fin):
+        q = db.query(Incident)
+        if inicio is not None:
+            q = q.filter(Incident.created_at >= inicio)
+        if fin is not None:
+            q = q.filter(Incident.created_at < fin)
+        if severity is not None:
+            q = q.filter(Incident.severity == severity)
+        return q.count()
+    count = rollups.count_range(
+        db, 'incidents', raw_count, created_from, created_to,
+        dims=[severity] if severity is not None else None
+    )
+    return {"count": count}
+
+
 @router.get('/incidents/{incident_id}', response_model=IncidentOut)
 def get_incident(incident_id: int, db: Session = Depends(get_db)):
     item = db.query(Incident).filter(Incident.id == incident_id).first()
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+Trazas distribuidas entre el gateway y los microservicios
+
+- Propagación W3C (`traceparent`): cada servicio continúa el span recibido y
+  los clientes httpx creados con `traced_client()` lo inyectan en sus
+  llamadas salientes (gateway → ms-*, ms-logistica → OSRM/Google/Nominatim).
+- Spans: uno SERVER por request, uno CLIENT por llamada HTTP saliente y uno
+  por sentencia SQL (`trace_engine`).
+- Exportación OTLP/JSON (una línea `resourceSpans` por lote, el mismo formato
+  que el file exporter del OpenTelemetry Collector) a un archivo o a stdout,
+  sin depender de un collector.
+
+Con la exportación apagada igual se reenvía el `traceparent` recibido (con la
+decisión de muestreo de origen), para no cortar la traza entre servicios; sin
+header entrante el middleware no hace nada.
+
+Configuración:
+  TRACE_EXPORT        off (defecto) | stdout | ruta de archivo
+  TRACE_SAMPLE_RATIO  fracción de trazas raíz a muestrear (defecto 1.0); las
+                      trazas que llegan con `traceparent` respetan la decisión
+                      del servicio que las originó.
+  TRACE_QUEUE_MAX     spans en espera de exportación (defecto 10000); con la
+                      cola llena los spans nuevos se descartan.
+  SERVICE_NAME        nombre del servicio en el recurso exportado.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import event
+
+from .metrics import _route_template
+from .sql_metrics import statement_shape
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "off")
+SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+EXPORT_BATCH_SIZE = 256
+EXPORT_QUEUE_MAX = int(os.getenv("TRACE_QUEUE_MAX", "10000"))
+EXPORT_INTERVAL_SECONDS = 2.0
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "sampled", "name", "kind",
+                 "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, object] = {}
+        self.status = STATUS_OK
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        if self.sampled:
+            _exporter.submit(self)
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attr(k, v) for k, v in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attr(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id, sampled) o None si el header no es válido."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+def start_span(name: str, kind: int = KIND_INTERNAL, traceparent: Optional[str] = None) -> Span:
+    """Crea un span hijo del actual (o de `traceparent`, o una traza raíz)."""
+    parent = _current.get()
+    if parent is not None:
+        return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled)
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        # Se respeta la decisión de origen aunque aquí no se exporte (submit la filtra)
+        trace_id, parent_id, sampled = remote
+        return Span(name, kind, trace_id, parent_id, sampled)
+    return Span(name, kind, _new_trace_id(), None, enabled() and random.random() < SAMPLE_RATIO)
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Span de uso interno: `with span("optimizar_ruta", n=len(puntos)): ...`."""
+    s = start_span(name, kind)
+    s.attributes.update(attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = STATUS_ERROR
+        s.attributes["exception.type"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+
+# ----------------------------------------------------------------------
+# Exportador OTLP/JSON
+# ----------------------------------------------------------------------
+class _Exporter:
+    def __init__(self):
+        self.service_name = os.getenv("SERVICE_NAME", "luxchile")
+        self.target = TRACE_EXPORT
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=EXPORT_QUEUE_MAX)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.target.lower() not in ("", "off", "0", "false")
+
+    def submit(self, s: Span) -> None:
+        if self.enabled:
+            try:
+                self._queue.put_nowait(s)
+            except queue.Full:
+                # Exportador atrasado: se pierde el span, no la memoria
+                self.dropped += 1
+
+    def start(self) -> None:
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def _drain(self) -> List[Span]:
+        spans = []
+        while len(spans) < EXPORT_BATCH_SIZE:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(EXPORT_INTERVAL_SECONDS)
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self.dropped:
+                logger.warning(f"⚠️ Cola de trazas llena: {self.dropped} spans descartados")
+                self.dropped = 0
+            while True:
+                spans = self._drain()
+                if not spans:
+                    return
+                try:
+                    self._write(spans)
+                except Exception as e:
+                    logger.warning(f"⚠️ No se pudieron exportar {len(spans)} spans: {e}")
+
+    def _write(self, spans: List[Span]) -> None:
+        line = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attr("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "luxchile.tracing"},
+                    "spans": [s.to_otlp() for s in spans],
+                }],
+            }]
+        }, separators=(",", ":"))
+        if self.target.lower() == "stdout":
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+        else:
+            with open(self.target, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_exporter = _Exporter()
+
+
+def enabled() -> bool:
+    return _exporter.enabled
+
+
+def configure_tracing(service_name: str) -> None:
+    """Define el nombre del servicio (si no viene SERVICE_NAME) e inicia el exportador."""
+    if "SERVICE_NAME" not in os.environ:
+        _exporter.service_name = service_name
+    _exporter.start()
+
+
+def shutdown_tracing() -> None:
+    _exporter.flush()
+
+
+# ----------------------------------------------------------------------
+# Servidor: un span SERVER por request
+# ----------------------------------------------------------------------
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        if not enabled() and parse_traceparent(traceparent) is None:
+            await self.app(scope, receive, send)
+            return
+        s = start_span(scope["method"], KIND_SERVER, traceparent)
+        s.attributes["http.method"] = scope["method"]
+        s.attributes["http.target"] = scope.get("path", "")
+        token = _current.set(s)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                s.attributes["http.status_code"] = status
+                if status >= 500:
+                    s.status = STATUS_ERROR
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-trace-id", s.trace_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            s.status = STATUS_ERROR
+            raise
+        finally:
+            _current.reset(token)
+            route = _route_template(scope)
+            s.name = f"{scope['method']} {route}"
+            s.attributes["http.route"] = route
+            s.end()
+
+
+# ----------------------------------------------------------------------
+# Cliente: httpx con inyección de traceparent y span CLIENT
+# ----------------------------------------------------------------------
+class TracingTransport(httpx.AsyncHTTPTransport):
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if _current.get() is None:
+            return await super().handle_async_request(request)
+        s = start_span(f"{request.method} {request.url.host}", KIND_CLIENT)
+        s.attributes["http.method"] = request.method
+        s.attributes["http.url"] = str(request.url.copy_with(query=None))
+        s.attributes["net.peer.name"] = request.url.host
+        request.headers["traceparent"] = s.traceparent
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException as e:
+            s.status = STATUS_ERROR
+            s.attributes["exception.type"] = type(e).__name__
+            s.end()
+            raise
+        s.attributes["http.status_code"] = response.status_code
+        if response.status_code >= 500:
+            s.status = STATUS_ERROR
+        s.end()
+        return response
+
+
+def traced_client(**kwargs) -> httpx.AsyncClient:
+    """`httpx.AsyncClient` que propaga la traza actual (mismos argumentos)."""
+    transport_args = {k: kwargs.pop(k) for k in ("limits", "verify", "http2") if k in kwargs}
+    return httpx.AsyncClient(transport=TracingTransport(**transport_args), **kwargs)
+
+
+# ----------------------------------------------------------------------
+# Base de datos: un span por sentencia
+# ----------------------------------------------------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None or not parent.sampled or not enabled():
+        return
+    s = start_span("db.query", KIND_CLIENT)
+    s.attributes["db.system"] = conn.dialect.name
+    s.attributes["db.statement"] = statement_shape(statement)[:1000]
+    conn.info.setdefault("trace_spans", []).append(s)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        spans.pop().end()
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    spans = conn.info.get("trace_spans") if conn is not None else None
+    if spans:
+        s = spans.pop()
+        s.status = STATUS_ERROR
+        s.attributes["exception.type"] = type(exception_context.original_exception).__name__
+        s.end()
+
+
+def trace_engine(engine) -> None:
+    """Registra spans por sentencia SQL en `engine` (idempotente)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
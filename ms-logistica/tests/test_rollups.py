@@ -0,0 +1,123 @@
+"""
+Pruebas de app/rollups.py (conteos por dimensión) contra
+infra/sql/021_daily_rollups.sql.
+
+Necesitan Postgres (funciones plpgsql y triggers): se ejecutan solo si
+TEST_DATABASE_URL apunta a una base de pruebas. Cada prueba crea un schema
+propio con tablas mínimas, aplica la migración 021 ahí y lo elimina al final.
+
+Ejecutar desde ms-logistica/:
+    TEST_DATABASE_URL=postgresql+psycopg2://... python -m pytest tests/test_rollups.py
+"""
+
+import os
+import uuid
+from datetime import datetime, time, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import rollups
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+MIGRACION = Path(__file__).resolve().parents[2] / "infra" / "sql" / "021_daily_rollups.sql"
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="requiere TEST_DATABASE_URL (Postgres)")
+
+TABLAS = """
+    CREATE TABLE movimientos (id SERIAL PRIMARY KEY, fecha TIMESTAMP NOT NULL);
+    CREATE TABLE alertas (id SERIAL PRIMARY KEY, fecha TIMESTAMP NOT NULL);
+    CREATE TABLE delivery_requests (id SERIAL PRIMARY KEY, created_at TIMESTAMPTZ NOT NULL, status TEXT);
+    CREATE TABLE incidents (id SERIAL PRIMARY KEY, created_at TIMESTAMPTZ NOT NULL, severity TEXT);
+"""
+
+
+@pytest.fixture
+def db():
+    schema = f"rollups_test_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(TEST_DATABASE_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    # Días del rollup en UTC, como en el contenedor
+    engine = create_engine(TEST_DATABASE_URL, connect_args={"options": f"-csearch_path={schema} -ctimezone=UTC"})
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(TABLAS)
+        sql = MIGRACION.read_text(encoding="utf-8")
+        cur.execute("\n".join(l for l in sql.splitlines() if not l.startswith("\\")))
+        raw.commit()
+    finally:
+        raw.close()
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+def dia(hoy, offset, hora=0, minuto=0):
+    return datetime.combine(hoy + timedelta(days=offset), time(hora, minuto), tzinfo=timezone.utc)
+
+
+def contar(db, status, desde, hasta):
+    """(conteo por rollups, COUNT(*) directo) de delivery_requests con ese status."""
+    def raw_count(inicio, fin):
+        sql = "SELECT COUNT(*) FROM delivery_requests WHERE status = :status"
+        if inicio is not None:
+            sql += " AND created_at >= :inicio"
+        if fin is not None:
+            sql += " AND created_at < :fin"
+        return db.execute(text(sql), {"status": status, "inicio": inicio, "fin": fin}).scalar()
+
+    por_rollup = rollups.count_range(db, "delivery_requests", raw_count, desde, hasta, dims=[status])
+    fin = hasta + timedelta(microseconds=1) if hasta is not None else None
+    # El rollup trabaja con fechas UTC sin zona
+    return por_rollup, raw_count(rollups._naive_utc(desde), rollups._naive_utc(fin))
+
+
+def test_conteo_por_status_con_cambios_en_dias_compactados(db):
+    hoy = db.execute(text("SELECT CURRENT_DATE")).scalar()
+    filas = [
+        (dia(hoy, -3, 8), "pending"), (dia(hoy, -3, 22), "assigned"),
+        (dia(hoy, -2, 1), "pending"), (dia(hoy, -2, 13), "pending"),
+        (dia(hoy, -1, 23, 59), "assigned"), (dia(hoy, 0, 0), "pending"),
+    ]
+    for creada, status in filas:
+        db.execute(text("INSERT INTO delivery_requests (created_at, status) VALUES (:c, :s)"),
+                   {"c": creada, "s": status})
+    db.execute(text("SELECT compact_daily_counts('delivery_requests')"))
+    db.commit()
+
+    rangos = [
+        (None, None),
+        (dia(hoy, -3, 12), dia(hoy, -1, 12)),
+        (dia(hoy, -2), dia(hoy, 0, 23, 59)),
+        # Con zona: se pasa a UTC antes de cortar por días
+        (dia(hoy, -3, 9).astimezone(timezone(timedelta(hours=-4))), None),
+    ]
+
+    def comparar():
+        for status in ("pending", "assigned"):
+            for desde, hasta in rangos:
+                por_rollup, directo = contar(db, status, desde, hasta)
+                assert por_rollup == directo, (status, desde, hasta)
+
+    comparar()
+
+    # Cambio de status y carga retroactiva en días ya compactados
+    db.execute(text("UPDATE delivery_requests SET status = 'assigned' WHERE created_at = :c"),
+               {"c": dia(hoy, -2, 1)})
+    db.execute(text("INSERT INTO delivery_requests (created_at, status) VALUES (:c, 'pending')"),
+               {"c": dia(hoy, -3, 23)})
+    db.commit()
+    assert db.execute(text(
+        "SELECT n FROM daily_counts WHERE entity = 'delivery_requests' AND dia = :d AND dim = 'assigned'"
+    ), {"d": hoy - timedelta(days=2)}).scalar() == 1
+    comparar()
@@ -0,0 +1,270 @@
+"""
+Asignación automática en lote de conductores a turnos dinámicos
+
+Toma los turnos pendientes de un rango de fechas y los asigna resolviendo un
+problema de asignación de costo mínimo (LAPJVsp de scipy, la variante del
+método húngaro para matrices dispersas) en vez de elegir uno por uno.
+
+La matriz de costos es dispersa: solo existen pares turno-conductor que
+cumplen las reglas de app/driving_rules.py y no chocan con otros turnos
+del conductor (app/schedule_index.py). Cada turno tiene además una columna
+propia "sin asignar" con costo COSTO_SIN_ASIGNAR, así el problema
+siempre tiene solución y un turno queda sin conductor solo si no hay
+ninguno elegible.
+
+Costo de un par (menor es mejor):
+- horas ya cargadas ese día (conducidas + planificadas): reparte el trabajo.
+- fracción del máximo de conducción continua que quedaría usada: prefiere
+  conductores descansados.
+- distancia (km) desde el destino del turno anterior del conductor ese día
+  al origen de la ruta (delivery_requests): prefiere al que queda cerca.
+
+Un conductor puede tomar varios turnos del rango: se resuelve por rondas y
+tras cada ronda las asignaciones se agregan a sus líneas de tiempo
+(simuladas); la siguiente ronda solo considera lo que sigue siendo válido.
+Cada ronda es óptima; el total es una buena aproximación al óptimo global.
+"""
+
+import math
+from bisect import bisect_right, insort
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import models
+from .driving_rules import CONDUCCION_CONTINUA_MAX, ROLES_CONDUCCION, DriverTimeline, minuto_absoluto, timelines
+from .eligibility import ROL_CONDUCTOR
+from .schedule_index import schedule
+
+PESO_HORAS = 1.0          # por hora ya cargada en el día
+PESO_CONTINUIDAD = 2.0    # por fracción del máximo continuo usada
+KM_POR_HORA = 30.0        # 30 km de traslado "cuestan" como 1 hora de carga
+COSTO_SIN_ASIGNAR = 1000.0
+MAX_DIAS_LOTE = 14
+MAX_RONDAS = 10
+
+
+@dataclass
+class _Turno:
+    id: int
+    dia: date
+    inicio: int
+    duracion: int
+    maximo: int
+    origen: Optional[Tuple[float, float]]
+    destino: Optional[Tuple[float, float]]
+
+
+@dataclass
+class _EstadoConductor:
+    timeline: DriverTimeline
+    carga_por_dia: Dict[date, int]
+    turnos: set
+    # (inicio, destino) de sus turnos en el rango, ordenados por inicio
+    posiciones: List[Tuple[int, Optional[Tuple[float, float]]]] = field(default_factory=list)
+
+    def posicion_antes_de(self, inicio: int) -> Optional[Tuple[float, float]]:
+        i = bisect_right(self.posiciones, inicio, key=lambda p: p[0])
+        return self.posiciones[i - 1][1] if i else None
+
+
+@dataclass
+class ResultadoLote:
+    asignaciones: List[Tuple[int, int, float]]      # (turno, conductor, costo)
+    sin_asignar: List[int]
+    rondas: int
+
+
+def _km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def _punto(lat, lng) -> Optional[Tuple[float, float]]:
+    if lat is None or lng is None:
+        return None
+    return float(lat), float(lng)
+
+
+def costo(estado: _EstadoConductor, turno: _Turno) -> Optional[float]:
+    """Costo de asignar `turno` al conductor, o None si no es elegible."""
+    if turno.id in estado.turnos:
+        return None
+    if estado.timeline.puede_tomar(turno.inicio, turno.duracion, turno.maximo) is not None:
+        return None
+    horas = estado.carga_por_dia.get(turno.dia, 0) / 60
+    continuidad = estado.timeline.conduccion_continua(turno.inicio, turno.duracion) / turno.maximo
+    km = 0.0
+    anterior = estado.posicion_antes_de(turno.inicio)
+    if anterior is not None and turno.origen is not None:
+        km = _km(anterior, turno.origen)
+    return PESO_HORAS * horas + PESO_CONTINUIDAD * continuidad + km / KM_POR_HORA
+
+
+def resolver_ronda(pares: Dict[Tuple[int, int], float], n_turnos: int, n_conductores: int) -> Dict[int, int]:
+    """
+    Asignación de costo mínimo sobre una matriz dispersa turno x conductor.
+
+    Retorna {fila_turno: columna_conductor} solo para los turnos asignados.
+    """
+    if not pares:
+        return {}
+    filas = [f for f, _ in pares] + list(range(n_turnos))
+    columnas = [c for _, c in pares] + [n_conductores + f for f in range(n_turnos)]
+    # +1: csgraph descarta ceros explícitos (serían "sin arista")
+    pesos = [p + 1.0 for p in pares.values()] + [COSTO_SIN_ASIGNAR + 1.0] * n_turnos
+    matriz = csr_matrix((pesos, (filas, columnas)), shape=(n_turnos, n_conductores + n_turnos))
+    filas_ok, columnas_ok = min_weight_full_bipartite_matching(matriz)
+    return {int(f): int(c) for f, c in zip(filas_ok, columnas_ok) if c < n_conductores}
+
+
+def _cargar_turnos(session: Session, fecha_desde: date, fecha_hasta: date, bloquear: bool) -> List[models.DynamicShift]:
+    q = session.query(models.DynamicShift).filter(
+        models.DynamicShift.status == 'pendiente',
+        models.DynamicShift.fecha_programada >= fecha_desde,
+        models.DynamicShift.fecha_programada <= fecha_hasta,
+    ).order_by(models.DynamicShift.fecha_programada, models.DynamicShift.hora_inicio, models.DynamicShift.id)
+    if bloquear:
+        # Dos lotes concurrentes toman turnos disjuntos
+        q = q.with_for_update(skip_locked=True)
+    return q.all()
+
+
+def _coordenadas_rutas(session: Session, route_ids: List[int]) -> Dict[int, tuple]:
+    if not route_ids:
+        return {}
+    rows = session.execute(text("""
+        SELECT id, origin_lat, origin_lng, destination_lat, destination_lng
+        FROM delivery_requests WHERE id = ANY(:ids)
+    """), {'ids': route_ids})
+    return {r.id: (_punto(r.origin_lat, r.origin_lng), _punto(r.destination_lat, r.destination_lng)) for r in rows}
+
+
+def _posiciones(session: Session, fecha_desde: date, fecha_hasta: date) -> Dict[int, list]:
+    """Inicio y destino de los turnos ya asignados a cada conductor en el rango."""
+    rows = session.execute(text("""
+        SELECT a.employee_id, s.fecha_programada, s.hora_inicio,
+               dr.destination_lat, dr.destination_lng
+        FROM dynamic_shift_assignments a
+        JOIN dynamic_shifts s ON s.id = a.dynamic_shift_id
+        LEFT JOIN delivery_requests dr ON dr.id = s.route_id
+        WHERE a.role_in_shift = ANY(:roles) AND a.status != 'cancelado'
+          AND s.fecha_programada BETWEEN :desde AND :hasta
+    """), {'desde': fecha_desde - timedelta(days=1), 'hasta': fecha_hasta, 'roles': list(ROLES_CONDUCCION)})
+    posiciones: Dict[int, list] = {}
+    for r in rows:
+        posiciones.setdefault(r.employee_id, []).append(
+            (minuto_absoluto(r.fecha_programada, r.hora_inicio), _punto(r.destination_lat, r.destination_lng))
+        )
+    for lista in posiciones.values():
+        lista.sort(key=lambda p: p[0])
+    return posiciones
+
+
+def asignar_lote(session: Session, fecha_desde: date, fecha_hasta: date, dry_run: bool = False) -> ResultadoLote:
+    """
+    Calcula (y si no es dry_run, guarda en una sola transacción) la
+    asignación de los turnos pendientes entre `fecha_desde` y `fecha_hasta`.
+    """
+    shifts = _cargar_turnos(session, fecha_desde, fecha_hasta, bloquear=not dry_run)
+    if not shifts:
+        return ResultadoLote([], [], 0)
+
+    rutas = _coordenadas_rutas(session, sorted({s.route_id for s in shifts if s.route_id is not None}))
+    turnos = [
+        _Turno(
+            id=s.id,
+            dia=s.fecha_programada,
+            inicio=minuto_absoluto(s.fecha_programada, s.hora_inicio),
+            duracion=s.duracion_minutos,
+            maximo=s.conduccion_continua_minutos or CONDUCCION_CONTINUA_MAX,
+            origen=rutas.get(s.route_id, (None, None))[0],
+            destino=rutas.get(s.route_id, (None, None))[1],
+        )
+        for s in shifts
+    ]
+
+    conductores = [emp_id for (emp_id,) in session.query(models.Employee.id).join(
+        models.Role, models.Role.id == models.Employee.role_id
+    ).filter(
+        models.Employee.activo == True,  # noqa: E712
+        models.Role.nombre == ROL_CONDUCTOR,
+    ).order_by(models.Employee.id)]
+    fechas = sorted({t.dia for t in turnos})
+    posiciones = _posiciones(session, fechas[0], fechas[-1])
+    snapshot = timelines.instantanea(session, fechas, conductores)
+    estados = [_EstadoConductor(*snapshot[emp], posiciones.get(emp, [])) for emp in conductores]
+
+    # Choques con turnos manuales u otros roles: no cambian entre rondas
+    choques = schedule.conflictos(
+        session, [(emp, t.inicio, t.inicio + t.duracion) for emp in conductores for t in turnos]
+    )
+    bloqueados = {divmod(k, len(turnos)) for k, choque in enumerate(choques) if choque is not None}
+
+    pendientes = list(range(len(turnos)))
+    asignaciones: List[Tuple[int, int, float]] = []
+    rondas = 0
+    while pendientes and rondas < MAX_RONDAS:
+        pares = {}
+        for fila, t_idx in enumerate(pendientes):
+            for col, estado in enumerate(estados):
+                if (col, t_idx) in bloqueados:
+                    continue
+                c = costo(estado, turnos[t_idx])
+                if c is not None:
+                    pares[(fila, col)] = c
+        elegidos = resolver_ronda(pares, len(pendientes), len(estados))
+        if not elegidos:
+            break
+        rondas += 1
+        for fila, col in elegidos.items():
+            turno, estado = turnos[pendientes[fila]], estados[col]
+            asignaciones.append((turno.id, conductores[col], round(pares[(fila, col)], 3)))
+            # Simular la asignación para las rondas siguientes
+            estado.timeline.agregar(turno.inicio, turno.inicio + turno.duracion)
+            estado.carga_por_dia[turno.dia] = estado.carga_por_dia.get(turno.dia, 0) + turno.duracion
+            estado.turnos.add(turno.id)
+            insort(estado.posiciones, (turno.inicio, turno.destino), key=lambda p: p[0])
+        pendientes = [t_idx for fila, t_idx in enumerate(pendientes) if fila not in elegidos]
+
+    if not dry_run and asignaciones:
+        por_id = {s.id: s for s in shifts}
+        ahora = datetime.now()
+        nuevas = []
+        for turno_id, emp_id, _ in asignaciones:
+            assignment = models.DynamicShiftAssignment(
+                dynamic_shift_id=turno_id,
+                employee_id=emp_id,
+                role_in_shift='conductor',
+                status='asignado',
+            )
+            session.add(assignment)
+            nuevas.append(assignment)
+            por_id[turno_id].status = 'asignado'
+            por_id[turno_id].assigned_at = ahora
+        session.flush()
+        ids = [a.id for a in nuevas]
+        session.commit()
+        # El commit expira los objetos: recargarlos en bloque, no uno por uno
+        session.query(models.DynamicShift).filter(models.DynamicShift.id.in_(list(por_id))).all()
+        session.query(models.DynamicShiftAssignment).filter(models.DynamicShiftAssignment.id.in_(ids)).all()
+        for assignment in nuevas:
+            timelines.invalidar_conductor(assignment.employee_id)
+            # Índice de conflictos al día sin esperar el NOTIFY (como auto_assign_driver)
+            schedule.registrar_dinamico(assignment, por_id[assignment.dynamic_shift_id])
+    elif not dry_run:
+        # Libera los bloqueos de los turnos leídos
+        session.rollback()
+
+    return ResultadoLote(
+        asignaciones=asignaciones,
+        sin_asignar=[turnos[t_idx].id for t_idx in pendientes],
+        rondas=rondas,
+    )
+
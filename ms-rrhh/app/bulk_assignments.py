@@ -0,0 +1,211 @@
+"""
+Importación masiva de asignaciones de turno (JSON o CSV)
+
+Todo el lote se valida en memoria antes de escribir:
+
+1. Formato de cada fila (employee_id, shift_id, date ISO, notes opcional).
+2. Empleado existente y activo, turno existente (una consulta cada uno).
+3. Duplicados dentro del mismo lote.
+4. Choques de horario contra lo ya asignado (app/schedule_index.py, una
+   sola llamada para todo el lote) y contra las otras filas del lote.
+
+Las filas válidas se escriben con INSERT ... ON CONFLICT (employee_id,
+shift_id, date) DO UPDATE SET notes en una sola transacción: una fila que
+ya existía solo actualiza sus notas. La sincronización con turnos dinámicos
+(infra/sql/022_bulk_manual_shift_sync.sql) corre una vez por sentencia.
+
+El resultado informa el estado de cada fila: creada, actualizada, error u
+omitida (con todo_o_nada=true, si alguna fila tiene error no se escribe
+ninguna).
+"""
+
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import literal_column, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .schedule_index import IntervalIndex, intervalo_manual, schedule
+from .weekly_coverage import invalidar_cobertura
+
+MAX_FILAS_LOTE = 20000
+FILAS_POR_SENTENCIA = 5000   # 4 parámetros por fila, bajo el límite de 65535
+COLUMNAS = ('employee_id', 'shift_id', 'date', 'notes')
+
+CREADA = 'creada'
+ACTUALIZADA = 'actualizada'
+ERROR = 'error'
+OMITIDA = 'omitida'
+
+Clave = Tuple[int, int, date]
+
+
+@dataclass
+class FilaLote:
+    fila: int                       # 1-based, como en el archivo
+    employee_id: Optional[int] = None
+    shift_id: Optional[int] = None
+    date: Optional[date] = None
+    notes: Optional[str] = None
+    status: Optional[str] = None
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def clave(self) -> Clave:
+        return self.employee_id, self.shift_id, self.date
+
+
+def leer_filas(contenido: bytes, content_type: str) -> List[dict]:
+    """
+    Convierte el cuerpo en una lista de dicts.
+
+    CSV (text/csv) con encabezado employee_id,shift_id,date[,notes]; JSON
+    como lista de objetos o {"assignments": [...]}. Lanza ValueError si el
+    cuerpo no se puede leer.
+    """
+    if 'csv' in (content_type or ''):
+        try:
+            lector = csv.DictReader(io.StringIO(contenido.decode('utf-8-sig')))
+        except UnicodeDecodeError as exc:
+            raise ValueError(f'CSV no es UTF-8: {exc}')
+        faltantes = set(COLUMNAS[:3]) - set(lector.fieldnames or ())
+        if faltantes:
+            raise ValueError(f'Faltan columnas en el CSV: {", ".join(sorted(faltantes))}')
+        return list(lector)
+    try:
+        datos = json.loads(contenido or b'[]')
+    except ValueError as exc:
+        raise ValueError(f'JSON inválido: {exc}')
+    if isinstance(datos, dict):
+        datos = datos.get('assignments')
+    if not isinstance(datos, list):
+        raise ValueError('Se esperaba una lista de asignaciones')
+    return datos
+
+
+def _parsear(numero: int, crudo) -> FilaLote:
+    fila = FilaLote(fila=numero)
+    if not isinstance(crudo, dict):
+        fila.error = 'La fila debe ser un objeto'
+        return fila
+    try:
+        fila.employee_id = int(str(crudo.get('employee_id')).strip())
+        fila.shift_id = int(str(crudo.get('shift_id')).strip())
+    except ValueError:
+        fila.error = 'employee_id y shift_id deben ser enteros'
+        return fila
+    try:
+        fila.date = date.fromisoformat(str(crudo.get('date')).strip())
+    except ValueError:
+        fila.error = 'date debe tener formato YYYY-MM-DD'
+        return fila
+    notas = crudo.get('notes')
+    fila.notes = str(notas).strip() or None if notas is not None else None
+    return fila
+
+
+def _validar(session: Session, filas: List[FilaLote]) -> Dict[int, models.Shift]:
+    """Marca con error las filas inválidas. Retorna los turnos por id."""
+    shifts = {s.id: s for s in session.query(models.Shift)}
+    ok = [f for f in filas if f.error is None]
+    activos = {
+        emp_id: activo for emp_id, activo in session.execute(
+            text("SELECT id, activo FROM employees WHERE id = ANY(:ids)"),
+            {'ids': sorted({f.employee_id for f in ok})},
+        )
+    }
+    existentes: Set[Clave] = set()
+    if ok:
+        existentes = {
+            tuple(r) for r in session.execute(text("""
+                SELECT employee_id, shift_id, date FROM shift_assignments
+                WHERE employee_id = ANY(:ids) AND date BETWEEN :desde AND :hasta
+            """), {
+                'ids': sorted(activos),
+                'desde': min(f.date for f in ok),
+                'hasta': max(f.date for f in ok),
+            })
+        }
+
+    vistas: Set[Clave] = set()
+    nuevas: List[Tuple[FilaLote, int, int]] = []
+    for f in ok:
+        if f.employee_id not in activos:
+            f.error = 'Empleado no encontrado'
+        elif not activos[f.employee_id]:
+            f.error = 'Empleado inactivo'
+        elif f.shift_id not in shifts:
+            f.error = 'Turno no encontrado'
+        elif f.clave in vistas:
+            f.error = 'Fila duplicada en el lote'
+        else:
+            vistas.add(f.clave)
+            if f.clave not in existentes:
+                shift = shifts[f.shift_id]
+                nuevas.append((f, *intervalo_manual(f.date, shift.start_time, shift.end_time)))
+
+    # Choques con lo ya asignado: una sola consulta al índice
+    choques = schedule.conflictos(session, [(f.employee_id, inicio, fin) for f, inicio, fin in nuevas])
+    # Choques entre filas del mismo lote
+    lote: Dict[int, IntervalIndex] = {}
+    for (f, inicio, fin), choque in zip(nuevas, choques):
+        if choque is not None:
+            f.error = choque
+            continue
+        indice = lote.setdefault(f.employee_id, IntervalIndex())
+        previo = indice.choque(inicio, fin)
+        if previo is not None:
+            f.error = f"Conflicto de horario con la fila {previo[2][1]} del lote"
+            continue
+        indice.agregar(inicio, fin, ('lote', f.fila))
+    return shifts
+
+
+def importar(session: Session, crudas: List[dict], todo_o_nada: bool = False) -> List[FilaLote]:
+    """Valida y escribe el lote; retorna el estado de cada fila."""
+    filas = [_parsear(i, crudo) for i, crudo in enumerate(crudas, start=1)]
+    shifts = _validar(session, filas)
+    validas = [f for f in filas if f.error is None]
+    for f in filas:
+        if f.error is not None:
+            f.status = ERROR
+    if not validas or (todo_o_nada and len(validas) < len(filas)):
+        for f in validas:
+            f.status = OMITIDA
+        session.rollback()
+        return filas
+
+    por_clave = {f.clave: f for f in validas}
+    creadas: List[FilaLote] = []
+    SA = models.ShiftAssignment
+    for i in range(0, len(validas), FILAS_POR_SENTENCIA):
+        stmt = insert(SA).values([
+            {'employee_id': f.employee_id, 'shift_id': f.shift_id, 'date': f.date, 'notes': f.notes}
+            for f in validas[i:i + FILAS_POR_SENTENCIA]
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['employee_id', 'shift_id', 'date'],
+            set_={'notes': stmt.excluded.notes},
+        ).returning(SA.id, SA.employee_id, SA.shift_id, SA.date, literal_column('(xmax = 0)').label('insertada'))
+        for sa_id, emp_id, shift_id, dia, insertada in session.execute(stmt):
+            f = por_clave[(emp_id, shift_id, dia)]
+            f.id = sa_id
+            f.status = CREADA if insertada else ACTUALIZADA
+            if insertada:
+                creadas.append(f)
+    session.commit()
+
+    for f in creadas:
+        schedule.registrar_manual(
+            models.ShiftAssignment(id=f.id, employee_id=f.employee_id, shift_id=f.shift_id, date=f.date),
+            shifts[f.shift_id],
+        )
+    invalidar_cobertura()
+    return filas
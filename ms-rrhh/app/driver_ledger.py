@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Libro diario de conducción (horas de servicio) en memoria
+
+Lee driver_daily_ledger (infra/sql/023_driver_daily_ledger.sql), que los
+triggers mantienen al día con cada cambio en driving_logs: totales del día,
+racha de conducción continua y último descanso de cada conductor.
+
+Se carga un día completo con una consulta y se cachea en la caché de
+change_bus; cualquier cambio en driver_daily_ledger (notificación
+LISTEN/NOTIFY) invalida los días cacheados. Cada consulta posterior por
+(conductor, día) es una búsqueda en un dict.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .change_bus import cache
+
+TABLAS = ("driver_daily_ledger",)
+
+
+@dataclass(frozen=True)
+class LedgerDia:
+    minutos_conduccion: int = 0
+    minutos_descanso: int = 0
+    registros: int = 0
+    racha_continua_minutos: int = 0
+    racha_maxima_minutos: int = 0
+    ultima_conduccion_fin: Optional[datetime] = None
+    ultimo_descanso_at: Optional[datetime] = None
+
+
+SIN_REGISTROS = LedgerDia()
+
+
+def _cargar(session: Session, fecha: date) -> Dict[int, LedgerDia]:
+    rows = session.execute(text("""
+        SELECT employee_id, minutos_conduccion, minutos_descanso, registros,
+               racha_continua_minutos, racha_maxima_minutos,
+               ultima_conduccion_fin, ultimo_descanso_at
+        FROM driver_daily_ledger
+        WHERE fecha = :fecha
+    """), {"fecha": fecha})
+    return {row[0]: LedgerDia(*row[1:]) for row in rows}
+
+
+def ledger_dia(session: Session, fecha: date) -> Dict[int, LedgerDia]:
+    """Libro del día: {employee_id: LedgerDia} (solo conductores con registros)."""
+    return cache.get_or_load(
+        ("driver_ledger", fecha.isoformat()),
+        lambda: _cargar(session, fecha),
+        tables=TABLAS,
+    )
+
+
+def consultar(session: Session, employee_id: int, fecha: date) -> LedgerDia:
+    return ledger_dia(session, fecha).get(employee_id, SIN_REGISTROS)
+
+
+def consultar_varios(session: Session, employee_ids: Iterable[int], fecha: date) -> Dict[int, LedgerDia]:
+    dia = ledger_dia(session, fecha)
+    return {emp: dia.get(emp, SIN_REGISTROS) for emp in employee_ids}
@@ -0,0 +1,386 @@
+"""
+Motor de reglas de conducción continua
+
+Regla: un conductor no puede sumar más de `conduccion_continua_minutos`
+(300 por defecto) de conducción continua; para "reiniciar" el contador
+necesita un descanso de al menos DESCANSO_MINUTOS (120) sin conducir.
+
+Cada conductor tiene una línea de tiempo (`DriverTimeline`) en minutos
+absolutos con dos estructuras ordenadas:
+
+- intervalos de conducción (unión, disjuntos): detectan choques de horario.
+- bloques continuos: intervalos separados por menos de DESCANSO_MINUTOS,
+  con el total de minutos conducidos del bloque.
+
+Consultar "¿puede tomar un turno de D minutos que empieza en T?" son dos
+búsquedas binarias: el turno nuevo solo puede unirse al bloque anterior y
+al siguiente.
+
+Los intervalos salen de `driving_logs` (lo ya conducido; cada registro
+empieza a la hora de inicio del turno y los registros de un mismo turno se
+encadenan con su descanso) y de las asignaciones vigentes de conductor sin
+registros aún (se asume el turno completo conduciendo).
+
+`TimelineStore` mantiene las líneas de tiempo de los días cargados y se
+actualiza de forma incremental con las notificaciones de
+infra/sql/019_change_notifications.sql: solo se recargan los conductores
+afectados. Sin listener conectado se recarga la ventana completa en cada
+consulta (nunca se evalúa con datos que pudieron cambiar sin aviso).
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, time, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .change_bus import listener
+
+DESCANSO_MINUTOS = 120
+CONDUCCION_CONTINUA_MAX = 300
+MINUTOS_DIA = 24 * 60
+# Días alrededor del turno evaluado (turnos que cruzan la medianoche)
+VENTANA_DIAS = 1
+MAX_DIAS_CARGADOS = 31
+
+_TABLAS = ('driving_logs', 'dynamic_shift_assignments', 'dynamic_shifts')
+# Roles de asignación que conducen: 'conductor' (ms-rrhh) y 'Conductor Principal'
+# (rutas del gateway, app/rrhh_outbox.py). Los espejos de turnos manuales
+# ('Conductor Turno ...', 016/022) no cuentan como conducción planificada.
+ROLES_CONDUCCION = ('conductor', 'Conductor Principal')
+
+
+def minuto_absoluto(dia: date, hora: time) -> int:
+    return dia.toordinal() * MINUTOS_DIA + hora.hour * 60 + hora.minute
+
+
+def _horas(minutos: int) -> str:
+    return f"{minutos / 60:g} horas"
+
+
+class DriverTimeline:
+    """Intervalos de conducción y bloques continuos de un conductor."""
+
+    def __init__(self, descanso: int = DESCANSO_MINUTOS):
+        self.descanso = descanso
+        self._inicios: List[int] = []
+        self._fines: List[int] = []
+        self._bloque_inicios: List[int] = []
+        self._bloque_fines: List[int] = []
+        self._bloque_minutos: List[int] = []
+
+    @classmethod
+    def desde_intervalos(cls, intervalos: Iterable[Tuple[int, int]], descanso: int = DESCANSO_MINUTOS) -> 'DriverTimeline':
+        timeline = cls(descanso)
+        for inicio, fin in sorted(intervalos):
+            timeline.agregar(inicio, fin)
+        return timeline
+
+    def __len__(self) -> int:
+        return len(self._inicios)
+
+    def copia(self) -> 'DriverTimeline':
+        nueva = DriverTimeline(self.descanso)
+        nueva._inicios = self._inicios[:]
+        nueva._fines = self._fines[:]
+        nueva._bloque_inicios = self._bloque_inicios[:]
+        nueva._bloque_fines = self._bloque_fines[:]
+        nueva._bloque_minutos = self._bloque_minutos[:]
+        return nueva
+
+    def _bloques_vecinos(self, inicio: int, fin: int) -> Tuple[int, int]:
+        # Bloques a menos de `descanso` minutos de [inicio, fin)
+        desde = bisect_right(self._bloque_fines, inicio - self.descanso)
+        hasta = bisect_left(self._bloque_inicios, fin + self.descanso)
+        return desde, hasta
+
+    def agregar(self, inicio: int, fin: int) -> None:
+        """Agrega un intervalo de conducción [inicio, fin)."""
+        if fin <= inicio:
+            return
+
+        # Unión con los intervalos que se solapan o tocan
+        i = bisect_left(self._fines, inicio)
+        j = bisect_right(self._inicios, fin)
+        cubiertos = sum(self._fines[k] - self._inicios[k] for k in range(i, j))
+        if i < j:
+            inicio = min(inicio, self._inicios[i])
+            fin = max(fin, self._fines[j - 1])
+        self._inicios[i:j] = [inicio]
+        self._fines[i:j] = [fin]
+        nuevos = (fin - inicio) - cubiertos
+
+        # Fusión de bloques continuos
+        bi, bj = self._bloques_vecinos(inicio, fin)
+        minutos = nuevos + sum(self._bloque_minutos[bi:bj])
+        if bi < bj:
+            inicio = min(inicio, self._bloque_inicios[bi])
+            fin = max(fin, self._bloque_fines[bj - 1])
+        self._bloque_inicios[bi:bj] = [inicio]
+        self._bloque_fines[bi:bj] = [fin]
+        self._bloque_minutos[bi:bj] = [minutos]
+
+    def conduccion_continua(self, inicio: int, minutos: int) -> int:
+        """Minutos continuos que sumaría conducir `minutos` desde `inicio`."""
+        bi, bj = self._bloques_vecinos(inicio, inicio + minutos)
+        return minutos + sum(self._bloque_minutos[bi:bj])
+
+    def choca(self, inicio: int, minutos: int) -> bool:
+        i = bisect_right(self._fines, inicio)
+        return i < len(self._inicios) and self._inicios[i] < inicio + minutos
+
+    def puede_tomar(
+        self,
+        inicio: int,
+        minutos: int,
+        conduccion_continua_max: int = CONDUCCION_CONTINUA_MAX,
+    ) -> Optional[str]:
+        """Retorna None si puede tomar el turno, o la razón si no."""
+        if self.choca(inicio, minutos):
+            return "Conflicto de horario con otro turno asignado"
+        if self.conduccion_continua(inicio, minutos) > conduccion_continua_max:
+            return (
+                f"Superaría {_horas(conduccion_continua_max)} de conducción continua. "
+                f"Requiere {_horas(self.descanso)} de descanso."
+            )
+        return None
+
+
+class _Conductor:
+    """Registros crudos de un conductor en los días cargados."""
+
+    def __init__(self):
+        # log_id -> (dia, turno_id, hora_inicio, minutos_conduccion, minutos_descanso)
+        self.logs: Dict[int, tuple] = {}
+        # asignacion_id -> (turno_id, dia, hora_inicio, duracion_minutos)
+        self.planificados: Dict[int, tuple] = {}
+        self.timeline = DriverTimeline()
+        self.turnos: Set[int] = set()
+        # Conducido + planificado por día (para balancear carga)
+        self.carga_por_dia: Dict[date, int] = {}
+
+    def reconstruir(self) -> None:
+        intervalos = []
+        cursores: Dict[Tuple[int, date], int] = {}
+        carga_por_dia: Dict[date, int] = {}
+        # Registros de un mismo turno encadenados en orden de id
+        for _, (dia, turno_id, hora, conduccion, descanso) in sorted(self.logs.items()):
+            inicio = cursores.get((turno_id, dia), minuto_absoluto(dia, hora))
+            intervalos.append((inicio, inicio + conduccion))
+            cursores[(turno_id, dia)] = inicio + conduccion + (descanso or 0)
+            carga_por_dia[dia] = carga_por_dia.get(dia, 0) + conduccion
+        con_registro = {turno_id for turno_id, _ in cursores}
+        for turno_id, dia, hora, duracion in self.planificados.values():
+            if turno_id not in con_registro:
+                inicio = minuto_absoluto(dia, hora)
+                intervalos.append((inicio, inicio + duracion))
+                carga_por_dia[dia] = carga_por_dia.get(dia, 0) + duracion
+        self.timeline = DriverTimeline.desde_intervalos(intervalos)
+        self.turnos = con_registro | {p[0] for p in self.planificados.values()}
+        self.carga_por_dia = carga_por_dia
+
+
+class TimelineStore:
+    """Líneas de tiempo por conductor con actualización incremental."""
+
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock()
+        self._dias: Set[date] = set()
+        self._conductores: Dict[int, _Conductor] = {}
+        # id de fila -> conductor, para resolver borrados/updates sin consultar
+        self._log_conductor: Dict[int, int] = {}
+        self._asignacion_conductor: Dict[int, int] = {}
+        self._turno_conductores: Dict[int, Set[int]] = {}
+        self._pendientes: Dict[str, Set[int]] = {t: set() for t in _TABLAS}
+        self._sucios: Set[int] = set()
+        self._reset = False
+
+    # ---- notificaciones -------------------------------------------------
+
+    def handle_notification(self, change: dict) -> None:
+        table = change.get('table')
+        if table not in _TABLAS:
+            return
+        with self._lock:
+            if change.get('id') is None:
+                self._reset = True
+            else:
+                self._pendientes[table].add(int(change['id']))
+
+    def set_active(self, active: bool) -> None:
+        with self._lock:
+            self.active = active
+            self._reset = True
+
+    def invalidar_conductor(self, employee_id: int) -> None:
+        """Fuerza la recarga de un conductor (p. ej. tras asignarlo)."""
+        with self._lock:
+            self._sucios.add(employee_id)
+
+    def invalidar_turno(self, dynamic_shift_id: int) -> None:
+        """Fuerza la recarga de los conductores de un turno."""
+        with self._lock:
+            self._pendientes['dynamic_shifts'].add(dynamic_shift_id)
+
+    # ---- carga ----------------------------------------------------------
+
+    def _vaciar(self) -> None:
+        self._dias.clear()
+        self._conductores.clear()
+        self._log_conductor.clear()
+        self._asignacion_conductor.clear()
+        self._turno_conductores.clear()
+        for ids in self._pendientes.values():
+            ids.clear()
+        self._sucios.clear()
+        self._reset = False
+
+    def _cargar(self, session: Session, dias: Set[date], empleados: Optional[Set[int]] = None) -> Set[int]:
+        """Carga registros y asignaciones de `dias` (opcionalmente de algunos conductores)."""
+        DL, DS, DSA = models.DrivingLog, models.DynamicShift, models.DynamicShiftAssignment
+        logs = session.query(
+            DL.id, DL.employee_id, DL.dynamic_shift_id, DL.fecha, DS.hora_inicio,
+            DL.minutos_conduccion, DL.minutos_descanso,
+        ).join(DS, DS.id == DL.dynamic_shift_id).filter(DL.fecha.in_(dias))
+        asignaciones = session.query(
+            DSA.id, DSA.employee_id, DSA.dynamic_shift_id, DS.fecha_programada, DS.hora_inicio,
+            DS.duracion_minutos,
+        ).join(DS, DS.id == DSA.dynamic_shift_id).filter(
+            DS.fecha_programada.in_(dias),
+            DSA.role_in_shift.in_(ROLES_CONDUCCION),
+            DSA.status != 'cancelado',
+        )
+        if empleados is not None:
+            logs = logs.filter(DL.employee_id.in_(empleados))
+            asignaciones = asignaciones.filter(DSA.employee_id.in_(empleados))
+
+        tocados = set(empleados or ())
+        for log_id, emp, turno_id, dia, hora, conduccion, descanso in logs:
+            self._conductores.setdefault(emp, _Conductor()).logs[log_id] = (dia, turno_id, hora, conduccion, descanso)
+            self._log_conductor[log_id] = emp
+            self._turno_conductores.setdefault(turno_id, set()).add(emp)
+            tocados.add(emp)
+        for asig_id, emp, turno_id, dia, hora, duracion in asignaciones:
+            self._conductores.setdefault(emp, _Conductor()).planificados[asig_id] = (turno_id, dia, hora, duracion)
+            self._asignacion_conductor[asig_id] = emp
+            self._turno_conductores.setdefault(turno_id, set()).add(emp)
+            tocados.add(emp)
+        return tocados
+
+    def _olvidar(self, emp: int) -> None:
+        conductor = self._conductores.pop(emp, None)
+        if conductor is None:
+            return
+        for log_id in conductor.logs:
+            self._log_conductor.pop(log_id, None)
+        for asig_id in conductor.planificados:
+            self._asignacion_conductor.pop(asig_id, None)
+        for emps in self._turno_conductores.values():
+            emps.discard(emp)
+
+    def _resolver_pendientes(self, session: Session) -> Set[int]:
+        """Conductores afectados por las notificaciones acumuladas."""
+        sucios = set(self._sucios)
+        self._sucios.clear()
+        logs = self._pendientes['driving_logs']
+        asignaciones = self._pendientes['dynamic_shift_assignments']
+        turnos = self._pendientes['dynamic_shifts']
+
+        desconocidos_logs = {i for i in logs if i not in self._log_conductor}
+        sucios |= {self._log_conductor[i] for i in logs if i in self._log_conductor}
+        desconocidas_asig = {i for i in asignaciones if i not in self._asignacion_conductor}
+        sucios |= {self._asignacion_conductor[i] for i in asignaciones if i in self._asignacion_conductor}
+        for turno_id in turnos:
+            sucios |= self._turno_conductores.get(turno_id, set())
+
+        DL, DSA = models.DrivingLog, models.DynamicShiftAssignment
+        if desconocidos_logs:
+            sucios |= {e for (e,) in session.query(DL.employee_id).filter(DL.id.in_(desconocidos_logs))}
+        if desconocidas_asig or turnos:
+            q = session.query(DSA.employee_id)
+            if desconocidas_asig and turnos:
+                q = q.filter(DSA.id.in_(desconocidas_asig) | DSA.dynamic_shift_id.in_(turnos))
+            elif desconocidas_asig:
+                q = q.filter(DSA.id.in_(desconocidas_asig))
+            else:
+                q = q.filter(DSA.dynamic_shift_id.in_(turnos))
+            sucios |= {e for (e,) in q}
+        for ids in self._pendientes.values():
+            ids.clear()
+        return sucios
+
+    def _refrescar(self, session: Session, fechas: Iterable[date]) -> None:
+        if self._reset or not self.active:
+            self._vaciar()
+
+        sucios = self._resolver_pendientes(session) if self._dias else set()
+        if sucios:
+            for emp in sucios:
+                self._olvidar(emp)
+            for emp in self._cargar(session, self._dias, sucios):
+                self._conductores.setdefault(emp, _Conductor()).reconstruir()
+
+        ventana = {f + timedelta(days=d) for f in fechas for d in range(-VENTANA_DIAS, VENTANA_DIAS + 1)}
+        faltantes = ventana - self._dias
+        if faltantes:
+            if len(self._dias) + len(faltantes) > MAX_DIAS_CARGADOS:
+                self._vaciar()
+                faltantes = ventana
+            self._dias |= faltantes
+            for emp in self._cargar(session, faltantes):
+                self._conductores[emp].reconstruir()
+
+    # ---- consultas ------------------------------------------------------
+
+    def evaluar(
+        self,
+        session: Session,
+        turno: models.DynamicShift,
+        employee_ids: Iterable[int],
+    ) -> Dict[int, Optional[str]]:
+        """
+        Evalúa `turno` para cada conductor: {employee_id: razón o None}.
+
+        Los minutos conducidos del día salen del libro diario
+        (app/driver_ledger.py), no de aquí.
+        """
+        inicio = minuto_absoluto(turno.fecha_programada, turno.hora_inicio)
+        maximo = turno.conduccion_continua_minutos or CONDUCCION_CONTINUA_MAX
+        vacio = _Conductor()
+        resultado = {}
+        with self._lock:
+            self._refrescar(session, [turno.fecha_programada])
+            for emp in employee_ids:
+                conductor = self._conductores.get(emp, vacio)
+                if turno.id is not None and turno.id in conductor.turnos:
+                    razon = "Ya está asignado a este turno"
+                else:
+                    razon = conductor.timeline.puede_tomar(inicio, turno.duracion_minutos, maximo)
+                resultado[emp] = razon
+        return resultado
+
+    def instantanea(
+        self,
+        session: Session,
+        fechas: Iterable[date],
+        employee_ids: Iterable[int],
+    ) -> Dict[int, Tuple[DriverTimeline, Dict[date, int], Set[int]]]:
+        """
+        Copias de las líneas de tiempo para simular asignaciones:
+        {employee_id: (timeline, carga por día, turnos asignados)}.
+        """
+        with self._lock:
+            self._refrescar(session, fechas)
+            resultado = {}
+            for emp in employee_ids:
+                conductor = self._conductores.get(emp) or _Conductor()
+                resultado[emp] = (conductor.timeline.copia(), dict(conductor.carga_por_dia), set(conductor.turnos))
+        return resultado
+
+
+timelines = TimelineStore()
+listener.subscribe(timelines.handle_notification)
+listener.on_connection_change(timelines.set_active)
@@ -0,0 +1,101 @@
+"""
+Motor de elegibilidad de conductores para turnos dinámicos
+
+Evalúa a todos los candidatos de una vez: una consulta para empleados y
+roles, y las reglas de conducción continua contra las líneas de tiempo de
+app/driving_rules.py (que se cargan con consultas agrupadas y se mantienen
+de forma incremental). Las horas de servicio del día (minutos conducidos,
+racha continua, último descanso) salen del libro diario cacheado
+(app/driver_ledger.py). El número de consultas no depende del número de
+conductores.
+
+Reglas:
+1. Debe existir y tener rol Conductor.
+2. No puede chocar con otro turno asignado, dinámico o manual
+   (app/schedule_index.py).
+3. No puede superar la conducción continua del turno (300 min por defecto)
+   sin un descanso de 2 horas entre medio.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .driver_ledger import SIN_REGISTROS, consultar_varios
+from .driving_rules import minuto_absoluto, timelines
+from .schedule_index import schedule
+
+ROL_CONDUCTOR = 'Conductor'
+
+
+@dataclass
+class Elegibilidad:
+    employee_id: int
+    nombre: str
+    email: str
+    minutos_conduccion_hoy: int
+    puede_asignarse: bool
+    razon_no_disponible: Optional[str]
+    racha_continua_minutos: int = 0
+    ultimo_descanso_at: Optional[datetime] = None
+
+
+def evaluar_conductores(
+    session: Session,
+    turno: models.DynamicShift,
+    employee_ids: Optional[Iterable[int]] = None,
+) -> List[Elegibilidad]:
+    """
+    Evalúa la elegibilidad para `turno`.
+
+    Sin `employee_ids` considera a todos los conductores activos; con
+    `employee_ids` evalúa exactamente esos empleados (incluidos los que no
+    existen o no son conductores, para reportar el motivo).
+    """
+    ids = None if employee_ids is None else list(employee_ids)
+
+    # Candidatos con su rol
+    q = session.query(
+        models.Employee.id, models.Employee.nombre, models.Employee.email, models.Role.nombre
+    ).outerjoin(models.Role, models.Role.id == models.Employee.role_id)
+    if ids is None:
+        q = q.filter(models.Employee.activo == True, models.Role.nombre == ROL_CONDUCTOR)  # noqa: E712
+    else:
+        q = q.filter(models.Employee.id.in_(ids))
+    empleados = {row[0]: row for row in q}
+
+    conductores = [e for e, row in empleados.items() if row[3] == ROL_CONDUCTOR]
+    reglas = timelines.evaluar(session, turno, conductores)
+    ledger = consultar_varios(session, conductores, turno.fecha_programada)
+
+    # Choques con turnos manuales u otros roles (índice en memoria)
+    inicio = minuto_absoluto(turno.fecha_programada, turno.hora_inicio)
+    libres = [e for e in conductores if reglas[e] is None]
+    choques = schedule.conflictos(session, [(e, inicio, inicio + turno.duracion_minutos) for e in libres])
+    for emp_id, choque in zip(libres, choques):
+        if choque is not None:
+            reglas[emp_id] = choque
+
+    resultado = []
+    for emp_id in (ids if ids is not None else list(empleados)):
+        row = empleados.get(emp_id)
+        if row is None:
+            resultado.append(Elegibilidad(emp_id, '', '', 0, False, "Empleado no encontrado"))
+            continue
+        _, nombre, email, rol = row
+        razon = reglas.get(emp_id, "No es un conductor")
+        dia = ledger.get(emp_id, SIN_REGISTROS)
+        resultado.append(Elegibilidad(
+            employee_id=emp_id,
+            nombre=nombre,
+            email=email or '',
+            minutos_conduccion_hoy=dia.minutos_conduccion,
+            puede_asignarse=razon is None,
+            razon_no_disponible=razon,
+            racha_continua_minutos=dia.racha_continua_minutos,
+            ultimo_descanso_at=dia.ultimo_descanso_at,
+        ))
+    return resultado
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Serialización JSON rápida para respuestas de listas grandes
+
+FastAPI, por defecto, pasa cada valor retornado por `jsonable_encoder` (recorre
+recursivamente todas las filas), luego por la validación de `response_model` y
+por último por `json.dumps`. Para endpoints que ya construyen filas con tipos
+simples eso es trabajo duplicado. Retornar una respuesta de este módulo evita
+los tres pasos (FastAPI no revalida un `Response`), así que el endpoint puede
+conservar `response_model` solo para la documentación OpenAPI.
+
+- fast_json(content):       cuerpo completo serializado con orjson.
+- json_array(rows):         listas; sobre STREAM_THRESHOLD filas se envía como
+                            stream en bloques de STREAM_CHUNK_ROWS, sin armar
+                            el documento completo en memoria.
+
+orjson serializa datetime/date/time/UUID de forma nativa; Decimal se convierte
+a float.
+"""
+
+from decimal import Decimal
+from typing import Any, Iterator, Sequence
+
+import orjson  # type: ignore[reportMissingImports]
+from starlette.responses import Response, StreamingResponse
+
+STREAM_THRESHOLD = 2000
+STREAM_CHUNK_ROWS = 500
+MEDIA_TYPE = "application/json; charset=utf-8"
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Tipo no serializable a JSON: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class FastJSONResponse(Response):
+    media_type = MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_json(content: Any, status_code: int = 200, headers=None) -> FastJSONResponse:
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def _iter_array(rows: Sequence[Any], chunk_rows: int) -> Iterator[bytes]:
+    yield b"["
+    for start in range(0, len(rows), chunk_rows):
+        chunk = dumps(rows[start:start + chunk_rows])
+        # Cada bloque se serializa como lista y se le quitan los corchetes
+        yield (b"," if start else b"") + chunk[1:-1]
+    yield b"]"
+
+
+def json_array(rows: Sequence[Any], status_code: int = 200, headers=None, chunk_rows: int = STREAM_CHUNK_ROWS) -> Response:
+    """Respuesta para una lista de filas (stream si es grande)."""
+    if len(rows) <= STREAM_THRESHOLD:
+        return fast_json(rows, status_code=status_code, headers=headers)
+    return StreamingResponse(
+        _iter_array(rows, chunk_rows),
+        status_code=status_code,
+        headers=headers,
+        media_type=MEDIA_TYPE,
+    )
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Cursores opacos para paginación por keyset
+
+Un listado paginado por keyset ordena por una clave única (p. ej.
+fecha, hora, id) y pide la siguiente página con "clave < último visto" en
+vez de OFFSET: el costo de cada página no crece con el historial.
+
+El cursor es la clave de la última fila de la página, en base64 url-safe,
+y viaja en el header `X-Next-Cursor` (ausente en la última página). Los
+servicios deben incluirlo en `expose_headers` de CORS para que el navegador
+lo entregue.
+
+Los listados de turnos dinámicos (gateway y ms-rrhh) ordenan por
+(fecha, hora, id) descendente, así un mismo cursor vale en ambos.
+"""
+
+import base64
+from datetime import date, time
+from typing import Tuple
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def cursor_turno(fecha: date, hora: time, shift_id: int) -> str:
+    clave = f"{fecha.isoformat()}|{hora.isoformat()}|{shift_id}"
+    return base64.urlsafe_b64encode(clave.encode()).decode().rstrip("=")
+
+
+def leer_cursor_turno(cursor: str) -> Tuple[date, time, int]:
+    """Decodifica un cursor de `cursor_turno`; ValueError si no es válido."""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        fecha, hora, shift_id = base64.urlsafe_b64decode(cursor + relleno).decode().split("|")
+        return date.fromisoformat(fecha), time.fromisoformat(hora), int(shift_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(f"Cursor inválido: {cursor}") from exc
@@ -1,8 +1,18 @@
+import asyncio
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from .routers import employees, shifts, assignments, trainings, employee_trainings, dynamic_shifts
 from .alert_service import router as alert_router
+from .db import engine
+from .change_bus import listener as change_listener
+from .schedule_index import schedule
+from .compression import CompressionMiddleware
+from .metrics import MetricsMiddleware, metrics_response, mark_process_dead
+from .sql_metrics import SQLMetricsMiddleware, instrument_engine
+from .tracing import TracingMiddleware, configure_tracing, shutdown_tracing, trace_engine
+from .profiling import ProfilingMiddleware, router as profiling_router
+from .keyset import NEXT_CURSOR_HEADER
 
 app = FastAPI(title='ms-rrhh')
 
@@ -13,18 +23,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor de paginación (app/keyset.py): sin esto el navegador no lo expone
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-# Middleware para garantizar UTF-8 en todas las respuestas
-class UTF8Middleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        # Asegurar que todas las respuestas JSON tengan charset=utf-8
-        if response.headers.get('content-type', '').startswith('application/json'):
-            response.headers['content-type'] = 'application/json; charset=utf-8'
-        return response
+# Compresión gzip/brotli y ETag con If-None-Match → 304
+app.add_middleware(CompressionMiddleware)
+
+# Métricas por ruta + charset=utf-8 en respuestas JSON (middleware ASGI puro)
+app.add_middleware(MetricsMiddleware)
+
+# Conteo/tiempo de consultas SQL por request (Server-Timing + detección N+1)
+instrument_engine(engine)
+app.add_middleware(SQLMetricsMiddleware)
 
-app.add_middleware(UTF8Middleware)
+# Trazas distribuidas (W3C traceparent, export OTLP/JSON con TRACE_EXPORT)
+configure_tracing("ms-rrhh")
+trace_engine(engine)
+app.add_middleware(TracingMiddleware)
+
+# Profiling bajo demanda (/admin/profiling); sin sesión activa no agrega trabajo
+app.add_middleware(ProfilingMiddleware)
 
 # Include routers
 app.include_router(employees.router, prefix='/employees', tags=['employees'])
@@ -34,6 +53,22 @@ app.include_router(dynamic_shifts.router, prefix='/dynamic-shifts', tags=['dynam
 app.include_router(trainings.router, prefix='/trainings', tags=['trainings'])
 app.include_router(employee_trainings.router, tags=['employee-trainings'])
 app.include_router(alert_router, tags=['delivery-alerts'])
+app.include_router(profiling_router)
+
+
+@app.on_event('startup')
+async def start_change_listener():
+    # Invalidación de caché vía LISTEN/NOTIFY (infra/sql/019_change_notifications.sql)
+    change_listener.start(engine)
+    # Índice de horarios para detectar choques sin consultar tablas
+    asyncio.get_running_loop().run_in_executor(None, schedule.calentar)
+
+
+@app.on_event('shutdown')
+async def stop_change_listener():
+    await change_listener.stop()
+    shutdown_tracing()
+    mark_process_dead()
 
 
 @app.get('/health')
@@ -41,6 +76,11 @@ def health():
     return {'status': 'ok'}
 
 
+@app.get('/metrics')
+def metrics():
+    return metrics_response()
+
+
 @app.get('/')
 def root():
     return {
@@ -55,6 +95,7 @@ def root():
         ],
         'endpoints': [
             '/health',
+            '/metrics',
             '/employees',
             '/shifts',
             '/assignments',
@@ -0,0 +1,399 @@
+"""
+Generador del calendario semanal de turnos fijos (roster)
+
+Llena los cupos sin cubrir de una semana (lunes a domingo) con empleados de
+turnos fijos, respetando restricciones duras:
+
+- horas semanales del contrato (HORAS_SEMANALES por contract_types.nombre;
+  'Por Viaje' y 'Freelance' no entran al calendario fijo).
+- descanso mínimo de DESCANSO_ENTRE_TURNOS entre el fin de un turno y el
+  inicio del siguiente, contando turnos manuales y dinámicos ya asignados.
+- capacitaciones obligatorias (trainings.required) completadas.
+- perfil de turno: los turnos ligados a un perfil (shift_profile_shifts)
+  piden min_coverage empleados de ese perfil; los turnos sin perfil piden
+  uno de cualquier empleado de turnos fijos.
+
+Y minimiza un puntaje (menor es mejor):
+    PENALIZACION_SIN_CUBRIR · cupos sin cubrir
+  + PESO_EQUIDAD · Σ (horas asignadas / horas del contrato)²
+La suma de cuadrados de la utilización castiga repartir la semana en pocos
+empleados: con la misma carga total, es mínima cuando todos quedan parejos.
+
+Solver: solución inicial voraz (primero los cupos con menos candidatos, al
+empleado menos cargado) y luego búsqueda local con recocido simulado
+(reasignar un cupo, intercambiar dos, llenar uno vacío) hasta agotar el
+presupuesto de tiempo. Toda la información se carga con cuatro consultas;
+la búsqueda trabaja solo en memoria.
+"""
+
+import math
+import random
+import time as reloj
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .schedule_index import intervalo_dinamico, intervalo_manual, schedule
+from .weekly_coverage import invalidar_cobertura
+
+# Ley 21.561: 42 horas semanales desde abril de 2026
+HORAS_SEMANALES = {
+    'Tiempo Completo': 42,
+    'Jornada Parcial': 30,
+    'Temporal': 42,
+    'Por Viaje': 0,
+    'Freelance': 0,
+}
+HORAS_SEMANALES_DEFECTO = 42   # empleados sin tipo de contrato
+DESCANSO_ENTRE_TURNOS = 12 * 60
+PENALIZACION_SIN_CUBRIR = 100.0
+PESO_EQUIDAD = 10.0
+PRESUPUESTO_MS = 1500
+MAX_PRESUPUESTO_MS = 10000
+TEMPERATURA_INICIAL = 1.0
+
+
+@dataclass
+class Cupo:
+    dia: date
+    shift: models.Shift
+    inicio: int
+    fin: int
+    candidatos: Tuple[int, ...]
+
+    @property
+    def minutos(self) -> int:
+        return self.fin - self.inicio
+
+
+@dataclass
+class _Empleado:
+    id: int
+    nombre: str
+    max_minutos: int
+    minutos: int = 0
+    # intervalos ocupados (inicio, fin) ordenados
+    ocupados: List[Tuple[int, int]] = field(default_factory=list)
+
+    def utilizacion(self, extra: int = 0) -> float:
+        return (self.minutos + extra) / self.max_minutos
+
+    def puede_tomar(self, cupo: Cupo) -> bool:
+        if self.minutos + cupo.minutos > self.max_minutos:
+            return False
+        i = bisect_left(self.ocupados, (cupo.inicio,))
+        if i and self.ocupados[i - 1][1] + DESCANSO_ENTRE_TURNOS > cupo.inicio:
+            return False
+        if i < len(self.ocupados) and cupo.fin + DESCANSO_ENTRE_TURNOS > self.ocupados[i][0]:
+            return False
+        return True
+
+    def tomar(self, cupo: Cupo) -> None:
+        insort(self.ocupados, (cupo.inicio, cupo.fin))
+        self.minutos += cupo.minutos
+
+    def soltar(self, cupo: Cupo) -> None:
+        self.ocupados.remove((cupo.inicio, cupo.fin))
+        self.minutos -= cupo.minutos
+
+
+@dataclass
+class ResultadoRoster:
+    week_start: date
+    cupos: List[Cupo]
+    asignado: List[Optional[int]]
+    nombres: Dict[int, str]
+    sin_cubrir: int
+    equidad: float
+    iteraciones: int
+    excluidos: List[Tuple[int, str]]
+
+    @property
+    def puntaje(self) -> float:
+        return PENALIZACION_SIN_CUBRIR * self.sin_cubrir + self.equidad
+
+
+def _equidad(emp: _Empleado) -> float:
+    return PESO_EQUIDAD * emp.utilizacion() ** 2
+
+
+class _Busqueda:
+    """Estado mutable de la búsqueda local sobre cupos y empleados."""
+
+    def __init__(self, cupos: List[Cupo], empleados: Dict[int, _Empleado], semilla: int):
+        self.cupos = cupos
+        self.empleados = empleados
+        self.asignado: List[Optional[int]] = [None] * len(cupos)
+        self.rng = random.Random(semilla)
+        self.sin_cubrir = len(cupos)
+        self.equidad = sum(_equidad(e) for e in empleados.values())
+
+    @property
+    def puntaje(self) -> float:
+        return PENALIZACION_SIN_CUBRIR * self.sin_cubrir + self.equidad
+
+    def _poner(self, k: int, emp_id: int) -> None:
+        emp = self.empleados[emp_id]
+        self.equidad -= _equidad(emp)
+        emp.tomar(self.cupos[k])
+        self.equidad += _equidad(emp)
+        self.asignado[k] = emp_id
+        self.sin_cubrir -= 1
+
+    def _sacar(self, k: int) -> None:
+        emp = self.empleados[self.asignado[k]]
+        self.equidad -= _equidad(emp)
+        emp.soltar(self.cupos[k])
+        self.equidad += _equidad(emp)
+        self.asignado[k] = None
+        self.sin_cubrir += 1
+
+    def voraz(self) -> None:
+        orden = sorted(range(len(self.cupos)), key=lambda k: (len(self.cupos[k].candidatos), self.cupos[k].inicio))
+        for k in orden:
+            cupo = self.cupos[k]
+            libres = [self.empleados[e] for e in cupo.candidatos if self.empleados[e].puede_tomar(cupo)]
+            if libres:
+                elegido = min(libres, key=lambda e: (e.utilizacion(cupo.minutos), e.id))
+                self._poner(k, elegido.id)
+
+    def _aceptar(self, delta: float, temperatura: float) -> bool:
+        if delta <= 0:
+            return True
+        return temperatura > 0 and self.rng.random() < math.exp(-delta / temperatura)
+
+    def _llenar(self) -> None:
+        vacios = [k for k, e in enumerate(self.asignado) if e is None and self.cupos[k].candidatos]
+        if not vacios:
+            return
+        k = self.rng.choice(vacios)
+        emp_id = self.rng.choice(self.cupos[k].candidatos)
+        if self.empleados[emp_id].puede_tomar(self.cupos[k]):
+            self._poner(k, emp_id)
+
+    def _reasignar(self, temperatura: float) -> None:
+        k = self.rng.randrange(len(self.cupos))
+        actual, cupo = self.asignado[k], self.cupos[k]
+        if actual is None or len(cupo.candidatos) < 2:
+            return
+        nuevo = self.rng.choice(cupo.candidatos)
+        if nuevo == actual:
+            return
+        antes = self.puntaje
+        self._sacar(k)
+        if self.empleados[nuevo].puede_tomar(cupo):
+            self._poner(k, nuevo)
+            if self._aceptar(self.puntaje - antes, temperatura):
+                return
+            self._sacar(k)
+        self._poner(k, actual)
+
+    def _intercambiar(self, temperatura: float) -> None:
+        k1, k2 = self.rng.randrange(len(self.cupos)), self.rng.randrange(len(self.cupos))
+        a, b = self.asignado[k1], self.asignado[k2]
+        if a is None or b is None or a == b:
+            return
+        c1, c2 = self.cupos[k1], self.cupos[k2]
+        if a not in c2.candidatos or b not in c1.candidatos:
+            return
+        antes = self.puntaje
+        self._sacar(k1)
+        self._sacar(k2)
+        if self.empleados[a].puede_tomar(c2):
+            self._poner(k2, a)
+            if self.empleados[b].puede_tomar(c1):
+                self._poner(k1, b)
+                if self._aceptar(self.puntaje - antes, temperatura):
+                    return
+                self._sacar(k1)
+            self._sacar(k2)
+        self._poner(k1, a)
+        self._poner(k2, b)
+
+    def mejorar(self, presupuesto_ms: int) -> Tuple[List[Optional[int]], int, float, int]:
+        """Recocido simulado hasta agotar el presupuesto; retorna la mejor solución vista."""
+        mejor = (list(self.asignado), self.sin_cubrir, self.equidad)
+        iteraciones = 0
+        if not self.cupos:
+            return mejor + (0,)
+        inicio = reloj.monotonic()
+        limite = presupuesto_ms / 1000
+        while True:
+            transcurrido = reloj.monotonic() - inicio
+            if transcurrido >= limite:
+                break
+            temperatura = TEMPERATURA_INICIAL * (1 - transcurrido / limite)
+            for _ in range(200):
+                r = self.rng.random()
+                if r < 0.2 and self.sin_cubrir:
+                    self._llenar()
+                elif r < 0.6:
+                    self._reasignar(temperatura)
+                else:
+                    self._intercambiar(temperatura)
+            iteraciones += 200
+            if self.puntaje < PENALIZACION_SIN_CUBRIR * mejor[1] + mejor[2] - 1e-9:
+                mejor = (list(self.asignado), self.sin_cubrir, self.equidad)
+        return mejor + (iteraciones,)
+
+
+def _empleados(session: Session, exigir_capacitaciones: bool):
+    """Empleados activos de turnos fijos, con contrato y capacitaciones faltantes."""
+    return session.execute(text("""
+        SELECT e.id, e.nombre, e.role_id, e.shift_profile_id, ct.nombre AS contrato,
+               CASE WHEN :exigir THEN (
+                   SELECT COUNT(*) FROM trainings t
+                   WHERE t.required AND NOT EXISTS (
+                       SELECT 1 FROM employee_trainings et
+                       WHERE et.employee_id = e.id AND et.training_id = t.id
+                         AND et.status = 'COMPLETED')
+               ) ELSE 0 END AS faltantes
+        FROM employees e
+        LEFT JOIN roles r ON r.id = e.role_id
+        LEFT JOIN contract_types ct ON ct.id = e.contract_type_id
+        WHERE e.activo = true AND NOT COALESCE(r.is_dynamic_shifts, false)
+        ORDER BY e.id
+    """), {'exigir': exigir_capacitaciones}).all()
+
+
+def _perfiles_por_turno(session: Session) -> Dict[int, list]:
+    rows = session.execute(text("""
+        SELECT sps.shift_id, sp.id, sp.role_id, COALESCE(sp.min_coverage, 1) AS min_coverage
+        FROM shift_profile_shifts sps
+        JOIN shift_profiles sp ON sp.id = sps.profile_id
+        WHERE COALESCE(sp.auto_assign, true)
+        ORDER BY sps.shift_id, sp.id
+    """))
+    perfiles: Dict[int, list] = {}
+    for r in rows:
+        perfiles.setdefault(r.shift_id, []).append((r.id, r.role_id, r.min_coverage))
+    return perfiles
+
+
+def _ocupados(session: Session, desde: date, hasta: date):
+    """(employee_id, fecha, shift_id | None, inicio, fin) de todo lo asignado en el rango."""
+    manuales = session.execute(text("""
+        SELECT a.employee_id, a.date, a.shift_id, s.start_time, s.end_time
+        FROM shift_assignments a JOIN shifts s ON s.id = a.shift_id
+        WHERE a.date BETWEEN :desde AND :hasta
+    """), {'desde': desde, 'hasta': hasta})
+    for emp, dia, shift_id, start_time, end_time in manuales:
+        yield (emp, dia, shift_id) + intervalo_manual(dia, start_time, end_time)
+    # Sin los espejos de los turnos manuales (016/022 copian cada shift_assignment
+    # a un dynamic_shift sin ruta): ya se contaron arriba y sumarían las horas dos veces.
+    dinamicos = session.execute(text("""
+        SELECT a.employee_id, s.fecha_programada, s.hora_inicio, s.duracion_minutos
+        FROM dynamic_shift_assignments a JOIN dynamic_shifts s ON s.id = a.dynamic_shift_id
+        WHERE a.status != 'cancelado' AND s.fecha_programada BETWEEN :desde AND :hasta
+          AND NOT (s.route_id IS NULL AND EXISTS (
+              SELECT 1 FROM shift_assignments m JOIN shifts ms ON ms.id = m.shift_id
+              WHERE m.employee_id = a.employee_id AND m.date = s.fecha_programada
+                AND ms.start_time = s.hora_inicio
+          ))
+    """), {'desde': desde, 'hasta': hasta})
+    for emp, dia, hora, duracion in dinamicos:
+        yield (emp, dia, None) + intervalo_dinamico(dia, hora, duracion)
+
+
+def generar_roster(
+    session: Session,
+    week_start: date,
+    presupuesto_ms: int = PRESUPUESTO_MS,
+    exigir_capacitaciones: bool = True,
+    semilla: int = 0,
+) -> ResultadoRoster:
+    """Propone asignaciones para los cupos sin cubrir de la semana de `week_start`."""
+    week_end = week_start + timedelta(days=6)
+    shifts = session.query(models.Shift).order_by(models.Shift.start_time, models.Shift.id).all()
+    perfiles = _perfiles_por_turno(session)
+
+    empleados: Dict[int, _Empleado] = {}
+    excluidos: List[Tuple[int, str]] = []
+    perfil_de: Dict[int, Optional[int]] = {}
+    rol_de: Dict[int, Optional[int]] = {}
+    for r in _empleados(session, exigir_capacitaciones):
+        horas = HORAS_SEMANALES.get(r.contrato, HORAS_SEMANALES_DEFECTO) if r.contrato else HORAS_SEMANALES_DEFECTO
+        if horas <= 0:
+            excluidos.append((r.id, f"Contrato {r.contrato} sin horas semanales fijas"))
+        elif r.faltantes:
+            excluidos.append((r.id, f"Le faltan {r.faltantes} capacitaciones obligatorias"))
+        else:
+            empleados[r.id] = _Empleado(r.id, r.nombre, horas * 60)
+            perfil_de[r.id], rol_de[r.id] = r.shift_profile_id, r.role_id
+
+    # Turnos ya asignados: horas de la semana, descansos y cobertura existente.
+    # Se mira un día antes y después para el descanso en los bordes.
+    cubiertos: Dict[Tuple[date, int], List[int]] = {}
+    for emp_id, dia, shift_id, inicio, fin in _ocupados(session, week_start - timedelta(days=1), week_end + timedelta(days=1)):
+        if shift_id is not None and week_start <= dia <= week_end:
+            cubiertos.setdefault((dia, shift_id), []).append(emp_id)
+        emp = empleados.get(emp_id)
+        if emp is None:
+            continue
+        insort(emp.ocupados, (inicio, fin))
+        if week_start <= dia <= week_end:
+            emp.minutos += fin - inicio
+
+    def es_del_perfil(emp_id: int, perfil_id: int, role_id: Optional[int]) -> bool:
+        perfil = perfil_de.get(emp_id)
+        return perfil == perfil_id or (perfil is None and role_id is not None and rol_de.get(emp_id) == role_id)
+
+    cupos: List[Cupo] = []
+    todos = tuple(empleados)
+    for offset in range(7):
+        dia = week_start + timedelta(days=offset)
+        for shift in shifts:
+            inicio, fin = intervalo_manual(dia, shift.start_time, shift.end_time)
+            ya = cubiertos.get((dia, shift.id), [])
+            demanda = [
+                (minimo, tuple(e for e in todos if es_del_perfil(e, perfil_id, role_id)),
+                 sum(1 for e in ya if es_del_perfil(e, perfil_id, role_id)))
+                for perfil_id, role_id, minimo in perfiles.get(shift.id, ())
+            ] or [(1, todos, len(ya))]
+            for minimo, candidatos, existentes in demanda:
+                for _ in range(max(0, minimo - existentes)):
+                    cupos.append(Cupo(dia, shift, inicio, fin, candidatos))
+
+    busqueda = _Busqueda(cupos, empleados, semilla)
+    busqueda.voraz()
+    asignado, sin_cubrir, equidad, iteraciones = busqueda.mejorar(presupuesto_ms)
+    return ResultadoRoster(
+        week_start=week_start,
+        cupos=cupos,
+        asignado=asignado,
+        nombres={e.id: e.nombre for e in empleados.values()},
+        sin_cubrir=sin_cubrir,
+        equidad=round(equidad, 4),
+        iteraciones=iteraciones,
+        excluidos=excluidos,
+    )
+
+
+def guardar_roster(session: Session, resultado: ResultadoRoster) -> int:
+    """Inserta las asignaciones propuestas en una sola sentencia; retorna cuántas se crearon."""
+    filas = [
+        {'employee_id': emp_id, 'shift_id': cupo.shift.id, 'date': cupo.dia, 'notes': 'Generado por roster semanal'}
+        for cupo, emp_id in zip(resultado.cupos, resultado.asignado) if emp_id is not None
+    ]
+    if not filas:
+        return 0
+    stmt = insert(models.ShiftAssignment).values(filas).on_conflict_do_nothing(
+        index_elements=['employee_id', 'shift_id', 'date']
+    ).returning(models.ShiftAssignment.id, models.ShiftAssignment.employee_id,
+                models.ShiftAssignment.shift_id, models.ShiftAssignment.date)
+    creadas = session.execute(stmt).all()
+    session.commit()
+
+    shifts = {cupo.shift.id: cupo.shift for cupo in resultado.cupos}
+    for sa_id, emp_id, shift_id, dia in creadas:
+        schedule.registrar_manual(
+            models.ShiftAssignment(id=sa_id, employee_id=emp_id, shift_id=shift_id, date=dia), shifts[shift_id]
+        )
+    invalidar_cobertura()
+    return len(creadas)
@@ -1,6 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from .. import schemas, models, db
+from ..schedule_index import intervalo_manual, schedule
+from ..bulk_assignments import ACTUALIZADA, CREADA, ERROR, MAX_FILAS_LOTE, importar, leer_filas
+from ..roster import MAX_PRESUPUESTO_MS, PRESUPUESTO_MS, generar_roster, guardar_roster
+from ..weekly_coverage import cobertura_semanal, inicio_semana, invalidar_cobertura
 from sqlalchemy.orm import Session
 from datetime import date, timedelta
 
@@ -16,19 +21,56 @@ def get_db():
 
 @router.post('/', response_model=schemas.AssignmentOut)
 def create_assignment(payload: schemas.AssignmentCreate, session: Session = Depends(get_db)):
-    # Simple overlap check: ensure same employee/date doesn't already have this shift
-    exists = session.query(models.ShiftAssignment).filter(
-        models.ShiftAssignment.employee_id == payload.employee_id,
-        models.ShiftAssignment.date == payload.date,
-    ).first()
-    if exists:
-        raise HTTPException(status_code=409, detail='Employee already has an assignment for this date')
+    shift = session.get(models.Shift, payload.shift_id)
+    if not shift:
+        raise HTTPException(status_code=404, detail='Shift not found')
+    # Overlap check against manual and dynamic shifts (in-memory index)
+    inicio, fin = intervalo_manual(payload.date, shift.start_time, shift.end_time)
+    conflicto = schedule.conflicto(session, payload.employee_id, inicio, fin)
+    if conflicto:
+        raise HTTPException(status_code=409, detail=conflicto)
     a = models.ShiftAssignment(**payload.dict())
     session.add(a)
     session.commit()
     session.refresh(a)
+    schedule.registrar_manual(a, shift)
+    invalidar_cobertura()
     return a
 
+@router.post('/bulk', response_model=schemas.BulkAssignResponse)
+async def bulk_assignments(request: Request, todo_o_nada: bool = False, session: Session = Depends(get_db)):
+    """
+    Importa un lote de asignaciones (JSON o CSV con encabezado
+    employee_id,shift_id,date,notes).
+
+    Valida todo en memoria contra el índice de horarios y escribe las filas
+    válidas con un único INSERT ... ON CONFLICT en una transacción. Retorna
+    el estado de cada fila; con todo_o_nada=true no escribe nada si alguna
+    fila tiene error.
+    """
+    try:
+        crudas = leer_filas(await request.body(), request.headers.get('content-type', ''))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if len(crudas) > MAX_FILAS_LOTE:
+        raise HTTPException(status_code=400, detail=f'El lote no puede superar {MAX_FILAS_LOTE} filas')
+
+    filas = await run_in_threadpool(importar, session, crudas, todo_o_nada)
+    return schemas.BulkAssignResponse(
+        total=len(filas),
+        creadas=sum(1 for f in filas if f.status == CREADA),
+        actualizadas=sum(1 for f in filas if f.status == ACTUALIZADA),
+        errores=sum(1 for f in filas if f.status == ERROR),
+        filas=[
+            schemas.BulkAssignmentRow(
+                fila=f.fila, status=f.status, id=f.id, employee_id=f.employee_id,
+                shift_id=f.shift_id, date=f.date, error=f.error,
+            )
+            for f in filas
+        ],
+    )
+
+
 @router.get('/', response_model=List[schemas.AssignmentOut])
 def list_assignments(employee_id: Optional[int] = None, _from: Optional[date] = None, to: Optional[date] = None, session: Session = Depends(get_db)):
     q = session.query(models.ShiftAssignment)
@@ -57,84 +99,68 @@ def get_weekly_suggestions(session: Session = Depends(get_db)):
         "week_end": "2025-11-02"
     }
     """
-    # Calculate week boundaries (Monday-Sunday)
-    today = date.today()
-    monday = today - timedelta(days=today.weekday())
-    sunday = monday + timedelta(days=6)
-    
-    # Get all employees
-    all_employees = session.query(models.Employee).filter(models.Employee.activo == True).all()
-    
-    # Get all shifts
-    all_shifts = session.query(models.Shift).all()
-    
-    # Get all assignments for this week
-    week_assignments = session.query(models.ShiftAssignment).filter(
-        models.ShiftAssignment.date >= monday,
-        models.ShiftAssignment.date <= sunday
-    ).all()
-    
-    # Find employees with no assignments this week
-    assigned_employee_ids = {a.employee_id for a in week_assignments}
-    unassigned_employees = []
-    
-    for emp in all_employees:
-        if emp.id not in assigned_employee_ids:
-            unassigned_employees.append({
-                "id": emp.id,
-                "nombre": emp.nombre,
-                "email": emp.email,
-                "assignments_this_week": 0
-            })
-        else:
-            # Count assignments per employee
-            emp_count = len([a for a in week_assignments if a.employee_id == emp.id])
-            if emp_count < 3:  # Less than 3 shifts (ideally one per shift type)
-                unassigned_employees.append({
-                    "id": emp.id,
-                    "nombre": emp.nombre,
-                    "email": emp.email,
-                    "assignments_this_week": emp_count
-                })
-    
-    # Find uncovered shifts (those with NO employees assigned)
-    uncovered_shifts = []
-    WEEKDAYS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-    
-    for day_offset in range(7):
-        current_date = monday + timedelta(days=day_offset)
-        
-        for shift in all_shifts:
-            # Count how many employees are assigned this shift/date
-            assigned_count = len([
-                a for a in week_assignments
-                if a.date == current_date and a.shift_id == shift.id
-            ])
-            
-            # Only flag if NO employees are assigned
-            if assigned_count == 0:
-                uncovered_shifts.append({
-                    "date": current_date.isoformat(),
-                    "weekday": WEEKDAYS[day_offset],
-                    "shift_tipo": shift.tipo,
-                    "shift_id": shift.id,
-                    "start_time": shift.start_time,
-                    "end_time": shift.end_time,
-                    "assigned_count": assigned_count,
-                    "has_coverage": False
-                })
-    
+    # Coverage matrix + per-employee counts from one grouped query, cached per ISO week
+    cobertura = cobertura_semanal(session)
+
+    # Employees with fewer than 3 shifts this week (ideally one per shift type)
+    unassigned_employees = [
+        {"id": emp_id, "nombre": nombre, "email": email, "assignments_this_week": count}
+        for emp_id, nombre, email, count in cobertura.empleados
+        if count < 3
+    ]
+
     return {
         "unassigned_employees": unassigned_employees,
-        "uncovered_shifts": uncovered_shifts,
-        "week_start": monday.isoformat(),
-        "week_end": sunday.isoformat(),
-        "total_employees": len(all_employees),
-        "total_shifts": len(all_shifts),
-        "total_assignments_this_week": len(week_assignments)
+        "uncovered_shifts": cobertura.turnos_sin_cubrir(),
+        "week_start": cobertura.week_start.isoformat(),
+        "week_end": cobertura.week_end.isoformat(),
+        "total_employees": len(cobertura.empleados),
+        "total_shifts": len(cobertura.shifts),
+        "total_assignments_this_week": cobertura.total_asignaciones
     }
 
 
+@router.post('/roster', response_model=schemas.RosterResponse)
+def generate_roster(
+    week_start: Optional[date] = None,
+    dry_run: bool = False,
+    presupuesto_ms: int = PRESUPUESTO_MS,
+    exigir_capacitaciones: bool = True,
+    session: Session = Depends(get_db)
+):
+    """
+    Genera el calendario de la semana que contiene `week_start` (por defecto
+    la actual): llena los cupos sin cubrir respetando horas de contrato,
+    descanso entre turnos y capacitaciones, repartiendo la carga de forma
+    pareja. Con dry_run=true solo retorna la propuesta y su puntaje.
+    """
+    if not 0 < presupuesto_ms <= MAX_PRESUPUESTO_MS:
+        raise HTTPException(status_code=400, detail=f'presupuesto_ms debe estar entre 1 y {MAX_PRESUPUESTO_MS}')
+    inicio = inicio_semana(week_start or date.today())
+    resultado = generar_roster(session, inicio, presupuesto_ms, exigir_capacitaciones)
+    creadas = 0 if dry_run else guardar_roster(session, resultado)
+
+    asignaciones, sin_cubrir = [], []
+    for cupo, emp_id in zip(resultado.cupos, resultado.asignado):
+        item = schemas.RosterItem(
+            date=cupo.dia, shift_id=cupo.shift.id, shift_tipo=cupo.shift.tipo,
+            employee_id=emp_id, nombre=resultado.nombres.get(emp_id),
+        )
+        (sin_cubrir if emp_id is None else asignaciones).append(item)
+    return schemas.RosterResponse(
+        dry_run=dry_run,
+        week_start=inicio,
+        week_end=inicio + timedelta(days=6),
+        asignaciones=asignaciones,
+        sin_cubrir=sin_cubrir,
+        puntaje=round(resultado.puntaje, 4),
+        equidad=resultado.equidad,
+        creadas=creadas,
+        iteraciones=resultado.iteraciones,
+        excluidos=[schemas.RosterExcluido(employee_id=e, razon=r) for e, r in resultado.excluidos],
+    )
+
+
 @router.get('/{id}', response_model=schemas.AssignmentOut)
 def get_assignment(id: int, session: Session = Depends(get_db)):
     a = session.get(models.ShiftAssignment, id)
@@ -150,5 +176,7 @@ def delete_assignment(id: int, session: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail='Assignment not found')
     session.delete(a)
     session.commit()
+    schedule.quitar_manual(id)
+    invalidar_cobertura()
     return None
 
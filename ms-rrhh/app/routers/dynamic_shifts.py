@@ -2,11 +2,20 @@ from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Optional
 from datetime import date, timedelta, time, datetime
 from .. import schemas, models, db
+from ..fast_json import json_array
+from ..eligibility import evaluar_conductores
+from ..driving_rules import timelines
+from ..schedule_index import schedule
+from ..batch_assign import MAX_DIAS_LOTE, asignar_lote
+from ..keyset import NEXT_CURSOR_HEADER, cursor_turno, leer_cursor_turno
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
 
 router = APIRouter()
 
+PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
 
 def get_db():
     session = db.SessionLocal()
@@ -20,33 +29,15 @@ def get_db():
 # HELPER FUNCTIONS
 # ============================================
 
-def calcular_minutos_conduccion_hoy(employee_id: int, fecha: date, session: Session) -> int:
-    """
-    Calcula los minutos de conducción acumulados de un conductor en un día específico.
-    """
-    logs = session.query(models.DrivingLog).filter(
-        and_(
-            models.DrivingLog.employee_id == employee_id,
-            models.DrivingLog.fecha == fecha
-        )
-    ).all()
-    total = 0
-    for log in logs:
-        total += log.minutos_conduccion
-    return total
-
-
 def puede_asignarse_conductor(
     employee_id: int,
-    fecha_turno: date,
-    duracion_minutos: int,
-    conduccion_continua_max: int,
+    dynamic_shift: models.DynamicShift,
     session: Session
 ) -> tuple[bool, Optional[str]]:
     """
     Valida si un conductor puede ser asignado a un turno según reglas de conducción.
     
-    Reglas:
+    Reglas (app/driving_rules.py):
     1. No puede conducir más de 5 horas (300 min) continuas
     2. Después de 5 horas debe descansar 2 horas (120 min)
     3. No puede tener conflictos de horario
@@ -54,52 +45,8 @@ def puede_asignarse_conductor(
     Retorna: (puede_asignarse, razon_si_no)
     """
     
-    # Verificar que sea conductor
-    empleado = session.query(models.Employee).filter(
-        models.Employee.id == employee_id
-    ).first()
-    
-    if empleado is None:
-        return False, "Empleado no encontrado"
-    
-    # Obtener rol del empleado
-    rol = session.query(models.Role).filter(
-        models.Role.id == empleado.role_id
-    ).first()
-    
-    if rol is None or rol.nombre != 'Conductor':
-        return False, "No es un conductor"
-    
-    # Revisar conducción ya realizada hoy
-    minutos_conduccion_hoy = calcular_minutos_conduccion_hoy(employee_id, fecha_turno, session)
-    
-    # Si ya tiene 5 horas, necesita 2 horas de descanso
-    if minutos_conduccion_hoy >= conduccion_continua_max:
-        # Buscar si tiene asignaciones después de hoy
-        proximas_asignaciones = session.query(models.DynamicShiftAssignment).join(
-            models.DynamicShift
-        ).filter(
-            and_(
-                models.DynamicShiftAssignment.employee_id == employee_id,
-                models.DynamicShift.fecha_programada == fecha_turno,
-                models.DynamicShiftAssignment.status != 'cancelado'
-            )
-        ).all()
-        
-        if len(proximas_asignaciones) > 0:
-            # Hay conflicto: necesita descanso
-            return False, "Ya alcanzó 5 horas de conducción. Requiere 2 horas de descanso."
-    
-    # Si va a exceder 5 horas con este turno
-    if minutos_conduccion_hoy + duracion_minutos > conduccion_continua_max:
-        # Esto está permitido, pero el sistema debe intercalar un descanso automático
-        # El duracion_minutos ya debería incluir el descanso si es necesario
-        pass
-    
-    # Verificar que no tenga otro turno en el mismo horario
-    # (Esta validación es simplificada; en producción sería más compleja)
-    
-    return True, None
+    elegibilidad = evaluar_conductores(session, dynamic_shift, employee_ids=[employee_id])[0]
+    return elegibilidad.puede_asignarse, elegibilidad.razon_no_disponible
 
 
 # ============================================
@@ -137,10 +84,12 @@ def create_dynamic_shift_from_route(
 @router.get('/available-drivers/{dynamic_shift_id}', response_model=List[schemas.AvailableDriverResponse])
 def get_available_drivers(
     dynamic_shift_id: int,
+    employee_id: Optional[int] = None,
     session: Session = Depends(get_db)
 ):
     """
     Obtener lista de conductores disponibles para un turno dinámico específico.
+    Con `employee_id` evalúa solo ese empleado (lo usa el auto-assign del gateway).
     
     Valida según:
     - Rol: debe ser Conductor
@@ -157,43 +106,22 @@ def get_available_drivers(
     if not dynamic_shift:
         raise HTTPException(status_code=404, detail='Turno dinámico no encontrado')
     
-    # Obtener todos los conductores activos
-    conductores = session.query(models.Employee).filter(
-        and_(
-            models.Employee.activo == True,
-            models.Employee.role_id == (
-                session.query(models.Role.id).filter(
-                    models.Role.nombre == 'Conductor'
-                ).scalar()
-            )
+    # Todos los conductores activos evaluados en bloque contra sus líneas de tiempo
+    resultado = [
+        schemas.AvailableDriverResponse(
+            employee_id=e.employee_id,
+            nombre=e.nombre,
+            email=e.email,
+            horas_conduccion_hoy=e.minutos_conduccion_hoy / 60,
+            puede_asignarse=e.puede_asignarse,
+            razon_no_disponible=e.razon_no_disponible,
+            racha_continua_minutos=e.racha_continua_minutos,
+            ultimo_descanso_at=e.ultimo_descanso_at
         )
-    ).all()
-    
-    resultado = []
-    
-    for conductor in conductores:
-        puede_asignarse, razon = puede_asignarse_conductor(
-            employee_id=conductor.id,
-            fecha_turno=dynamic_shift.fecha_programada,
-            duracion_minutos=dynamic_shift.duracion_minutos,
-            conduccion_continua_max=dynamic_shift.conduccion_continua_minutos,
-            session=session
+        for e in evaluar_conductores(
+            session, dynamic_shift, employee_ids=None if employee_id is None else [employee_id]
         )
-        
-        horas_conduccion = calcular_minutos_conduccion_hoy(
-            conductor.id,
-            dynamic_shift.fecha_programada,
-            session
-        ) / 60
-        
-        resultado.append(schemas.AvailableDriverResponse(
-            employee_id=conductor.id,
-            nombre=conductor.nombre,
-            email=conductor.email or '',
-            horas_conduccion_hoy=horas_conduccion,
-            puede_asignarse=puede_asignarse,
-            razon_no_disponible=razon
-        ))
+    ]
     
     # Ordenar: primero disponibles, luego no disponibles
     resultado.sort(key=lambda x: (not x.puede_asignarse, x.horas_conduccion_hoy))
@@ -232,9 +160,7 @@ def auto_assign_driver(
     # Validar disponibilidad
     puede_asignarse, razon = puede_asignarse_conductor(
         employee_id=employee_id,
-        fecha_turno=dynamic_shift.fecha_programada,
-        duracion_minutos=dynamic_shift.duracion_minutos,
-        conduccion_continua_max=dynamic_shift.conduccion_continua_minutos,
+        dynamic_shift=dynamic_shift,
         session=session
     )
     
@@ -256,6 +182,8 @@ def auto_assign_driver(
     
     session.commit()
     session.refresh(dynamic_shift)
+    timelines.invalidar_conductor(employee_id)
+    schedule.registrar_dinamico(assignment, dynamic_shift)
     
     # Cargar assignments para la respuesta
     dynamic_shift.assignments = session.query(models.DynamicShiftAssignment).filter(
@@ -265,29 +193,116 @@ def auto_assign_driver(
     return dynamic_shift
 
 
+@router.post('/batch-auto-assign', response_model=schemas.BatchAssignResponse)
+def batch_auto_assign(
+    fecha_desde: date,
+    fecha_hasta: date,
+    dry_run: bool = False,
+    session: Session = Depends(get_db)
+):
+    """
+    Auto-asignar en lote todos los turnos pendientes del rango.
+    
+    Resuelve una asignación de costo mínimo (horas del día, descanso y
+    cercanía) sobre los conductores elegibles y guarda todo en una sola
+    transacción. Con dry_run=true solo retorna la propuesta.
+    """
+    
+    if fecha_hasta < fecha_desde:
+        raise HTTPException(status_code=400, detail='fecha_hasta debe ser posterior a fecha_desde')
+    if (fecha_hasta - fecha_desde).days + 1 > MAX_DIAS_LOTE:
+        raise HTTPException(status_code=400, detail=f'El rango no puede superar {MAX_DIAS_LOTE} días')
+    
+    resultado = asignar_lote(session, fecha_desde, fecha_hasta, dry_run=dry_run)
+    
+    return schemas.BatchAssignResponse(
+        dry_run=dry_run,
+        asignaciones=[
+            schemas.BatchAssignmentItem(dynamic_shift_id=turno_id, employee_id=emp_id, costo=c)
+            for turno_id, emp_id, c in resultado.asignaciones
+        ],
+        sin_asignar=resultado.sin_asignar,
+        rondas=resultado.rondas
+    )
+
+
 @router.get('/', response_model=List[schemas.DynamicShiftOut])
 def list_dynamic_shifts(
     fecha_desde: Optional[date] = None,
     fecha_hasta: Optional[date] = None,
     status: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     session: Session = Depends(get_db)
 ):
     """
     Listar turnos dinámicos con filtros opcionales.
+    
+    Sin limit ni cursor devuelve todo el rango en orden cronológico, como
+    siempre. Con limit o cursor se pagina por keyset (fecha, hora, id
+    descendente): si hay más resultados, el header X-Next-Cursor trae el
+    cursor de la página siguiente.
     """
     
-    q = session.query(models.DynamicShift)
+    paginado = limit is not None or cursor is not None
+    if not paginado:
+        return _listar_sin_paginar(session, fecha_desde, fecha_hasta, status)
+    
+    if limit is None:
+        limit = PAGE_SIZE
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f'limit debe estar entre 1 y {MAX_PAGE_SIZE}')
+    try:
+        despues = leer_cursor_turno(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    DS = models.DynamicShift
+    q = _columnas_listado(session)
     
     if fecha_desde:
-        q = q.filter(models.DynamicShift.fecha_programada >= fecha_desde)
+        q = q.filter(DS.fecha_programada >= fecha_desde)
     
     if fecha_hasta:
-        q = q.filter(models.DynamicShift.fecha_programada <= fecha_hasta)
+        q = q.filter(DS.fecha_programada <= fecha_hasta)
     
     if status:
-        q = q.filter(models.DynamicShift.status == status)
+        q = q.filter(DS.status == status)
     
-    return q.order_by(models.DynamicShift.fecha_programada).all()
+    if despues:
+        q = q.filter(tuple_(DS.fecha_programada, DS.hora_inicio, DS.id) < despues)
+    
+    # Mismo orden que el gateway (más recientes primero): los cursores son intercambiables
+    rows = q.order_by(DS.fecha_programada.desc(), DS.hora_inicio.desc(), DS.id.desc()).limit(limit + 1).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = cursor_turno(rows[-1].fecha_programada, rows[-1].hora_inicio, rows[-1].id)
+    
+    # Filas ya tipadas por la BD: se serializan sin revalidar contra DynamicShiftOut
+    return json_array([row._asdict() for row in rows], headers=headers)
+
+
+def _columnas_listado(session: Session):
+    DS = models.DynamicShift
+    return session.query(
+        DS.id, DS.route_id, DS.fecha_programada, DS.hora_inicio, DS.duracion_minutos,
+        DS.conduccion_continua_minutos, DS.status, DS.created_at, DS.assigned_at, DS.completed_at,
+    )
+
+
+def _listar_sin_paginar(session: Session, fecha_desde, fecha_hasta, status):
+    """Listado completo en orden ascendente (comportamiento original del endpoint)."""
+    DS = models.DynamicShift
+    q = _columnas_listado(session)
+    if fecha_desde:
+        q = q.filter(DS.fecha_programada >= fecha_desde)
+    if fecha_hasta:
+        q = q.filter(DS.fecha_programada <= fecha_hasta)
+    if status:
+        q = q.filter(DS.status == status)
+    rows = q.order_by(DS.fecha_programada, DS.hora_inicio, DS.id).all()
+    return json_array([row._asdict() for row in rows])
 
 
 @router.get('/{id}', response_model=schemas.DynamicShiftWithAssignments)
@@ -359,6 +374,8 @@ def unassign_driver(
     
     session.commit()
     session.refresh(dynamic_shift)
+    timelines.invalidar_turno(dynamic_shift_id)
+    schedule.invalidar_turno_dinamico(dynamic_shift_id)
     
     # Cargar assignments para la respuesta (deberían estar vacías)
     assignments = session.query(models.DynamicShiftAssignment).filter(
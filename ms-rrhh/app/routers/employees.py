@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from .. import schemas, models, db
+from ..change_bus import cache
 from sqlalchemy.orm import Session
 
 router = APIRouter()
@@ -23,7 +24,11 @@ def create_employee(payload: schemas.EmployeeCreate, session: Session = Depends(
 
 @router.get('/', response_model=List[schemas.EmployeeOut])
 def list_employees(session: Session = Depends(get_db)):
-    return session.query(models.Employee).all()
+    return cache.get_or_load(
+        ('rrhh', 'employees'),
+        lambda: [schemas.EmployeeOut.from_orm(e) for e in session.query(models.Employee).all()],
+        tables=['employees'],
+    )
 
 @router.get('/{id}', response_model=schemas.EmployeeOut)
 def get_employee(id: int, session: Session = Depends(get_db)):
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 from .. import schemas, models, db
+from ..change_bus import cache
 from sqlalchemy.orm import Session
 
 router = APIRouter()
@@ -17,7 +18,11 @@ def get_db():
 @router.get('/', response_model=List[schemas.ShiftOut])
 def list_shifts(session: Session = Depends(get_db)):
     """Get all predefined shifts. Shifts are not user-configurable for a logistics company."""
-    return session.query(models.Shift).all()
+    return cache.get_or_load(
+        ('rrhh', 'shifts'),
+        lambda: [schemas.ShiftOut.from_orm(s) for s in session.query(models.Shift).all()],
+        tables=['shifts'],
+    )
 
 
 @router.get('/{id}', response_model=schemas.ShiftOut)
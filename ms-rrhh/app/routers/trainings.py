@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from .. import schemas, models, db
+from ..change_bus import cache
 
 router = APIRouter()
 
@@ -25,8 +26,11 @@ def create_training(payload: schemas.TrainingCreate, session: Session = Depends(
 @router.get("", response_model=list[schemas.TrainingOut])
 def list_trainings(session: Session = Depends(get_db)):
     """List all trainings"""
-    trainings = session.query(models.Training).all()
-    return trainings
+    return cache.get_or_load(
+        ('rrhh', 'trainings'),
+        lambda: [schemas.TrainingOut.from_orm(t) for t in session.query(models.Training).all()],
+        tables=['trainings'],
+    )
 
 @router.get("/{training_id}", response_model=schemas.TrainingOut)
 def get_training(training_id: int, session: Session = Depends(get_db)):
@@ -0,0 +1,292 @@
+"""
+Índice en memoria de horarios por empleado (detección de choques)
+
+Cada empleado tiene un `IntervalIndex` con todos sus turnos ocupados:
+
+- turnos manuales: shift_assignments + shifts.start_time/end_time (los
+  turnos de noche con end_time <= start_time terminan al día siguiente).
+- turnos dinámicos: dynamic_shift_assignments vigentes + hora_inicio y
+  duracion_minutos del dynamic_shift.
+
+El índice guarda los intervalos ordenados por inicio y, para cada posición,
+el máximo fin del prefijo. Hay choque con [inicio, fin) si algún intervalo
+que empieza antes de `fin` termina después de `inicio`: una búsqueda
+binaria y una lectura del prefijo, O(log n), sin recorrer tablas.
+
+Se calienta al iniciar el servicio y se mantiene al día con las escrituras
+de los endpoints y con las notificaciones de
+infra/sql/019_change_notifications.sql (escrituras del gateway o de
+triggers). Sin listener conectado, antes de cada consulta se recargan solo
+las filas de los empleados consultados (consultas por índice).
+"""
+
+import logging
+import threading
+from bisect import bisect_left, insort
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import db, models
+from .change_bus import listener
+from .driving_rules import MINUTOS_DIA, minuto_absoluto
+
+logger = logging.getLogger(__name__)
+
+MANUAL = 'manual'
+DINAMICO = 'dinamico'
+
+Clave = Tuple[str, int]
+
+_TABLAS = ('shift_assignments', 'shifts', 'dynamic_shift_assignments', 'dynamic_shifts')
+
+
+def intervalo_manual(dia: date, start_time: time, end_time: time) -> Tuple[int, int]:
+    inicio = minuto_absoluto(dia, start_time)
+    fin = minuto_absoluto(dia, end_time)
+    if fin <= inicio:
+        fin += MINUTOS_DIA  # turno de noche
+    return inicio, fin
+
+
+def intervalo_dinamico(dia: date, hora_inicio: time, duracion_minutos: int) -> Tuple[int, int]:
+    inicio = minuto_absoluto(dia, hora_inicio)
+    if duracion_minutos <= 0:
+        # Turnos de noche sincronizados desde el calendario (016) quedan con
+        # end_time - start_time negativo
+        duracion_minutos += MINUTOS_DIA
+    return inicio, inicio + duracion_minutos
+
+
+def _formato(minuto: int) -> str:
+    instante = datetime.fromordinal(minuto // MINUTOS_DIA) + timedelta(minutes=minuto % MINUTOS_DIA)
+    return instante.strftime('%Y-%m-%d %H:%M')
+
+
+class IntervalIndex:
+    """Intervalos ordenados por inicio con máximo fin acumulado."""
+
+    def __init__(self):
+        self._items: List[Tuple[int, int, Clave]] = []
+        self._max_fin: List[int] = []
+        self._arg_max: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def claves(self) -> List[Clave]:
+        return [item[2] for item in self._items]
+
+    def _recalcular_desde(self, pos: int) -> None:
+        del self._max_fin[pos:]
+        del self._arg_max[pos:]
+        for i in range(pos, len(self._items)):
+            fin = self._items[i][1]
+            if i and self._max_fin[i - 1] >= fin:
+                self._max_fin.append(self._max_fin[i - 1])
+                self._arg_max.append(self._arg_max[i - 1])
+            else:
+                self._max_fin.append(fin)
+                self._arg_max.append(i)
+
+    def agregar(self, inicio: int, fin: int, clave: Clave) -> None:
+        item = (inicio, fin, clave)
+        insort(self._items, item)
+        self._recalcular_desde(bisect_left(self._items, item))
+
+    def quitar(self, inicio: int, fin: int, clave: Clave) -> None:
+        item = (inicio, fin, clave)
+        i = bisect_left(self._items, item)
+        if i < len(self._items) and self._items[i] == item:
+            del self._items[i]
+            self._recalcular_desde(i)
+
+    def choque(self, inicio: int, fin: int) -> Optional[Tuple[int, int, Clave]]:
+        """Algún intervalo que se solapa con [inicio, fin), o None."""
+        k = bisect_left(self._items, (fin,))
+        if k and self._max_fin[k - 1] > inicio:
+            return self._items[self._arg_max[k - 1]]
+        return None
+
+
+class ScheduleIndex:
+    """Índices por empleado de turnos manuales y dinámicos."""
+
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock()
+        self._listo = False
+        self._por_empleado: Dict[int, IntervalIndex] = {}
+        # clave -> (empleado, inicio, fin, etiqueta)
+        self._claves: Dict[Clave, Tuple[int, int, int, str]] = {}
+        self._por_turno_dinamico: Dict[int, Set[Clave]] = {}
+        self._pendientes: Dict[str, Set[int]] = {t: set() for t in _TABLAS}
+
+    # ---- notificaciones -------------------------------------------------
+
+    def handle_notification(self, change: dict) -> None:
+        table = change.get('table')
+        if table not in _TABLAS:
+            return
+        with self._lock:
+            if change.get('id') is None:
+                self._listo = False
+            else:
+                self._pendientes[table].add(int(change['id']))
+
+    def set_active(self, active: bool) -> None:
+        with self._lock:
+            self.active = active
+            # Lo escrito mientras no había listener no llegó como notificación
+            self._listo = False
+
+    # ---- mantenimiento --------------------------------------------------
+
+    def _agregar(self, emp: int, clave: Clave, inicio: int, fin: int, etiqueta: str,
+                 turno_dinamico: Optional[int] = None) -> None:
+        self._quitar(clave)
+        self._por_empleado.setdefault(emp, IntervalIndex()).agregar(inicio, fin, clave)
+        self._claves[clave] = (emp, inicio, fin, etiqueta)
+        if turno_dinamico is not None:
+            self._por_turno_dinamico.setdefault(turno_dinamico, set()).add(clave)
+
+    def _quitar(self, clave: Clave) -> None:
+        previo = self._claves.pop(clave, None)
+        if previo is not None:
+            emp, inicio, fin, _ = previo
+            self._por_empleado[emp].quitar(inicio, fin, clave)
+
+    def _manuales(self, session: Session):
+        return session.query(
+            models.ShiftAssignment.id, models.ShiftAssignment.employee_id, models.ShiftAssignment.date,
+            models.Shift.tipo, models.Shift.start_time, models.Shift.end_time,
+        ).join(models.Shift, models.Shift.id == models.ShiftAssignment.shift_id)
+
+    def _dinamicos(self, session: Session):
+        DSA, DS = models.DynamicShiftAssignment, models.DynamicShift
+        return session.query(
+            DSA.id, DSA.employee_id, DS.id, DS.fecha_programada, DS.hora_inicio, DS.duracion_minutos,
+        ).join(DS, DS.id == DSA.dynamic_shift_id).filter(DSA.status != 'cancelado')
+
+    def _cargar(self, manuales, dinamicos) -> None:
+        for sa_id, emp, dia, tipo, start_time, end_time in manuales:
+            inicio, fin = intervalo_manual(dia, start_time, end_time)
+            self._agregar(emp, (MANUAL, sa_id), inicio, fin, f"turno {tipo} {_formato(inicio)}")
+        for dsa_id, emp, ds_id, dia, hora, duracion in dinamicos:
+            inicio, fin = intervalo_dinamico(dia, hora, duracion)
+            self._agregar(emp, (DINAMICO, dsa_id), inicio, fin, f"turno dinámico #{ds_id} {_formato(inicio)}", ds_id)
+
+    def _calentar(self, session: Session) -> None:
+        self._por_empleado.clear()
+        self._claves.clear()
+        self._por_turno_dinamico.clear()
+        for ids in self._pendientes.values():
+            ids.clear()
+        self._cargar(self._manuales(session), self._dinamicos(session))
+        self._listo = True
+
+    def _recargar_empleados(self, session: Session, empleados: Set[int]) -> None:
+        for emp in empleados:
+            indice = self._por_empleado.get(emp)
+            for clave in (indice.claves() if indice is not None else ()):
+                self._quitar(clave)
+        self._cargar(
+            self._manuales(session).filter(models.ShiftAssignment.employee_id.in_(empleados)),
+            self._dinamicos(session).filter(models.DynamicShiftAssignment.employee_id.in_(empleados)),
+        )
+
+    def _aplicar_pendientes(self, session: Session) -> None:
+        manuales = self._pendientes['shift_assignments']
+        turnos_manuales = self._pendientes['shifts']
+        dinamicos = self._pendientes['dynamic_shift_assignments']
+        turnos_dinamicos = self._pendientes['dynamic_shifts']
+        if not (manuales or turnos_manuales or dinamicos or turnos_dinamicos):
+            return
+
+        SA, DSA = models.ShiftAssignment, models.DynamicShiftAssignment
+        # Borrados/cancelaciones: se quitan y se vuelven a cargar si siguen vigentes
+        for sa_id in manuales:
+            self._quitar((MANUAL, sa_id))
+        for dsa_id in dinamicos:
+            self._quitar((DINAMICO, dsa_id))
+        for ds_id in turnos_dinamicos:
+            for clave in self._por_turno_dinamico.pop(ds_id, ()):
+                self._quitar(clave)
+        if manuales or turnos_manuales:
+            q = self._manuales(session)
+            q = q.filter(SA.id.in_(manuales) | SA.shift_id.in_(turnos_manuales))
+            self._cargar(q, ())
+        if dinamicos or turnos_dinamicos:
+            q = self._dinamicos(session)
+            q = q.filter(DSA.id.in_(dinamicos) | DSA.dynamic_shift_id.in_(turnos_dinamicos))
+            self._cargar((), q)
+        for ids in self._pendientes.values():
+            ids.clear()
+
+    def calentar(self) -> None:
+        """Carga completa (al iniciar el servicio)."""
+        session = db.SessionLocal()
+        try:
+            with self._lock:
+                self._calentar(session)
+            logger.info("Índice de horarios cargado: %d turnos", len(self._claves))
+        except Exception as exc:
+            logger.warning("No se pudo cargar el índice de horarios: %s", exc)
+        finally:
+            session.close()
+
+    # ---- escrituras de los endpoints ------------------------------------
+
+    def registrar_manual(self, assignment: models.ShiftAssignment, shift: models.Shift) -> None:
+        inicio, fin = intervalo_manual(assignment.date, shift.start_time, shift.end_time)
+        with self._lock:
+            self._agregar(assignment.employee_id, (MANUAL, assignment.id), inicio, fin,
+                          f"turno {shift.tipo} {_formato(inicio)}")
+
+    def registrar_dinamico(self, assignment: models.DynamicShiftAssignment, turno: models.DynamicShift) -> None:
+        inicio, fin = intervalo_dinamico(turno.fecha_programada, turno.hora_inicio, turno.duracion_minutos)
+        with self._lock:
+            self._agregar(assignment.employee_id, (DINAMICO, assignment.id), inicio, fin,
+                          f"turno dinámico #{turno.id} {_formato(inicio)}", turno.id)
+
+    def quitar_manual(self, assignment_id: int) -> None:
+        with self._lock:
+            self._quitar((MANUAL, assignment_id))
+
+    def invalidar_turno_dinamico(self, dynamic_shift_id: int) -> None:
+        with self._lock:
+            self._pendientes['dynamic_shifts'].add(dynamic_shift_id)
+
+    # ---- consultas ------------------------------------------------------
+
+    def _refrescar(self, session: Session, empleados: Set[int]) -> None:
+        if not self.active:
+            if empleados:
+                self._recargar_empleados(session, empleados)
+        elif not self._listo:
+            self._calentar(session)
+        else:
+            self._aplicar_pendientes(session)
+
+    def conflictos(self, session: Session, consultas: List[Tuple[int, int, int]]) -> List[Optional[str]]:
+        """
+        Para cada (employee_id, inicio, fin) retorna la descripción del turno
+        que choca, o None.
+        """
+        with self._lock:
+            self._refrescar(session, {emp for emp, _, _ in consultas})
+            resultado = []
+            for emp, inicio, fin in consultas:
+                indice = self._por_empleado.get(emp)
+                choque = indice.choque(inicio, fin) if indice is not None else None
+                resultado.append(None if choque is None else f"Conflicto de horario con {self._claves[choque[2]][3]}")
+            return resultado
+
+    def conflicto(self, session: Session, employee_id: int, inicio: int, fin: int) -> Optional[str]:
+        return self.conflictos(session, [(employee_id, inicio, fin)])[0]
+
+
+schedule = ScheduleIndex()
+listener.subscribe(schedule.handle_notification)
+listener.on_connection_change(schedule.set_active)
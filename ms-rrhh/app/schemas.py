@@ -127,6 +127,58 @@ class AvailableDriverResponse(BaseModel):
     horas_conduccion_hoy: float
     puede_asignarse: bool
     razon_no_disponible: Optional[str]
+    racha_continua_minutos: int = 0
+    ultimo_descanso_at: Optional[datetime] = None
 
 class DynamicShiftWithAssignments(DynamicShiftOut):
     assignments: List[DynamicShiftAssignmentOut] = []
+
+class BatchAssignmentItem(BaseModel):
+    dynamic_shift_id: int
+    employee_id: int
+    costo: float
+
+class BatchAssignResponse(BaseModel):
+    dry_run: bool
+    asignaciones: List[BatchAssignmentItem]
+    sin_asignar: List[int]  # turnos sin conductor elegible
+    rondas: int
+
+class RosterItem(BaseModel):
+    date: date
+    shift_id: int
+    shift_tipo: str
+    employee_id: Optional[int] = None   # None: cupo sin cubrir
+    nombre: Optional[str] = None
+
+class RosterExcluido(BaseModel):
+    employee_id: int
+    razon: str
+
+class RosterResponse(BaseModel):
+    dry_run: bool
+    week_start: date
+    week_end: date
+    asignaciones: List[RosterItem]
+    sin_cubrir: List[RosterItem]
+    puntaje: float          # menor es mejor
+    equidad: float
+    creadas: int            # filas insertadas en shift_assignments
+    iteraciones: int
+    excluidos: List[RosterExcluido]
+
+class BulkAssignmentRow(BaseModel):
+    fila: int
+    status: str             # creada, actualizada, error, omitida
+    id: Optional[int] = None
+    employee_id: Optional[int] = None
+    shift_id: Optional[int] = None
+    date: Optional[date]    # sin default: `= None` taparía el tipo date en el cuerpo de la clase
+    error: Optional[str] = None
+
+class BulkAssignResponse(BaseModel):
+    total: int
+    creadas: int
+    actualizadas: int
+    errores: int
+    filas: List[BulkAssignmentRow]
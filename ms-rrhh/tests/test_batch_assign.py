@@ -0,0 +1,35 @@
+"""
+Pruebas del solver de asignación en lote.
+
+Ejecutar desde ms-rrhh/:  python -m pytest tests/test_batch_assign.py
+"""
+
+from datetime import date, time
+
+from app.batch_assign import _EstadoConductor, _Turno, costo, resolver_ronda
+from app.driving_rules import DriverTimeline, minuto_absoluto
+
+DIA = date(2025, 6, 2)
+
+
+def test_resolver_ronda_minimiza_costo_total():
+    # Greedy tomaría (0,0)=1 y dejaría (1,1)=10; el óptimo es 2 + 2
+    pares = {(0, 0): 1.0, (0, 1): 2.0, (1, 0): 2.0, (1, 1): 10.0}
+    assert resolver_ronda(pares, n_turnos=2, n_conductores=2) == {0: 1, 1: 0}
+
+
+def test_turno_sin_pares_queda_sin_asignar():
+    pares = {(0, 0): 1.0, (2, 0): 0.5}
+    assert resolver_ronda(pares, n_turnos=3, n_conductores=1) == {2: 0}
+
+
+def test_costo_respeta_reglas_y_prefiere_cercania():
+    inicio = minuto_absoluto(DIA, time(14))
+    turno = _Turno(1, DIA, inicio, 120, 300, origen=(-33.45, -70.66), destino=None)
+
+    cansado = _EstadoConductor(DriverTimeline.desde_intervalos([(inicio - 300, inicio - 60)]), {DIA: 240}, set())
+    assert costo(cansado, turno) is None
+
+    cerca = _EstadoConductor(DriverTimeline(), {}, set(), [(inicio - 600, (-33.45, -70.65))])
+    lejos = _EstadoConductor(DriverTimeline(), {}, set(), [(inicio - 600, (-33.05, -71.61))])
+    assert costo(cerca, turno) < costo(lejos, turno)
@@ -0,0 +1,30 @@
+"""
+Pruebas de lectura y parseo del import masivo de asignaciones.
+
+Ejecutar desde ms-rrhh/:  python -m pytest tests/test_bulk_assignments.py
+"""
+
+from datetime import date
+
+import pytest
+
+from app.bulk_assignments import _parsear, leer_filas
+
+
+def test_lee_csv_y_json():
+    csv_ = "﻿employee_id,shift_id,date,notes\n1,2,2025-07-01,\n3,1,2025-07-02,Bodega\n".encode()
+    assert [f['employee_id'] for f in leer_filas(csv_, 'text/csv; charset=utf-8')] == ['1', '3']
+    assert leer_filas(b'{"assignments": [{"employee_id": 1}]}', 'application/json') == [{'employee_id': 1}]
+
+    with pytest.raises(ValueError):
+        leer_filas(b"employee_id,date\n1,2025-07-01\n", 'text/csv')
+    with pytest.raises(ValueError):
+        leer_filas(b'{"rows": []}', 'application/json')
+
+
+def test_parseo_reporta_error_por_fila():
+    ok = _parsear(1, {'employee_id': ' 7 ', 'shift_id': 2, 'date': '2025-07-01', 'notes': ''})
+    assert (ok.employee_id, ok.shift_id, ok.date, ok.notes, ok.error) == (7, 2, date(2025, 7, 1), None, None)
+    assert _parsear(2, {'employee_id': 'x', 'shift_id': 1, 'date': '2025-07-01'}).error
+    assert _parsear(3, {'employee_id': 1, 'shift_id': 1, 'date': '01/07/2025'}).error
+    assert _parsear(4, ['1', '1', '2025-07-01']).error
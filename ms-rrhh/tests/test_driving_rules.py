@@ -0,0 +1,50 @@
+"""
+Pruebas del motor de reglas de conducción continua.
+
+Ejecutar desde ms-rrhh/:  python -m pytest tests/test_driving_rules.py
+"""
+
+from datetime import date, time
+
+from app.driving_rules import DriverTimeline, minuto_absoluto
+
+DIA = date(2025, 6, 2)
+
+
+def t(hora, minuto=0):
+    return minuto_absoluto(DIA, time(hora, minuto))
+
+
+def test_bloque_continuo_y_descanso():
+    # 08:00-11:00 conduciendo: 3 h acumuladas
+    timeline = DriverTimeline.desde_intervalos([(t(8), t(11))])
+
+    # 2 h más tras 1 h de pausa: 5 h continuas, justo en el límite
+    assert timeline.puede_tomar(t(12), 120) is None
+    # 3 h más: superaría las 5 h
+    assert "Superaría 5 horas" in timeline.puede_tomar(t(12), 180)
+    # Con 2 h de descanso el contador se reinicia
+    assert timeline.puede_tomar(t(13), 180) is None
+
+
+def test_choque_de_horario():
+    timeline = DriverTimeline.desde_intervalos([(t(8), t(10))])
+    assert timeline.puede_tomar(t(9), 30) == "Conflicto de horario con otro turno asignado"
+    assert timeline.puede_tomar(t(7), 61).startswith("Conflicto")
+    assert timeline.choca(t(10), 30) is False
+
+
+def test_agregar_fusiona_bloques_vecinos():
+    timeline = DriverTimeline()
+    timeline.agregar(t(8), t(9))
+    timeline.agregar(t(13), t(14))
+    assert timeline.conduccion_continua(t(16), 60) == 60
+
+    # Un turno entre ambos (pausas < 2 h) une los dos bloques
+    timeline.agregar(t(10), t(12))
+    assert timeline.conduccion_continua(t(15), 60) == 60 + 60 + 120 + 60
+
+    # Intervalos solapados no cuentan doble
+    timeline.agregar(t(8, 30), t(9, 30))
+    assert timeline.conduccion_continua(t(15), 60) == 90 + 120 + 60 + 60
+    assert len(timeline) == 3
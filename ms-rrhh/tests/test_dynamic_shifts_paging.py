@@ -0,0 +1,69 @@
+"""
+Pruebas de la paginación por keyset de GET /dynamic-shifts.
+
+Ejecutar desde ms-rrhh/:  python -m pytest tests/test_dynamic_shifts_paging.py
+"""
+
+from datetime import date, time
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.keyset import NEXT_CURSOR_HEADER
+from app.routers import dynamic_shifts
+
+
+def make_client():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    models.DynamicShift.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as s:
+        # Dos turnos a la misma fecha y hora: el id desempata
+        for i, (dia, hora) in enumerate([(1, 8), (1, 8), (1, 14), (2, 6), (3, 22)], start=1):
+            s.add(models.DynamicShift(
+                id=i, fecha_programada=date(2025, 7, dia), hora_inicio=time(hora),
+                duracion_minutos=60, status='asignado',
+            ))
+        s.commit()
+
+    def get_db():
+        with Session() as s:
+            yield s
+
+    app = FastAPI()
+    app.add_middleware(CORSMiddleware, allow_origins=['*'], expose_headers=[NEXT_CURSOR_HEADER])
+    app.include_router(dynamic_shifts.router, prefix='/dynamic-shifts')
+    app.dependency_overrides[dynamic_shifts.get_db] = get_db
+    return TestClient(app)
+
+
+def test_sigue_el_cursor_hasta_la_ultima_pagina():
+    client = make_client()
+    origen = {'Origin': 'http://localhost:5173'}
+
+    r = client.get('/dynamic-shifts/', params={'limit': 3}, headers=origen)
+    assert r.status_code == 200
+    assert [s['id'] for s in r.json()] == [5, 4, 3]
+    cursor = r.headers[NEXT_CURSOR_HEADER]
+    assert NEXT_CURSOR_HEADER in r.headers['access-control-expose-headers']
+
+    r = client.get('/dynamic-shifts/', params={'limit': 3, 'cursor': cursor}, headers=origen)
+    assert [s['id'] for s in r.json()] == [2, 1]
+    assert NEXT_CURSOR_HEADER not in r.headers
+
+
+def test_cursor_invalido_es_400():
+    assert make_client().get('/dynamic-shifts/', params={'cursor': 'zz!'}).status_code == 400
+
+
+def test_sin_limit_ni_cursor_devuelve_todo_en_orden_cronologico():
+    client = make_client()
+    r = client.get('/dynamic-shifts/', params={'fecha_hasta': '2025-07-02'})
+    assert r.status_code == 200
+    assert [s['id'] for s in r.json()] == [1, 2, 3, 4]
+    assert NEXT_CURSOR_HEADER not in r.headers
@@ -0,0 +1,23 @@
+"""
+Pruebas de los cursores de paginación por keyset.
+
+Ejecutar desde ms-rrhh/:  python -m pytest tests/test_keyset.py
+"""
+
+from datetime import date, time
+
+import pytest
+
+from app.keyset import cursor_turno, leer_cursor_turno
+
+
+def test_cursor_ida_y_vuelta():
+    cursor = cursor_turno(date(2025, 7, 1), time(22, 30), 1234)
+    assert '=' not in cursor
+    assert leer_cursor_turno(cursor) == (date(2025, 7, 1), time(22, 30), 1234)
+
+
+@pytest.mark.parametrize('cursor', ['zz!', 'Zm9v', cursor_turno(date(2025, 7, 1), time(8), 1)[:-3]])
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValueError):
+        leer_cursor_turno(cursor)
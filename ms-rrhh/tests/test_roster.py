@@ -0,0 +1,89 @@
+"""
+Pruebas del generador de calendario semanal.
+
+Ejecutar desde ms-rrhh/:  python -m pytest tests/test_roster.py
+"""
+
+from datetime import date, time, timedelta
+
+from app import models
+from app.roster import Cupo, _Busqueda, _Empleado
+from app.schedule_index import intervalo_manual
+
+LUNES = date(2025, 6, 2)
+MANANA = models.Shift(id=1, tipo='Mañana', start_time=time(6), end_time=time(14))
+NOCHE = models.Shift(id=3, tipo='Noche', start_time=time(22), end_time=time(6))
+
+
+def _cupo(dia, shift, candidatos):
+    return Cupo(dia, shift, *intervalo_manual(dia, shift.start_time, shift.end_time), tuple(candidatos))
+
+
+def test_respeta_descanso_y_horas_de_contrato():
+    # Noche del lunes termina el martes 06:00: la mañana del martes no tiene 12 h de descanso
+    empleados = {1: _Empleado(1, 'A', 42 * 60), 2: _Empleado(2, 'B', 8 * 60)}
+    cupos = [
+        _cupo(LUNES, NOCHE, [1]),
+        _cupo(LUNES + timedelta(days=1), MANANA, [1, 2]),
+        _cupo(LUNES + timedelta(days=2), MANANA, [2]),
+    ]
+    busqueda = _Busqueda(cupos, empleados, semilla=0)
+    busqueda.voraz()
+    asignado, sin_cubrir, _, _ = busqueda.mejorar(presupuesto_ms=50)
+
+    # A no puede tomar el martes y B solo tiene 8 h: uno de los dos queda sin cubrir
+    assert asignado[0] == 1
+    assert asignado[1] != 1
+    assert asignado.count(2) == 1
+    assert sin_cubrir == 1
+
+
+def test_reparte_la_carga_de_forma_pareja():
+    empleados = {e: _Empleado(e, str(e), 42 * 60) for e in (1, 2, 3)}
+    cupos = [_cupo(LUNES + timedelta(days=d), MANANA, [1, 2, 3]) for d in range(6)]
+    busqueda = _Busqueda(cupos, empleados, semilla=0)
+    # Partir de una solución desbalanceada: A con cinco turnos, B con uno
+    for k, emp in enumerate([1, 1, 1, 1, 1, 2]):
+        busqueda._poner(k, emp)
+    asignado, sin_cubrir, _, _ = busqueda.mejorar(presupuesto_ms=200)
+
+    assert sin_cubrir == 0
+    assert sorted(asignado.count(e) for e in (1, 2, 3)) == [2, 2, 2]
+
+
+def test_turno_manual_espejado_cuenta_una_sola_vez():
+    import sqlite3
+
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+
+    from app.roster import _ocupados
+
+    # _ocupados usa SQL crudo: que SQLite devuelva DATE/TIME tipados como Postgres
+    sqlite3.register_converter('TIME', lambda v: time.fromisoformat(v.decode()))
+    engine = create_engine('sqlite://', connect_args={'detect_types': sqlite3.PARSE_DECLTYPES})
+    models.Base.metadata.create_all(engine)
+    with Session(engine) as s:
+        for sql in (
+            "INSERT INTO shifts (id, tipo, start_time, end_time, timezone)"
+            " VALUES (1, 'Mañana', '06:00:00', '14:00:00', 'America/Santiago')",
+            "INSERT INTO shift_assignments (id, employee_id, shift_id, date) VALUES (1, 7, 1, '2025-06-02')",
+            # Espejo de 016/022: mismo empleado, día y hora, sin ruta
+            "INSERT INTO dynamic_shifts (id, route_id, fecha_programada, hora_inicio, duracion_minutos, status)"
+            " VALUES (1, NULL, '2025-06-02', '06:00:00', 480, 'asignado')",
+            "INSERT INTO dynamic_shift_assignments (id, dynamic_shift_id, employee_id, role_in_shift, status)"
+            " VALUES (1, 1, 7, 'Conductor Turno Mañana', 'asignado')",
+            # Ruta real el mismo día: sí cuenta
+            "INSERT INTO dynamic_shifts (id, route_id, fecha_programada, hora_inicio, duracion_minutos, status)"
+            " VALUES (2, 40, '2025-06-02', '15:00:00', 120, 'asignado')",
+            "INSERT INTO dynamic_shift_assignments (id, dynamic_shift_id, employee_id, role_in_shift, status)"
+            " VALUES (2, 2, 7, 'Conductor Principal', 'asignado')",
+        ):
+            s.execute(text(sql))
+
+        ocupados = list(_ocupados(s, LUNES, LUNES))
+
+    assert [(emp, shift_id, fin - inicio) for emp, _, shift_id, inicio, fin in ocupados] == [
+        (7, 1, 480),
+        (7, None, 120),
+    ]
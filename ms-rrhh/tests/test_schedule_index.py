@@ -0,0 +1,35 @@
+"""
+Pruebas del índice de horarios por empleado.
+
+Ejecutar desde ms-rrhh/:  python -m pytest tests/test_schedule_index.py
+"""
+
+from datetime import date, time
+
+from app.schedule_index import IntervalIndex, intervalo_dinamico, intervalo_manual
+
+DIA = date(2025, 6, 2)
+
+
+def test_choque_con_intervalos_solapados_y_anidados():
+    indice = IntervalIndex()
+    # Un turno largo que contiene a otro: el prefijo de máximos detecta el largo
+    indice.agregar(*intervalo_manual(DIA, time(6), time(18)), ('manual', 1))
+    indice.agregar(*intervalo_dinamico(DIA, time(8), 60), ('dinamico', 2))
+
+    assert indice.choque(*intervalo_dinamico(DIA, time(16), 60))[2] == ('manual', 1)
+    assert indice.choque(*intervalo_dinamico(DIA, time(18), 60)) is None
+    assert indice.choque(*intervalo_dinamico(DIA, time(5), 60)) is None
+
+    indice.quitar(*intervalo_manual(DIA, time(6), time(18)), ('manual', 1))
+    assert indice.choque(*intervalo_dinamico(DIA, time(16), 60)) is None
+    assert indice.choque(*intervalo_dinamico(DIA, time(8, 30), 10))[2] == ('dinamico', 2)
+    assert len(indice) == 1
+
+
+def test_turno_de_noche_cruza_la_medianoche():
+    indice = IntervalIndex()
+    indice.agregar(*intervalo_manual(DIA, time(22), time(6)), ('manual', 1))
+    siguiente = date(2025, 6, 3)
+    assert indice.choque(*intervalo_dinamico(siguiente, time(5), 60)) is not None
+    assert indice.choque(*intervalo_dinamico(siguiente, time(6), 60)) is None
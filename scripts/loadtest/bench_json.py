@@ -0,0 +1,98 @@
+"""Benchmark de CPU de serialización de listas grandes (ms de CPU por 10k filas).
+
+Compara, para filas con la forma de /api/loads/summary y de DynamicShiftOut:
+- default:         jsonable_encoder + json.dumps (lo que hace FastAPI al retornar dicts)
+- response_model:  validación + serialización pydantic + json.dumps
+- fast_json:       orjson directo (gateway/app/fast_json.py)
+- json_array:      orjson en bloques (stream)
+
+Uso: python scripts/loadtest/bench_json.py --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date, datetime, time as dtime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "gateway"))
+from app.fast_json import _iter_array, dumps  # noqa: E402
+
+
+class DynamicShiftOut(BaseModel):
+    id: int
+    route_id: Optional[int]
+    fecha_programada: date
+    hora_inicio: dtime
+    duracion_minutos: int
+    conduccion_continua_minutos: int
+    status: str
+    created_at: datetime
+    assigned_at: Optional[datetime]
+    completed_at: Optional[datetime]
+
+
+def load_rows(n):
+    now = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc).isoformat()
+    return [{
+        "id": i, "origin": f"Av. Providencia {i}", "destination": f"Los Leones {i}",
+        "status": "pending", "vehicle_id": i % 40, "driver_id": i % 90,
+        "created_at": now, "updated_at": now, "vehicle_name": f"Camión {i % 40}",
+        "driver_name": f"Conductor {i % 90}", "assignment_status": "Asignada" if i % 3 else "No asignada",
+    } for i in range(n)]
+
+
+def shift_rows(n):
+    ts = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+    return [{
+        "id": i, "route_id": i, "fecha_programada": date(2025, 3, 1 + i % 28),
+        "hora_inicio": dtime(8 + i % 10, 0), "duracion_minutos": 240, "conduccion_continua_minutos": 300,
+        "status": "pendiente", "created_at": ts, "assigned_at": None, "completed_at": None,
+    } for i in range(n)]
+
+
+def cpu_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        best = min(best, time.process_time() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    scale = 10000 / args.rows
+
+    adapter = TypeAdapter(List[DynamicShiftOut])
+    cases = {
+        "loads (dicts)": (load_rows(args.rows), None),
+        "dynamic shifts (response_model)": (shift_rows(args.rows), adapter),
+    }
+    print(f"{'caso':34} {'ruta':16} {'ms CPU/10k':>11} {'ahorro':>8}")
+    for name, (rows, model) in cases.items():
+        paths = {"default": lambda: json.dumps(jsonable_encoder(rows), ensure_ascii=False).encode("utf-8")}
+        if model is not None:
+            paths["response_model"] = lambda: json.dumps(
+                jsonable_encoder(model.dump_python(model.validate_python(rows), mode="json")),
+                ensure_ascii=False).encode("utf-8")
+        paths["fast_json"] = lambda: dumps(rows)
+        paths["json_array"] = lambda: b"".join(_iter_array(rows, 500))
+        # Línea base: la ruta que FastAPI usa hoy para ese endpoint
+        baseline_path = "response_model" if model is not None else "default"
+        baseline = cpu_ms(paths[baseline_path], args.repeat) * scale
+        for path, fn in paths.items():
+            ms = baseline if path == baseline_path else cpu_ms(fn, args.repeat) * scale
+            saving = f"{(1 - ms / baseline):.0%}" if path in ("fast_json", "json_array") else ""
+            print(f"{name:34} {path:16} {ms:11.1f} {saving:>8}")
+
+
+if __name__ == "__main__":
+    main()
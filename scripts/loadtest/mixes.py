@@ -0,0 +1,86 @@
+"""Mezclas de tráfico para las pruebas de carga.
+
+Los payloads de mapas se construyen a partir de archive/test_payloads según sus
+claves: {"address"} → geocode, {"origin", "destination"} → directions,
+{"delivery_request_id", ...} → reporte de incidentes.
+
+Cada endpoint de una mezcla tiene un peso relativo; el generador elige el
+endpoint de cada request en proporción a esos pesos.
+"""
+import json
+import random
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+PAYLOADS_DIR = ROOT / "archive" / "test_payloads"
+
+
+def load_payloads(directory=PAYLOADS_DIR):
+    geocode, directions, incidents = [], [], []
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if not isinstance(data, dict):
+            continue
+        if "address" in data:
+            geocode.append(data)
+        elif "origin" in data and "destination" in data:
+            directions.append({
+                "origin": data["origin"],
+                "destination": data["destination"],
+                "waypoints": data.get("waypoints", []),
+                "optimize": data.get("optimize", True),
+            })
+        elif "delivery_request_id" in data:
+            incidents.append(data)
+    return {"geocode": geocode, "directions": directions, "incidents": incidents}
+
+
+class Endpoint:
+    def __init__(self, name, method, path, weight, payloads=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.weight = weight
+        self.payloads = payloads or []
+
+    def request(self, rng):
+        """(method, path, json) de un request concreto."""
+        path = self.path.format(cam=rng.choice(["cam1", "cam2", "cam3"]), id=rng.randint(1, 20))
+        body = rng.choice(self.payloads) if self.payloads else None
+        return self.method, path, body
+
+
+def build_mixes(payloads=None):
+    p = payloads or load_payloads()
+    maps = [
+        Endpoint("POST /maps/geocode", "POST", "/maps/geocode", 5, p["geocode"]),
+        Endpoint("POST /maps/directions", "POST", "/maps/directions", 4, p["directions"]),
+        Endpoint("GET /maps/incidents", "GET", "/maps/incidents", 1),
+    ]
+    operations = [
+        Endpoint("GET /api/loads/summary", "GET", "/api/loads/summary", 4),
+        Endpoint("GET /api/drivers/active", "GET", "/api/drivers/active", 3),
+        Endpoint("GET /api/rrhh/dynamic-shifts", "GET", "/api/rrhh/dynamic-shifts", 3),
+        Endpoint("GET /api/rrhh/employees", "GET", "/api/rrhh/employees", 2),
+        Endpoint("GET /api/changes/deliveries", "GET", "/api/changes/deliveries", 2),
+        Endpoint("GET /reportes/consolidados", "GET", "/reportes/consolidados", 1),
+        Endpoint("GET /api/camaras/health/{cam_id}", "GET", "/api/camaras/health/{cam}", 2),
+        Endpoint("GET /api/camaras/delivery/{delivery_id}", "GET", "/api/camaras/delivery/{id}", 1),
+    ]
+    # Escrituras: crean filas en la BD local, usar solo contra una base desechable
+    writes = [
+        Endpoint("POST /maps/incidents", "POST", "/maps/incidents", 1, p["incidents"]),
+    ]
+    return {
+        "maps": maps,
+        "operations": operations,
+        "mixed": maps + operations,
+        "writes": writes,
+    }
+
+
+def pick(endpoints, rng=random):
+    return rng.choices(endpoints, weights=[e.weight for e in endpoints], k=1)[0]
@@ -0,0 +1,133 @@
+"""Stand-ins locales de los proveedores externos para pruebas de carga.
+
+Un solo servidor HTTP responde como:
+- Google Maps   /maps/api/geocode/json, /maps/api/directions/json
+- Nominatim     /search
+- OSRM          /route/v1/driving/{coords}
+- mediamtx      /{cam_id}/index.m3u8, /{cam_id}/*.m3u8, /{cam_id}/*.ts|*.mp4
+
+Las respuestas son deterministas (derivadas de la consulta) y se puede simular
+latencia de red con --latency-ms / --jitter-ms.
+
+Uso: python scripts/loadtest/stubs.py --port 19000 --latency-ms 40
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SANTIAGO = (-33.4489, -70.6693)
+
+MASTER_PLAYLIST = (
+    "#EXTM3U\n"
+    "#EXT-X-VERSION:9\n"
+    "#EXT-X-STREAM-INF:BANDWIDTH=1200000,CODECS=\"avc1.64001f\"\n"
+    "video1_stream.m3u8\n"
+)
+SEGMENT_BYTES = 180 * 1024
+
+
+def _point_for(text):
+    """Coordenada estable cercana a Santiago para un texto de búsqueda."""
+    h = hashlib.sha1(text.lower().encode("utf-8")).digest()
+    dlat = (h[0] - 128) / 128 * 0.08
+    dlng = (h[1] - 128) / 128 * 0.08
+    return SANTIAGO[0] + dlat, SANTIAGO[1] + dlng
+
+
+def _media_playlist(seq):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:9", "#EXT-X-TARGETDURATION:2", f"#EXT-X-MEDIA-SEQUENCE:{seq}"]
+    for i in range(seq, seq + 3):
+        lines += ["#EXTINF:2.000,", f"segment{i}.mp4"]
+    return "\n".join(lines) + "\n"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    jitter = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def _send(self, status, body, content_type):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, payload, status=200):
+        self._send(status, json.dumps(payload), "application/json")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path
+        self._delay()
+
+        if path == "/maps/api/geocode/json":
+            lat, lng = _point_for(qs.get("address", ""))
+            return self._json({"status": "OK", "results": [{
+                "formatted_address": qs.get("address", ""),
+                "geometry": {"location": {"lat": lat, "lng": lng}},
+            }]})
+        if path == "/maps/api/directions/json":
+            return self._json({"status": "OK", "routes": [{
+                "overview_polyline": {"points": "nnhkEn`zmLcAuBmAyB"},
+                "legs": [{"distance": {"value": 5400}, "duration": {"value": 780}}],
+                "waypoint_order": [],
+            }]})
+        if path == "/search":
+            lat, lng = _point_for(qs.get("q", ""))
+            return self._json([{"lat": str(lat), "lon": str(lng), "display_name": qs.get("q", ""), "address": {}}])
+        if path.startswith("/route/v1/driving/"):
+            return self._json({"code": "Ok", "routes": [{
+                "geometry": "nnhkEn`zmLcAuBmAyB", "distance": 5400.0, "duration": 780.0,
+            }]})
+
+        # mediamtx (HLS)
+        parts = path.strip("/").split("/", 1)
+        if len(parts) == 2:
+            name = parts[1]
+            if name == "index.m3u8":
+                return self._send(200, MASTER_PLAYLIST, "application/vnd.apple.mpegurl")
+            if name.endswith(".m3u8"):
+                return self._send(200, _media_playlist(int(time.time() / 2)), "application/vnd.apple.mpegurl")
+            if name.endswith((".mp4", ".ts")):
+                return self._send(200, b"\0" * SEGMENT_BYTES, "video/mp4")
+        self._json({"error": "not_found", "path": path}, status=404)
+
+
+def serve(port, latency_ms=0.0, jitter_ms=0.0, host="127.0.0.1"):
+    """Inicia el servidor en un hilo y lo retorna (usar .shutdown() al terminar)."""
+    handler = type("Handler", (StubHandler,), {"latency": latency_ms / 1000.0, "jitter": jitter_ms / 1000.0})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=19000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    serve(args.port, args.latency_ms, args.jitter_ms, args.host)
+    print(f"Stubs escuchando en http://{args.host}:{args.port} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
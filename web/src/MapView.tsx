@@ -380,32 +380,14 @@ export default function MapView() {
       if (assignRes.data.success) {
         console.log('✅ Ruta confirmada y guardada:', assignRes.data.tracking_number)
 
-        // Intentar sincronizar con RR.HH. (dinámico)
-        try {
-          const rrhhPayload = {
-            tracking_number: assignRes.data.tracking_number,
-            driver_id: pendingRoute.driver_id,
-            driver_name: pendingRoute.driver_name,
-            route_data: {
-              origin: pendingRoute.origin,
-              destination: pendingRoute.destination,
-              distance_m: pendingRoute.distance_m,
-              duration_s: pendingRoute.duration_s,
-              estimated_start: new Date().toISOString()
-            }
-          }
-
-          await axios.post(API_URL + '/api/rrhh/sync-route', rrhhPayload)
-          console.log('✅ Sincronizado con RR.HH.')
-        } catch (rrhhError) {
-          console.warn('⚠️ No se pudo sincronizar con RR.HH. (servicio no disponible)', rrhhError)
-          // No es error crítico - continuar
-        }
+        // El turno dinámico en RR.HH. se crea en segundo plano (outbox del gateway);
+        // su estado se ve en Gestión de Cargas (columna "Sync RR.HH.", feed de cargas)
+        console.log('🔄 Sincronización con RR.HH.:', assignRes.data.rrhh_sync_status)
 
         // Limpiar ruta pendiente
         setPendingRoute(null)
         setError(null)
-        alert(`✅ Ruta confirmada exitosamente!\nTracking: ${assignRes.data.tracking_number}`)
+        alert(`✅ Ruta confirmada exitosamente!\nTracking: ${assignRes.data.tracking_number}\n\nEl turno en RR.HH. se crea en segundo plano; su estado aparece en Gestión de Cargas.`)
       }
     } catch (dbError: any) {
       console.error('❌ Error al confirmar ruta:', dbError)
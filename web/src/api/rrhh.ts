@@ -187,7 +187,8 @@ export async function createAssignment(data: ShiftAssignmentCreate): Promise<Shi
   if (!res.ok) {
     const err = await res.json();
     if (res.status === 409) {
-      throw new Error('Este empleado ya tiene un turno asignado en esta fecha');
+      // Choque de horario con otro turno (manual o dinámico)
+      throw new Error(err.detail || 'Este empleado ya tiene un turno en ese horario');
     }
     throw new Error(`Error al crear asignación: ${err.detail?.[0]?.msg || err.detail}`);
   }
@@ -392,18 +393,73 @@ export async function getDynamicShift(id: number): Promise<DynamicShift> {
   return res.json();
 }
 
-export async function listDynamicShifts(params?: {
+const DYNAMIC_SHIFTS_PAGE_SIZE = 200;
+
+export async function listDynamicShifts(params: {
+  fecha_desde: string;
+  fecha_hasta: string;
+  status?: string;
+  limit?: number;
+}): Promise<DynamicShift[]> {
+  // Siempre con ventana de fechas (para contar por día usar
+  // getDynamicShiftsSummary). Se pide paginado y se siguen los cursores
+  // X-Next-Cursor hasta completar el rango
+  const shifts: DynamicShift[] = [];
+  let cursor: string | null = null;
+  do {
+    const page = await listDynamicShiftsPage({
+      limit: DYNAMIC_SHIFTS_PAGE_SIZE,
+      ...params,
+      cursor: cursor ?? undefined
+    });
+    shifts.push(...page.items);
+    cursor = page.nextCursor;
+  } while (cursor);
+  return shifts;
+}
+
+export async function listDynamicShiftsPage(params?: {
   fecha_desde?: string;
   fecha_hasta?: string;
   status?: string;
-}): Promise<DynamicShift[]> {
+  limit?: number;
+  cursor?: string;
+}): Promise<{ items: DynamicShift[]; nextCursor: string | null }> {
   const url = new URL(`${API_RRHH}/dynamic-shifts`);
   if (params?.fecha_desde) url.searchParams.set('fecha_desde', params.fecha_desde);
   if (params?.fecha_hasta) url.searchParams.set('fecha_hasta', params.fecha_hasta);
   if (params?.status) url.searchParams.set('status', params.status);
+  if (params?.limit) url.searchParams.set('limit', String(params.limit));
+  if (params?.cursor) url.searchParams.set('cursor', params.cursor);
 
   const res = await safeFetch(url.toString());
   if (!res.ok) throw new Error('Error al cargar turnos dinámicos');
-  return res.json();
+  return { items: await res.json(), nextCursor: res.headers.get('X-Next-Cursor') };
+}
+
+export type DynamicShiftDaySummary = {
+  fecha: string; // YYYY-MM-DD
+  total: number;
+  pendientes: number;
+  asignados: number;
+  en_curso: number;
+  completados: number;
+  cancelados: number;
+  minutos: number;
+  conductores: number;
+};
+
+export async function getDynamicShiftsSummary(
+  fecha_desde: string,
+  fecha_hasta: string
+): Promise<DynamicShiftDaySummary[]> {
+  const url = new URL(`${API_RRHH}/dynamic-shifts/summary`);
+  url.searchParams.set('fecha_desde', fecha_desde);
+  url.searchParams.set('fecha_hasta', fecha_hasta);
+
+  const res = await safeFetch(url.toString());
+  if (!res.ok) throw new Error('Error al cargar resumen de turnos dinámicos');
+  const data = await res.json();
+  return data.days;
 }
 
@@ -1,7 +1,12 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+// Delta-sync con /api/changes/deliveries: cada ciclo solo trae lo que cambió.
+// Los ciclos los dispara el canal push /api/live/stream; el sondeo queda solo
+// como respaldo mientras el stream no está conectado.
+const POLL_INTERVAL_MS = 10000;
+const LIVE_STREAM_URL = `${API_URL}/api/live/stream?topics=deliveries`;
 
 interface Load {
     id: number;
@@ -15,6 +20,9 @@ interface Load {
     vehicle_name: string | null;
     driver_name: string | null;
     assignment_status: 'Asignada' | 'No asignada';
+    rrhh_sync_status: 'pendiente' | 'procesado' | 'error' | null;
+    dynamic_shift_id: number | null;
+    rrhh_sync_error: string | null;
 }
 
 interface LoadsSummary {
@@ -23,20 +31,52 @@ interface LoadsSummary {
     unassigned: number;
 }
 
+interface DeliveryChanges {
+    cursor: string;
+    full: boolean;
+    upserts: Load[];
+    deleted: number[];
+}
+
+function summarize(loads: Load[]): LoadsSummary {
+    const assigned = loads.filter((l) => l.assignment_status === 'Asignada').length;
+    return { total: loads.length, assigned, unassigned: loads.length - assigned };
+}
+
 export default function LoadsManagement() {
     const [loads, setLoads] = useState<Load[]>([]);
     const [summary, setSummary] = useState<LoadsSummary>({ total: 0, assigned: 0, unassigned: 0 });
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
     const [cancelling, setCancelling] = useState<number | null>(null);
+    // Cursor del feed y filas por id; sin cursor el servidor devuelve todo (full)
+    const cursorRef = useRef<string | null>(null);
+    const rowsRef = useRef<Map<number, Load>>(new Map());
+    const liveRef = useRef(false);
 
-    const fetchLoads = async () => {
+    const fetchLoads = async (reset = false) => {
         try {
-            setLoading(true);
+            if (reset) {
+                cursorRef.current = null;
+                setLoading(true);
+            }
             setError(null);
-            const response = await axios.get(`${API_URL}/api/loads/summary`);
-            setLoads(response.data.loads || []);
-            setSummary(response.data.summary || { total: 0, assigned: 0, unassigned: 0 });
+            const params = cursorRef.current ? { since: cursorRef.current } : {};
+            const { data } = await axios.get<DeliveryChanges>(`${API_URL}/api/changes/deliveries`, { params });
+
+            if (data.full) rowsRef.current = new Map();
+            const rows = rowsRef.current;
+            data.upserts.forEach((load) => rows.set(load.id, load));
+            data.deleted.forEach((id) => rows.delete(id));
+            cursorRef.current = data.cursor;
+
+            if (data.full || data.upserts.length > 0 || data.deleted.length > 0) {
+                const sorted = Array.from(rows.values()).sort(
+                    (a, b) => (b.created_at || '').localeCompare(a.created_at || '')
+                );
+                setLoads(sorted);
+                setSummary(summarize(sorted));
+            }
         } catch (err: any) {
             console.error('Error al cargar cargas:', err);
             setError(err?.response?.data?.detail || err.message || 'Error al cargar cargas');
@@ -46,7 +86,29 @@ export default function LoadsManagement() {
     };
 
     useEffect(() => {
-        fetchLoads();
+        fetchLoads(true);
+
+        const source = new EventSource(LIVE_STREAM_URL);
+        source.onopen = () => {
+            // (Re)conexión: los avisos perdidos se recuperan con el cursor
+            liveRef.current = true;
+            fetchLoads();
+        };
+        source.onerror = () => { liveRef.current = false; };
+        source.addEventListener('changes', () => fetchLoads());
+        source.addEventListener('resync', () => {
+            // Buffer desbordado o listener reconectado: lista completa
+            cursorRef.current = null;
+            fetchLoads();
+        });
+
+        const interval = setInterval(() => {
+            if (!liveRef.current) fetchLoads();
+        }, POLL_INTERVAL_MS);
+        return () => {
+            clearInterval(interval);
+            source.close();
+        };
     }, []);
 
     const handleCancelRoute = async (loadId: number, origin: string, destination: string) => {
@@ -97,6 +159,20 @@ export default function LoadsManagement() {
         return assignmentStatus === 'Asignada' ? '#10B981' : '#6B7280';
     };
 
+    // Estado del outbox rutas → RR.HH. (lo actualiza el worker del gateway)
+    const getSyncBadge = (load: Load) => {
+        switch (load.rrhh_sync_status) {
+            case 'procesado':
+                return { color: '#10B981', label: `✅ Turno #${load.dynamic_shift_id}` };
+            case 'pendiente':
+                return { color: '#F59E0B', label: load.rrhh_sync_error ? '🔁 Reintentando' : '⏳ Pendiente' };
+            case 'error':
+                return { color: '#EF4444', label: '⚠️ Error' };
+            default:
+                return null;
+        }
+    };
+
     if (loading) {
         return (
             <div style={{ padding: '20px', textAlign: 'center' }}>
@@ -178,13 +254,14 @@ export default function LoadsManagement() {
                                 <th style={{ padding: '12px', textAlign: 'left', fontWeight: '600', color: '#374151' }}>Asignación</th>
                                 <th style={{ padding: '12px', textAlign: 'left', fontWeight: '600', color: '#374151' }}>Vehículo</th>
                                 <th style={{ padding: '12px', textAlign: 'left', fontWeight: '600', color: '#374151' }}>Conductor</th>
+                                <th style={{ padding: '12px', textAlign: 'left', fontWeight: '600', color: '#374151' }}>Sync RR.HH.</th>
                                 <th style={{ padding: '12px', textAlign: 'left', fontWeight: '600', color: '#374151' }}>Acciones</th>
                             </tr>
                         </thead>
                         <tbody>
                             {loads.length === 0 ? (
                                 <tr>
-                                    <td colSpan={8} style={{ padding: '40px', textAlign: 'center', color: '#6B7280' }}>
+                                    <td colSpan={9} style={{ padding: '40px', textAlign: 'center', color: '#6B7280' }}>
                                         No hay cargas registradas
                                     </td>
                                 </tr>
@@ -230,6 +307,28 @@ export default function LoadsManagement() {
                                         <td style={{ padding: '12px', color: '#4B5563' }}>
                                             {load.driver_name || '-'}
                                         </td>
+                                        <td style={{ padding: '12px' }}>
+                                            {(() => {
+                                                const badge = getSyncBadge(load);
+                                                if (!badge) return <span style={{ color: '#9CA3AF', fontSize: '13px' }}>-</span>;
+                                                return (
+                                                    <span
+                                                        title={load.rrhh_sync_error || undefined}
+                                                        style={{
+                                                            display: 'inline-block',
+                                                            padding: '4px 12px',
+                                                            borderRadius: '12px',
+                                                            fontSize: '12px',
+                                                            fontWeight: '500',
+                                                            background: badge.color + '20',
+                                                            color: badge.color
+                                                        }}
+                                                    >
+                                                        {badge.label}
+                                                    </span>
+                                                );
+                                            })()}
+                                        </td>
                                         <td style={{ padding: '12px' }}>
                                             {load.assignment_status === 'Asignada' && load.status !== 'cancelado' && load.status !== 'completado' ? (
                                                 <button
@@ -264,7 +363,7 @@ export default function LoadsManagement() {
             {/* Botón de recarga */}
             <div style={{ marginTop: '20px', textAlign: 'center' }}>
                 <button
-                    onClick={fetchLoads}
+                    onClick={() => fetchLoads(true)}
                     disabled={loading}
                     style={{
                         padding: '10px 20px',
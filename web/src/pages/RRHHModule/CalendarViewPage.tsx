@@ -6,12 +6,12 @@ import {
   createAssignment,
   deleteAssignment,
   getWeeklySuggestions,
-  listDynamicShifts,
+  getDynamicShiftsSummary,
   type Employee,
   type Shift,
   type ShiftAssignment,
   type SuggestionsData,
-  type DynamicShift
+  type DynamicShiftDaySummary
 } from '../../api/rrhh';
 import DynamicShiftSuggestionsPanel from './DynamicShiftSuggestionsPanel';
 
@@ -28,7 +28,7 @@ export default function CalendarViewPage() {
   const [shifts, setShifts] = useState<Shift[]>([]);
   const [assignments, setAssignments] = useState<ShiftAssignment[]>([]);
   const [suggestions, setSuggestions] = useState<SuggestionsData | null>(null);
-  const [dynamicShifts, setDynamicShifts] = useState<DynamicShift[]>([]);
+  const [routesByDay, setRoutesByDay] = useState<Record<string, DynamicShiftDaySummary>>({});
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [draggedEmployee, setDraggedEmployee] = useState<DragData | null>(null);
@@ -54,24 +54,30 @@ export default function CalendarViewPage() {
   // Load data
   useEffect(() => {
     loadAllData();
-  }, []);
+  }, [weekStart]);
 
   async function loadAllData() {
     setLoading(true);
     setError(null);
     try {
-      const [empData, shiftData, assignData, suggestionsData, dynamicData] = await Promise.all([
+      const weekEnd = new Date(weekStart);
+      weekEnd.setDate(weekEnd.getDate() + 6);
+      // Rutas de la semana visible: solo conteos por día (endpoint de resumen)
+      const [empData, shiftData, assignData, suggestionsData, routeDays] = await Promise.all([
         getEmployees(),
         getShifts(),
         listAssignments(),
         getWeeklySuggestions(),
-        listDynamicShifts()
+        getDynamicShiftsSummary(
+          weekStart.toISOString().split('T')[0],
+          weekEnd.toISOString().split('T')[0]
+        )
       ]);
       setEmployees(empData);
       setShifts(shiftData);
       setAssignments(assignData);
       setSuggestions(suggestionsData);
-      setDynamicShifts(dynamicData);
+      setRoutesByDay(Object.fromEntries(routeDays.map((d) => [d.fecha, d])));
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Error al cargar datos');
     } finally {
@@ -657,6 +663,14 @@ export default function CalendarViewPage() {
                 {day}
                 <br />
                 <span className="text-xs text-gray-600">{weekDateLabels[idx]}</span>
+                {routesByDay[weekDates[idx]] && (
+                  <div
+                    className="text-xs font-normal text-purple-700"
+                    title={`${routesByDay[weekDates[idx]].pendientes} pendientes · ${routesByDay[weekDates[idx]].conductores} conductores`}
+                  >
+                    🚚 {routesByDay[weekDates[idx]].total} rutas
+                  </div>
+                )}
               </div>
             ))}
 
@@ -763,6 +777,7 @@ export default function CalendarViewPage() {
           <li>Columna <strong>Total</strong>: Cantidad de empleados activos</li>
           <li>Columna <strong>Asignados</strong>: Turnos asignados esa semana para ese tipo de turno</li>
           <li>Celdas verdes: empleado asignado (hover para ver opciones)</li>
+          <li>🚚 bajo cada día: turnos de ruta (dinámicos) programados ese día</li>
           <li>Celdas vacías: sin empleado asignado para ese turno/día</li>
         </ul>
       </div>
@@ -24,7 +24,7 @@ export default function ConductorsSchedulePage() {
 
   useEffect(() => {
     loadData();
-  }, []);
+  }, [selectedDate]);
 
   async function loadData() {
     setLoading(true);
@@ -32,7 +32,7 @@ export default function ConductorsSchedulePage() {
     try {
       const [empData, shiftsData] = await Promise.all([
         getEmployees(),
-        listDynamicShifts()
+        listDynamicShifts({ fecha_desde: selectedDate, fecha_hasta: selectedDate })
       ]);
       setEmployees(empData);
       setDynamicShifts(shiftsData);